@@ -0,0 +1,82 @@
+"""
+Замер задержки запросов к БД: соединение на каждый запрос (как в скриптах) против пула соединений (как в боте).
+Работает на временной копии схемы, рабочую БД не трогает.
+Запуск:
+  python bench_db.py [число повторов, по умолчанию 300]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+import database as db
+
+
+async def _fill() -> list[int]:
+    ids = []
+    for i in range(200):
+        lesson_id = await db.add_lesson(
+            title=f"Урок {i}",
+            lesson_date=f"2099-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            lesson_time=f"{10 + i % 10}:00",
+            max_students=5,
+        )
+        ids.append(lesson_id)
+        await db.book_lesson(lesson_id, 1000 + i, username=f"user{i}")
+    return ids
+
+
+async def _booking_screen(lesson_id: int) -> None:
+    """Типичный экран записи: урок, кто записан, список уроков."""
+    await db.get_lesson(lesson_id)
+    await db.get_bookings_for_lesson(lesson_id)
+    await db.get_upcoming_lessons(limit=41)
+
+
+async def _measure(label: str, ids: list[int], repeats: int) -> dict:
+    cases = {
+        "get_lesson": lambda i: db.get_lesson(ids[i % len(ids)]),
+        "get_upcoming_lessons": lambda i: db.get_upcoming_lessons(limit=41),
+        "экран записи (3 запроса)": lambda i: _booking_screen(ids[i % len(ids)]),
+    }
+    result = {}
+    for name, fn in cases.items():
+        samples = []
+        for i in range(repeats):
+            t0 = time.perf_counter()
+            await fn(i)
+            samples.append((time.perf_counter() - t0) * 1e6)
+        samples.sort()
+        result[name] = (statistics.mean(samples), samples[int(len(samples) * 0.95) - 1])
+        print(f"  {label:<22} {name:<26} среднее {result[name][0]:9.0f} мкс   p95 {result[name][1]:9.0f} мкс")
+    return result
+
+
+async def main() -> None:
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        await db.init_db()
+        ids = await _fill()
+        print(f"Повторов на случай: {repeats}")
+        per_call = await _measure("connect на запрос", ids, repeats)
+        await db.open_pool()
+        try:
+            pooled = await _measure("пул", ids, repeats)
+        finally:
+            await db.close_pool()
+        print()
+        for name, (mean_old, _) in per_call.items():
+            mean_new = pooled[name][0]
+            print(f"  {name:<26} ускорение x{mean_old / mean_new:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+"""
+Рассылка одного сообщения многим получателям (напоминания, ссылки к началу, отмены, уведомления репетиторам).
+Несколько отправок идут параллельно, но не быстрее общего лимита Telegram (~30 сообщений/с) и не чаще раза
+в секунду в один чат. На RetryAfter (flood control) рассылка ставится на паузу на указанное Telegram время
+и сообщение отправляется повторно; ошибка одного получателя не прерывает остальных.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+SENT = "sent"
+
+
+class TokenBucket:
+    """Не больше rate событий в секунду в среднем, всплеск до capacity. pause() — общая пауза (RetryAfter)."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if wait <= 0:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated = self._paused_until
+
+
+class BroadcastReport:
+    """
+    Итог рассылки: results — chat_id -> SENT или текст ошибки; outcomes — то же по порядку сообщений
+    (для send_each с несколькими сообщениями в один чат); retries — сколько раз отправка повторялась.
+    """
+
+    def __init__(self, count: int = 0):
+        self.results: dict[int, str] = {}
+        self.outcomes: list[str | None] = [None] * count
+        self.retries = 0
+        self.elapsed = 0.0
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for r in self.results.values() if r == SENT)
+
+    @property
+    def failed(self) -> dict[int, str]:
+        return {chat_id: r for chat_id, r in self.results.items() if r != SENT}
+
+    def __repr__(self) -> str:
+        return (
+            f"<BroadcastReport sent={self.sent}/{len(self.results)} failed={len(self.failed)} "
+            f"retries={self.retries} elapsed={self.elapsed:.2f}s>"
+        )
+
+
+def _seconds(retry_after) -> float:
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+class Broadcaster:
+    """
+    rate — сообщений в секунду на всего бота; concurrency — одновременных запросов в одной рассылке;
+    per_chat_interval — минимальный интервал между сообщениями в один чат (сек);
+    max_retries — повторы после RetryAfter / сетевой ошибки, дальше получатель считается неуспешным.
+    """
+
+    def __init__(
+        self,
+        rate: float = 30.0,
+        concurrency: int = 8,
+        per_chat_interval: float = 1.0,
+        max_retries: int = 3,
+    ):
+        self.bucket = TokenBucket(rate)
+        self.concurrency = max(1, concurrency)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        # chat_id -> когда в этот чат снова можно писать (time.monotonic)
+        self._chat_ready: dict[int, float] = {}
+
+    async def send(self, bot, chat_ids, text: str, **kwargs) -> BroadcastReport:
+        """Один текст всем chat_ids (повторы и пустые id отбрасываются). kwargs — как у bot.send_message."""
+        return await self.send_each(bot, [(chat_id, text) for chat_id in dict.fromkeys(chat_ids) if chat_id], **kwargs)
+
+    async def send_each(self, bot, messages: list[tuple[int, str]], **kwargs) -> BroadcastReport:
+        """Свой текст каждому получателю: messages — пары (chat_id, text)."""
+        report = BroadcastReport(len(messages))
+        if not messages:
+            return report
+        started = time.monotonic()
+        queue = enumerate(messages)
+
+        async def worker():
+            for index, (chat_id, text) in queue:
+                outcome = await self._deliver(bot, chat_id, text, kwargs, report)
+                report.outcomes[index] = report.results[chat_id] = outcome
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(messages)))))
+        report.elapsed = time.monotonic() - started
+        if report.failed:
+            logger.warning("Рассылка: %r, ошибки: %s", report, report.failed)
+        else:
+            logger.debug("Рассылка: %r", report)
+        return report
+
+    async def _deliver(self, bot, chat_id: int, text: str, kwargs: dict, report: BroadcastReport) -> str:
+        attempt = 0
+        while True:
+            await self._wait_chat(chat_id)
+            await self.bucket.acquire()
+            backoff = 0
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                return SENT
+            except RetryAfter as e:
+                # Flood control касается всего бота — ждут все отправки, не только эта
+                self.bucket.pause(_seconds(e.retry_after))
+                error = e
+            except (BadRequest, Forbidden) as e:
+                return str(e)  # чат не найден / бот заблокирован — повтор не поможет
+            except NetworkError as e:
+                backoff = attempt + 1
+                error = e
+            except Exception as e:
+                return str(e)
+            attempt += 1
+            if attempt > self.max_retries:
+                return str(error)
+            report.retries += 1
+            await asyncio.sleep(backoff)
+
+    async def _wait_chat(self, chat_id: int) -> None:
+        now = time.monotonic()
+        ready = self._chat_ready.get(chat_id, 0.0)
+        self._chat_ready[chat_id] = max(now, ready) + self.per_chat_interval
+        if ready > now:
+            await asyncio.sleep(ready - now)
+        if len(self._chat_ready) > 10000:
+            self._chat_ready = {cid: at for cid, at in self._chat_ready.items() if at > now}
+
+
+_default = Broadcaster()
+
+
+async def broadcast(bot, chat_ids, text: str, **kwargs) -> BroadcastReport:
+    """Рассылка через общий для процесса Broadcaster (общий лимит скорости на весь бот)."""
+    return await _default.send(bot, chat_ids, text, **kwargs)
+
+
+async def broadcast_each(bot, messages: list[tuple[int, str]], **kwargs) -> BroadcastReport:
+    return await _default.send_each(bot, messages, **kwargs)
@@ -0,0 +1,66 @@
+"""
+Кэш в памяти процесса для редко меняющихся данных (контент ЕГЭ): LRU с ограничением размера и сроком жизни.
+Пишущий код сбрасывает свои ключи через invalidate(); срок жизни страхует от записей мимо бота (скрипты).
+"""
+import time
+from collections import OrderedDict
+
+# Отличает «нет в кэше» от закэшированного None
+MISSING = object()
+
+
+class LRUCache:
+    """Словарь на maxsize записей: вытесняются давно не читавшиеся, по истечении ttl (сек) запись считается устаревшей."""
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Растёт при каждом invalidate/clear: значение, прочитанное до сброса, не попадёт в кэш
+        self.generation = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=MISSING):
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires is None or expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value, generation: int | None = None) -> None:
+        """Сохраняет значение. generation — self.generation на момент чтения из источника (если с тех пор был сброс — не сохраняем)."""
+        if generation is not None and generation != self.generation:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, *keys) -> None:
+        self.generation += 1
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
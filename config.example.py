@@ -33,7 +33,8 @@ SUBSCRIPTION_CHANNEL_LINK = None
 # Час (0-23) ежедневной сводки репетитору. None — только по /summary
 SUMMARY_DAILY_HOUR = 9
 
-# Ссылка на урок: за 1 минуту до начала бот отправит её каждому записанному ученику. None — не отправлять.
+# Ссылка на урок: за 1 минуту до начала бот отправит её каждому записанному ученику.
+# Своя ссылка урока или закреплённого слота важнее этой. None — отправлять только свои ссылки уроков/слотов.
 LESSON_LINK = None
 
 # Yandex GPT для «Помощь с домашкой». Без ключа и каталога кнопка не показывается.
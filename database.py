@@ -2,177 +2,192 @@
 База данных: уроки и записи учеников.
 Путь к файлу: из переменной окружения DATABASE_PATH (для Railway Volume) или по умолчанию tutor_bot.db в папке проекта.
 """
+import logging
 import os
+import re
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
 import aiosqlite
-from datetime import datetime
 
-from config_loader import now_tz
-from pathlib import Path
+from cache import MISSING, LRUCache
+from config_loader import localize_naive, now_tz
+from db_migrations import migrate
+from db_pool import ConnectionPool, connect
+from ege_math_index import EgeMathIndex
+from recurrence import SlotOccurrenceIndex
+
+logger = logging.getLogger(__name__)
 
 _db_path = os.environ.get("DATABASE_PATH", "").strip()
 DB_PATH = Path(_db_path) if _db_path else Path(__file__).parent / "tutor_bot.db"
 
+# Сколько соединений для чтения держит пул (писатель всегда один)
+try:
+    DB_POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", "").strip() or 4)
+except ValueError:
+    DB_POOL_SIZE = 4
+
+
+def _pragma_env(name: str, default: str) -> str:
+    value = (os.environ.get(name) or "").strip()
+    if value and not re.fullmatch(r"-?\w+", value):
+        logger.warning("%s=%r проигнорировано, используется %s", name, value, default)
+        return default
+    return value or default
+
+
+# Профиль PRAGMA для каждого соединения. WAL: запись не блокирует чтение; synchronous=NORMAL в WAL — fsync только
+# при checkpoint. busy_timeout — мс ожидания блокировки, cache_size < 0 — размер в КиБ, mmap_size — байты.
+DB_PRAGMAS = {
+    "busy_timeout": _pragma_env("DATABASE_BUSY_TIMEOUT_MS", "5000"),
+    "journal_mode": _pragma_env("DATABASE_JOURNAL_MODE", "WAL"),
+    "synchronous": _pragma_env("DATABASE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": _pragma_env("DATABASE_CACHE_SIZE", "-16000"),
+    "mmap_size": _pragma_env("DATABASE_MMAP_SIZE", "67108864"),
+    "temp_store": _pragma_env("DATABASE_TEMP_STORE", "MEMORY"),
+}
+
+# Checkpoint WAL из job_queue: раз в DATABASE_CHECKPOINT_INTERVAL секунд — PASSIVE (не мешает читателям);
+# если WAL-файл вырос больше DATABASE_WAL_MAX_MB — TRUNCATE (сжимает WAL до нуля).
+try:
+    DB_CHECKPOINT_INTERVAL = int(os.environ.get("DATABASE_CHECKPOINT_INTERVAL", "").strip() or 300)
+except ValueError:
+    DB_CHECKPOINT_INTERVAL = 300
+try:
+    DB_WAL_MAX_BYTES = int(os.environ.get("DATABASE_WAL_MAX_MB", "").strip() or 64) * 1024 * 1024
+except ValueError:
+    DB_WAL_MAX_BYTES = 64 * 1024 * 1024
+
+_pool = ConnectionPool(readers=DB_POOL_SIZE, pragmas=DB_PRAGMAS)
+# Банк ЕГЭ Математика: id заданий по номерам для выбора без ORDER BY RANDOM()
+_math_index = EgeMathIndex()
+# Контент ЕГЭ меняется только скриптами заполнения: читаем через кэш, запись сбрасывает свои ключи.
+# EGE_CACHE_TTL (сек) — через сколько подхватываются изменения, сделанные скриптами мимо бота (0 — без срока).
+try:
+    EGE_CACHE_SIZE = int(os.environ.get("EGE_CACHE_SIZE", "").strip() or 512)
+except ValueError:
+    EGE_CACHE_SIZE = 512
+try:
+    EGE_CACHE_TTL = float(os.environ.get("EGE_CACHE_TTL", "").strip() or 600)
+except ValueError:
+    EGE_CACHE_TTL = 600.0
+_ege_cache = LRUCache(maxsize=EGE_CACHE_SIZE, ttl=EGE_CACHE_TTL or None)
+# Соединение текущей transaction() (для _read/_write внутри блока)
+_tx_conn: ContextVar[aiosqlite.Connection | None] = ContextVar("db_transaction", default=None)
+# Изменения расписания внутри transaction(): версии поднимаются только после commit
+_tx_touched: ContextVar[list | None] = ContextVar("db_transaction_touched", default=None)
+
+
+async def open_pool() -> None:
+    """Открывает пул соединений (post_init бота). До этого функции модуля работают через одноразовые соединения."""
+    await _pool.open(DB_PATH)
+
+
+async def close_pool() -> None:
+    """Закрывает пул соединений (остановка бота)."""
+    await _pool.close()
+
+
+async def checkpoint_wal() -> tuple[int, int, int] | None:
+    """Политика checkpoint (вызывается из job_queue): PASSIVE, а при большом WAL-файле — TRUNCATE."""
+    if not _pool.is_open or DB_PRAGMAS["journal_mode"].upper() != "WAL":
+        return None
+    wal_path = DB_PATH.with_name(DB_PATH.name + "-wal")
+    wal_size = wal_path.stat().st_size if wal_path.exists() else 0
+    mode = "TRUNCATE" if wal_size > DB_WAL_MAX_BYTES else "PASSIVE"
+    result = await _pool.checkpoint(mode)
+    if result[0]:
+        logger.info("wal_checkpoint(%s): БД занята, перенесено %s из %s страниц", mode, result[2], result[1])
+    elif mode == "TRUNCATE":
+        logger.info("wal_checkpoint(TRUNCATE): WAL был %s байт", wal_size)
+    return result
+
+
+async def export_db_bytes() -> bytes:
+    """Согласованная копия БД одним файлом (VACUUM INTO) — с учётом данных, ещё лежащих в WAL."""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / "backup.db"
+        async with _read() as conn:
+            await conn.execute("VACUUM INTO ?", (str(target),))
+        return target.read_bytes()
+
+
+@asynccontextmanager
+async def transaction():
+    """
+    Несколько записей одной транзакцией (массовое заполнение ЕГЭ): commit в конце блока, при ошибке — откат всего.
+    Внутри блока _read/_write отдают то же соединение, вложенный transaction() входит во внешний.
+    """
+    conn = _tx_conn.get()
+    if conn is not None:
+        yield conn
+        return
+    touched = []
+    async with _write() as conn:
+        token = _tx_conn.set(conn)
+        touched_token = _tx_touched.set(touched)
+        try:
+            yield conn
+        finally:
+            _tx_conn.reset(token)
+            _tx_touched.reset(touched_token)
+    _bump_schedule(touched)
+
+
+@asynccontextmanager
+async def _read():
+    """Соединение для чтения: из пула, а вне бота (скрипты заполнения ЕГЭ и т.п.) — одноразовое."""
+    if _tx_conn.get() is not None:
+        yield _tx_conn.get()
+        return
+    if _pool.is_open:
+        async with _pool.reader() as conn:
+            yield conn
+        return
+    conn = await connect(DB_PATH, DB_PRAGMAS)
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+@asynccontextmanager
+async def _write():
+    """Соединение для записи: commit при выходе из блока, rollback при исключении (внутри transaction() — в её конце)."""
+    if _tx_conn.get() is not None:
+        yield _tx_conn.get()
+        return
+    if _pool.is_open:
+        async with _pool.writer() as conn:
+            yield conn
+        return
+    conn = await connect(DB_PATH, DB_PRAGMAS)
+    try:
+        yield conn
+        await conn.commit()
+    except BaseException:
+        await conn.rollback()
+        raise
+    finally:
+        await conn.close()
+
 
 async def init_db():
-    """Создаёт таблицы, если их нет. Директорию для файла БД создаёт при необходимости (для Railway Volume)."""
+    """Создаёт и обновляет схему (db_migrations). Директорию для файла БД создаёт при необходимости (для Railway Volume)."""
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS lessons (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                lesson_date TEXT NOT NULL,
-                lesson_time TEXT NOT NULL,
-                duration_minutes INTEGER DEFAULT 60,
-                max_students INTEGER DEFAULT 1,
-                description TEXT DEFAULT '',
-                lesson_link TEXT DEFAULT '',
-                created_at TEXT NOT NULL
-            )
-        """)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS bookings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                lesson_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                username TEXT,
-                first_name TEXT,
-                created_at TEXT NOT NULL,
-                UNIQUE(lesson_id, user_id),
-                FOREIGN KEY (lesson_id) REFERENCES lessons(id)
-            )
-        """)
-        try:
-            await db.execute("ALTER TABLE lessons ADD COLUMN description TEXT DEFAULT ''")
-        except Exception:
-            pass
-        try:
-            await db.execute("ALTER TABLE lessons ADD COLUMN lesson_link TEXT DEFAULT ''")
-        except Exception:
-            pass
-        try:
-            await db.execute("ALTER TABLE blocked_slots ADD COLUMN lesson_link TEXT DEFAULT ''")
-        except Exception:
-            pass
-        try:
-            await db.execute("ALTER TABLE blocked_slots ADD COLUMN student_user_id INTEGER")
-        except Exception:
-            pass
-        # blocked_slots: несколько учеников на одно время (без UNIQUE)
-        cursor = await db.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='blocked_slots'"
-        )
-        has_blocked = (await cursor.fetchone()) is not None
-        if has_blocked:
-            await db.execute("""
-                CREATE TABLE blocked_slots_new (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_name TEXT NOT NULL,
-                    day_of_week INTEGER NOT NULL,
-                    lesson_time TEXT NOT NULL,
-                    student_username TEXT DEFAULT '',
-                    created_at TEXT NOT NULL,
-                    lesson_link TEXT DEFAULT '',
-                    student_user_id INTEGER
-                )
-            """)
-            # Копируем все колонки; lesson_link и student_user_id могли быть добавлены ALTER'ами выше
-            await db.execute("""
-                INSERT INTO blocked_slots_new
-                SELECT id, student_name, day_of_week, lesson_time, COALESCE(student_username,''), created_at,
-                       COALESCE(lesson_link,''), student_user_id
-                FROM blocked_slots
-            """)
-            await db.execute("DROP TABLE blocked_slots")
-            await db.execute("ALTER TABLE blocked_slots_new RENAME TO blocked_slots")
-        else:
-            await db.execute("""
-                CREATE TABLE blocked_slots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_name TEXT NOT NULL,
-                    day_of_week INTEGER NOT NULL,
-                    lesson_time TEXT NOT NULL,
-                    student_username TEXT DEFAULT '',
-                    created_at TEXT NOT NULL,
-                    lesson_link TEXT DEFAULT '',
-                    student_user_id INTEGER
-                )
-            """)
-        # Раздел ЕГЭ: 27 заданий (пример решения + краткое объяснение), источник — code-enjoy.ru
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS ege_tasks (
-                task_number INTEGER PRIMARY KEY CHECK (task_number >= 1 AND task_number <= 27),
-                title TEXT NOT NULL DEFAULT '',
-                example_solution TEXT NOT NULL DEFAULT '',
-                explanation TEXT NOT NULL DEFAULT '',
-                source_url TEXT DEFAULT '',
-                solution_image TEXT DEFAULT '',
-                task_image TEXT DEFAULT ''
-            )
-        """)
-        for col in ("solution_image", "task_image", "subtasks"):
-            try:
-                await db.execute(f"ALTER TABLE ege_tasks ADD COLUMN {col} TEXT DEFAULT ''")
-            except Exception:
-                pass
-        # ЕГЭ Математика: 19 заданий (текст задания + решение)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS ege_math_tasks (
-                task_number INTEGER PRIMARY KEY CHECK (task_number >= 1 AND task_number <= 19),
-                task_text TEXT DEFAULT '',
-                solution_text TEXT DEFAULT ''
-            )
-        """)
-        # Банк вариантов ЕГЭ Математика: по номеру (1–19) может быть несколько заданий
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS ege_math_bank (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                task_number INTEGER NOT NULL CHECK (task_number >= 1 AND task_number <= 19),
-                task_text TEXT DEFAULT '',
-                solution_text TEXT DEFAULT ''
-            )
-        """)
-        # Один раз переносим данные из ege_math_tasks в банк, если банк пуст
-        try:
-            cur = await db.execute("SELECT COUNT(*) FROM ege_math_bank")
-            (bank_count,) = (await cur.fetchone()) or (0,)
-            if bank_count == 0:
-                cursor = await db.execute(
-                    "SELECT task_number, task_text, solution_text FROM ege_math_tasks WHERE COALESCE(TRIM(task_text), '') != ''"
-                )
-                rows = await cursor.fetchall()
-                for (tn, tt, st) in rows:
-                    await db.execute(
-                        "INSERT INTO ege_math_bank (task_number, task_text, solution_text) VALUES (?, ?, ?)",
-                        (tn, tt or "", st or ""),
-                    )
-        except Exception:
-            pass
-        # Репетиторы, добавленные админом через бота (объединяются с TUTOR_USER_IDS из конфига)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS tutor_user_ids (
-                user_id INTEGER PRIMARY KEY
-            )
-        """)
-        # Заявки учеников на свободное время (раздел для репетитора)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS free_time_requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                username TEXT DEFAULT '',
-                first_name TEXT DEFAULT '',
-                requested_date TEXT NOT NULL,
-                requested_time TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-        """)
-        await db.commit()
+    async with _write() as db:
+        await migrate(db)
 
 
 async def get_tutor_user_ids_from_db() -> set:
     """ID репетиторов, добавленных через бота (админ)."""
     result = set()
-    async with aiosqlite.connect(DB_PATH) as conn:
+    async with _read() as conn:
         cursor = await conn.execute("SELECT user_id FROM tutor_user_ids")
         rows = await cursor.fetchall()
         for (uid,) in rows:
@@ -182,10 +197,9 @@ async def get_tutor_user_ids_from_db() -> set:
 
 async def add_tutor_user_id(user_id: int) -> bool:
     """Добавить репетитора по ID (из админ-меню бота). Возвращает True если добавлен."""
-    async with aiosqlite.connect(DB_PATH) as conn:
+    async with _write() as conn:
         try:
             await conn.execute("INSERT OR IGNORE INTO tutor_user_ids (user_id) VALUES (?)", (user_id,))
-            await conn.commit()
             return True
         except Exception:
             return False
@@ -193,12 +207,95 @@ async def add_tutor_user_id(user_id: int) -> bool:
 
 async def remove_tutor_user_id(user_id: int) -> bool:
     """Убрать репетитора из списка (добавленного через бота)."""
-    async with aiosqlite.connect(DB_PATH) as conn:
+    async with _write() as conn:
         cursor = await conn.execute("DELETE FROM tutor_user_ids WHERE user_id = ?", (user_id,))
-        await conn.commit()
         return cursor.rowcount > 0
 
 
+# Напоминания об уроке: вид -> за сколько до начала. Хранятся в таблице reminders (переживают перезапуск бота).
+REMINDER_OFFSETS = {"1day": timedelta(days=1), "1hour": timedelta(hours=1)}
+
+_INSERT_REMINDER = "INSERT OR IGNORE INTO reminders (lesson_id, kind, remind_at) VALUES (?, ?, ?)"
+
+
+def _reminder_rows(lesson_id: int, lesson_date: str, lesson_time: str, now: datetime) -> list[tuple]:
+    """Строки reminders для урока: только напоминания, время которых ещё не прошло. remind_at — «YYYY-MM-DD HH:MM»."""
+    try:
+        start = datetime.strptime(f"{lesson_date} {lesson_time}", "%Y-%m-%d %H:%M")
+    except ValueError:
+        return []
+    rows = []
+    for kind, offset in REMINDER_OFFSETS.items():
+        remind_at = start - offset
+        if localize_naive(remind_at) > now:
+            rows.append((lesson_id, kind, remind_at.strftime("%Y-%m-%d %H:%M")))
+    return rows
+
+
+async def get_pending_reminders() -> list[dict]:
+    """Все неотправленные напоминания с датой/временем урока — одним запросом (восстановление при старте)."""
+    async with _read() as db:
+        cursor = await db.execute(
+            """SELECT r.lesson_id, r.kind, r.remind_at, l.lesson_date, l.lesson_time
+               FROM reminders r JOIN lessons l ON l.id = r.lesson_id
+               WHERE r.status = 'pending'
+               ORDER BY r.remind_at"""
+        )
+        rows = await cursor.fetchall()
+        return [dict(r) for r in rows]
+
+
+async def claim_reminder(lesson_id: int, kind: str) -> bool:
+    """Отмечает напоминание отправленным. False — уже отправлено/пропущено (повторно не шлём)."""
+    async with _write() as db:
+        cursor = await db.execute(
+            "UPDATE reminders SET status = 'sent' WHERE lesson_id = ? AND kind = ? AND status = 'pending'",
+            (lesson_id, kind),
+        )
+        return cursor.rowcount > 0
+
+
+async def skip_reminders(items: list[tuple[int, str]]) -> None:
+    """Отмечает напоминания (lesson_id, kind) пропущенными — опоздали больше допустимого."""
+    if not items:
+        return
+    async with _write() as db:
+        await db.executemany(
+            "UPDATE reminders SET status = 'skipped' WHERE lesson_id = ? AND kind = ? AND status = 'pending'",
+            items,
+        )
+
+
+# Версии расписания для кэша сводки дня (handlers/tutor.py): ключ ("day", дата) — уроки и записи на дату,
+# ("weekday", 0–6) — закреплённые слоты дня недели, ("slots",) — любое изменение слотов (get_slot_index),
+# ("all",) — массовая очистка.
+_schedule_versions: dict[tuple, int] = {}
+
+
+def _bump_schedule(keys) -> None:
+    for key in keys:
+        _schedule_versions[key] = _schedule_versions.get(key, 0) + 1
+
+
+def _touch_schedule(*keys: tuple) -> None:
+    """Вызывается после записи: внутри transaction() — откладывается до commit."""
+    touched = _tx_touched.get()
+    if touched is not None:
+        touched.extend(keys)
+    else:
+        _bump_schedule(keys)
+
+
+def schedule_version(day_date: str) -> tuple[int, int, int]:
+    """Версия данных сводки на дату: меняется при любом изменении уроков/записей этой даты и слотов её дня недели."""
+    weekday = datetime.strptime(day_date, "%Y-%m-%d").weekday()
+    return (
+        _schedule_versions.get(("day", day_date), 0),
+        _schedule_versions.get(("weekday", weekday), 0),
+        _schedule_versions.get(("all",), 0),
+    )
+
+
 async def add_lesson(
     title: str,
     lesson_date: str,
@@ -208,27 +305,67 @@ async def add_lesson(
     description: str = "",
     lesson_link: str = "",
 ) -> int:
-    """Добавляет урок. Возвращает id урока."""
-    async with aiosqlite.connect(DB_PATH) as conn:
+    """Добавляет урок (и его напоминания — той же транзакцией). Возвращает id урока."""
+    async with _write() as conn:
         cursor = await conn.execute(
             """INSERT INTO lessons (title, lesson_date, lesson_time, duration_minutes, max_students, description, lesson_link, created_at)
                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
             (title, lesson_date, lesson_time, duration_minutes, max_students, description or "", (lesson_link or "").strip(), datetime.utcnow().isoformat()),
         )
-        await conn.commit()
-        return cursor.lastrowid
+        lesson_id = cursor.lastrowid
+        await conn.executemany(_INSERT_REMINDER, _reminder_rows(lesson_id, lesson_date, lesson_time, now_tz()))
+    _touch_schedule(("day", lesson_date))
+    return lesson_id
+
+
+async def add_lessons_bulk(lessons: list[dict]) -> list[int]:
+    """
+    Добавляет серию уроков одной транзакцией (executemany). lessons — словари с полями как у add_lesson.
+    Возвращает id уроков в том же порядке.
+    """
+    if not lessons:
+        return []
+    created_at = datetime.now(UTC).replace(tzinfo=None).isoformat()  # как add_lesson: UTC без пояса
+    params = [
+        (
+            lesson["title"],
+            lesson["lesson_date"],
+            lesson["lesson_time"],
+            lesson.get("duration_minutes", 60),
+            lesson.get("max_students", 1),
+            lesson.get("description") or "",
+            (lesson.get("lesson_link") or "").strip(),
+            created_at,
+        )
+        for lesson in lessons
+    ]
+    async with _write() as conn:
+        if not conn.in_transaction:
+            await conn.execute("BEGIN IMMEDIATE")
+        await conn.executemany(
+            """INSERT INTO lessons (title, lesson_date, lesson_time, duration_minutes, max_students, description, lesson_link, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            params,
+        )
+        # AUTOINCREMENT + блокировка записи на всю транзакцию: id серии идут подряд и заканчиваются на MAX(id)
+        cursor = await conn.execute("SELECT MAX(id) FROM lessons")
+        (last_id,) = await cursor.fetchone()
+        ids = list(range(last_id - len(params) + 1, last_id + 1))
+        now = now_tz()
+        await conn.executemany(_INSERT_REMINDER, [
+            row
+            for lesson_id, lesson in zip(ids, lessons)
+            for row in _reminder_rows(lesson_id, lesson["lesson_date"], lesson["lesson_time"], now)
+        ])
+    _touch_schedule(*{("day", lesson["lesson_date"]) for lesson in lessons})
+    return ids
 
 
 async def get_lessons_on_date(lesson_date: str):
     """Уроки на указанную дату (YYYY-MM-DD) с количеством записей."""
-    async with aiosqlite.connect(DB_PATH) as conn:
-        conn.row_factory = aiosqlite.Row
+    async with _read() as conn:
         cursor = await conn.execute(
-            """SELECT l.*,
-                      (SELECT COUNT(*) FROM bookings b WHERE b.lesson_id = l.id) AS booked_count
-               FROM lessons l
-               WHERE l.lesson_date = ?
-               ORDER BY l.lesson_time""",
+            "SELECT * FROM lessons WHERE lesson_date = ? ORDER BY lesson_time",
             (lesson_date,),
         )
         rows = await cursor.fetchall()
@@ -237,8 +374,7 @@ async def get_lessons_on_date(lesson_date: str):
 
 async def get_lessons_at(lesson_date: str, lesson_time: str):
     """Уроки на указанные дату и время (для отправки ссылки за минуту до начала)."""
-    async with aiosqlite.connect(DB_PATH) as conn:
-        conn.row_factory = aiosqlite.Row
+    async with _read() as conn:
         cursor = await conn.execute(
             "SELECT * FROM lessons WHERE lesson_date = ? AND lesson_time = ?",
             (lesson_date, lesson_time),
@@ -251,14 +387,11 @@ async def get_upcoming_lessons(limit: int = 50):
     """Список предстоящих уроков (дата >= сегодня), отсортированных по дате и времени.
     Используется дата в настроенном часовом поясе (TIMEZONE) или локальная."""
     today = now_tz().strftime("%Y-%m-%d")
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
-            """SELECT l.*,
-                      (SELECT COUNT(*) FROM bookings b WHERE b.lesson_id = l.id) AS booked_count
-               FROM lessons l
-               WHERE l.lesson_date >= ?
-               ORDER BY l.lesson_date, l.lesson_time
+            """SELECT * FROM lessons
+               WHERE lesson_date >= ?
+               ORDER BY lesson_date, lesson_time
                LIMIT ?""",
             (today, limit),
         )
@@ -268,14 +401,11 @@ async def get_upcoming_lessons(limit: int = 50):
 
 async def get_lessons_in_range(from_date: str, to_date: str):
     """Уроки в диапазоне дат (включительно), по дате и времени."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
-            """SELECT l.*,
-                      (SELECT COUNT(*) FROM bookings b WHERE b.lesson_id = l.id) AS booked_count
-               FROM lessons l
-               WHERE l.lesson_date >= ? AND l.lesson_date <= ?
-               ORDER BY l.lesson_date, l.lesson_time""",
+            """SELECT * FROM lessons
+               WHERE lesson_date >= ? AND lesson_date <= ?
+               ORDER BY lesson_date, lesson_time""",
             (from_date, to_date),
         )
         rows = await cursor.fetchall()
@@ -289,13 +419,13 @@ async def add_blocked_slot(
     student_username: str = "",
 ) -> tuple[bool, str]:
     """Закрепляет слот за учеником. На одно время можно несколько учеников."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             """INSERT INTO blocked_slots (student_name, day_of_week, lesson_time, student_username, created_at)
                VALUES (?, ?, ?, ?, ?)""",
             (student_name.strip(), day_of_week, lesson_time, (student_username or "").strip().lstrip("@"), datetime.utcnow().isoformat()),
         )
-        await db.commit()
+    _touch_schedule(("weekday", day_of_week), ("slots",))
     return True, f"Слот закреплён за {student_name.strip()}"
 
 
@@ -304,8 +434,7 @@ async def get_blocked_slots_for_student(username: str) -> list:
     if not (username or "").strip():
         return []
     u = (username or "").strip().lower().lstrip("@")
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             "SELECT * FROM blocked_slots WHERE LOWER(TRIM(student_username)) = ? ORDER BY day_of_week, lesson_time",
             (u,),
@@ -315,8 +444,7 @@ async def get_blocked_slots_for_student(username: str) -> list:
 
 
 async def get_blocked_slot_by_id(slot_id: int):
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute("SELECT * FROM blocked_slots WHERE id = ?", (slot_id,))
         row = await cursor.fetchone()
         return dict(row) if row else None
@@ -324,8 +452,7 @@ async def get_blocked_slot_by_id(slot_id: int):
 
 async def get_all_blocked_slots():
     """Все занятые слоты, отсортированные по дню и времени."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             "SELECT * FROM blocked_slots ORDER BY day_of_week, lesson_time"
         )
@@ -341,8 +468,7 @@ async def get_blocked_slot(day_of_week: int, lesson_time: str):
 
 async def get_blocked_slots(day_of_week: int, lesson_time: str) -> list:
     """Возвращает список слотов (несколько учеников на одно время)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             "SELECT * FROM blocked_slots WHERE day_of_week = ? AND lesson_time = ? ORDER BY id",
             (day_of_week, lesson_time),
@@ -353,8 +479,7 @@ async def get_blocked_slots(day_of_week: int, lesson_time: str) -> list:
 
 async def get_blocked_slots_for_day(day_of_week: int) -> list:
     """Все закреплённые слоты на один день недели (для рассылки ссылки и сводки)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             "SELECT * FROM blocked_slots WHERE day_of_week = ? ORDER BY lesson_time",
             (day_of_week,),
@@ -363,17 +488,36 @@ async def get_blocked_slots_for_day(day_of_week: int) -> list:
         return [dict(r) for r in rows]
 
 
+# Индекс занятий по слотам (recurrence.py) вместе с версией слотов, из которой он построен
+_slot_index: tuple[tuple[int, int], SlotOccurrenceIndex] | None = None
+
+
+async def get_slot_index() -> SlotOccurrenceIndex:
+    """Закреплённые слоты, развёрнутые в занятия. Перестраивается после записи в blocked_slots."""
+    global _slot_index
+    version = (_schedule_versions.get(("slots",), 0), _schedule_versions.get(("all",), 0))
+    if _slot_index is not None and _slot_index[0] == version:
+        return _slot_index[1]
+    index = SlotOccurrenceIndex(await get_all_blocked_slots())
+    if _tx_conn.get() is None:
+        _slot_index = (version, index)
+    return index
+
+
 async def delete_blocked_slot(slot_id: int) -> bool:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("DELETE FROM blocked_slots WHERE id = ?", (slot_id,))
-        await db.commit()
-        return cursor.rowcount > 0
+    async with _write() as db:
+        cursor = await db.execute("SELECT day_of_week FROM blocked_slots WHERE id = ?", (slot_id,))
+        row = await cursor.fetchone()
+        if not row:
+            return False
+        await db.execute("DELETE FROM blocked_slots WHERE id = ?", (slot_id,))
+    _touch_schedule(("weekday", row[0]), ("slots",))
+    return True
 
 
 async def get_lesson(lesson_id: int):
     """Один урок по id."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             "SELECT * FROM lessons WHERE id = ?", (lesson_id,)
         )
@@ -384,19 +528,17 @@ async def get_lesson(lesson_id: int):
 async def update_lesson_link(lesson_id: int, link: str) -> bool:
     """Установить или убрать ссылку на урок. Возвращает True если урок найден."""
     link = (link or "").strip()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         cursor = await db.execute(
             "UPDATE lessons SET lesson_link = ? WHERE id = ?",
             (link, lesson_id),
         )
-        await db.commit()
         return cursor.rowcount > 0
 
 
 async def get_bookings_for_lesson(lesson_id: int):
     """Список записей на урок."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             "SELECT * FROM bookings WHERE lesson_id = ? ORDER BY created_at",
             (lesson_id,),
@@ -410,51 +552,97 @@ async def book_lesson(lesson_id: int, user_id: int, username: str = None, first_
     Записать ученика на урок.
     Возвращает (успех, сообщение).
     """
-    lesson = await get_lesson(lesson_id)
-    if not lesson:
-        return False, "Урок не найден."
-    lesson_date = lesson["lesson_date"]
-    lesson_time = lesson["lesson_time"]
-    max_students = lesson["max_students"]
-
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
+        # BEGIN IMMEDIATE сразу берёт блокировку на запись: проверка мест и вставка — одна транзакция,
+        # даже если пишут несколько процессов (скрипты) мимо пула
+        if not db.in_transaction:
+            await db.execute("BEGIN IMMEDIATE")
         cursor = await db.execute(
-            "SELECT COUNT(*) FROM bookings WHERE lesson_id = ?", (lesson_id,)
+            "SELECT title, lesson_date, lesson_time, max_students FROM lessons WHERE id = ?", (lesson_id,)
         )
-        (count,) = (await cursor.fetchone())
-        if count >= max_students:
-            return False, f"На этот урок уже записано максимум человек ({max_students})."
-
+        lesson = await cursor.fetchone()
+        if not lesson:
+            return False, "Урок не найден."
         try:
-            await db.execute(
+            # Вставка проходит только при свободном месте: ёмкость проверяется тем же запросом
+            cursor = await db.execute(
                 """INSERT INTO bookings (lesson_id, user_id, username, first_name, created_at)
-                   VALUES (?, ?, ?, ?, ?)""",
-                (lesson_id, user_id, username or "", first_name or "", datetime.utcnow().isoformat()),
+                   SELECT id, ?, ?, ?, ? FROM lessons WHERE id = ? AND booked_count < max_students""",
+                (user_id, username or "", first_name or "", datetime.utcnow().isoformat(), lesson_id),
             )
-            await db.commit()
-            return True, f"✅ Вы записаны на урок «{lesson['title']}» — {lesson_date} в {lesson_time}."
         except aiosqlite.IntegrityError:
             return False, "Вы уже записаны на этот урок."
+        if not cursor.rowcount:
+            return False, f"На этот урок уже записано максимум человек ({lesson['max_students']})."
+    _touch_schedule(("day", lesson["lesson_date"]))
+    return True, f"✅ Вы записаны на урок «{lesson['title']}» — {lesson['lesson_date']} в {lesson['lesson_time']}."
 
 
 async def cancel_booking(lesson_id: int, user_id: int) -> tuple[bool, str]:
     """Отменить запись на урок."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         cursor = await db.execute(
             "DELETE FROM bookings WHERE lesson_id = ? AND user_id = ?",
             (lesson_id, user_id),
         )
-        await db.commit()
-        if cursor.rowcount:
-            return True, "✅ Запись отменена."
-        return False, "Запись не найдена."
+        if not cursor.rowcount:
+            return False, "Запись не найдена."
+        cursor = await db.execute("SELECT lesson_date FROM lessons WHERE id = ?", (lesson_id,))
+        row = await cursor.fetchone()
+    if row:
+        _touch_schedule(("day", row[0]))
+    return True, "✅ Запись отменена."
+
+
+def utc_now(offset: timedelta = timedelta(0)) -> str:
+    """
+    Время UTC (+ offset) строкой ISO без пояса, до секунд. Так хранятся next_attempt_at в outbox и
+    created_at/used_at в homework_answers: они сравниваются в SQL как строки, поэтому «+00:00» не пишется.
+    """
+    return (datetime.now(UTC) + offset).replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+async def add_notifications(chat_ids, text: str) -> None:
+    """
+    Уведомление в outbox для каждого chat_id (отправит outbox.py). Внутри transaction() пишется вместе
+    с остальными изменениями блока: запись на урок без уведомления (и наоборот) не сохранится.
+    """
+    now = utc_now()
+    rows = [(chat_id, text, now, now) for chat_id in dict.fromkeys(chat_ids) if chat_id]
+    if not rows:
+        return
+    async with _write() as db:
+        await db.executemany(
+            "INSERT INTO outbox (chat_id, text, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+
+async def get_due_notifications(limit: int = 50) -> list[dict]:
+    """Уведомления, которые пора отправить (в порядке очереди)."""
+    async with _read() as db:
+        cursor = await db.execute(
+            """SELECT id, chat_id, text, attempts FROM outbox
+               WHERE next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?""",
+            (utc_now(), limit),
+        )
+        return [dict(r) for r in await cursor.fetchall()]
+
+
+async def finish_notifications(done_ids: list[int], retry: list[tuple[str, str, int]]) -> None:
+    """Итог обхода outbox: done_ids — удалить (доставлены/сняты), retry — (next_attempt_at, ошибка, id)."""
+    async with _write() as db:
+        await db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in done_ids])
+        await db.executemany(
+            "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            retry,
+        )
 
 
 async def get_my_bookings(user_id: int):
     """Уроки, на которые записан пользователь (предстоящие)."""
     today = now_tz().strftime("%Y-%m-%d")
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             """SELECT l.*, b.created_at AS booked_at
                FROM bookings b
@@ -474,19 +662,11 @@ async def delete_lesson(lesson_id: int) -> tuple[bool, dict | None, list]:
         return False, None, []
     bookings = await get_bookings_for_lesson(lesson_id)
     user_ids = [b["user_id"] for b in bookings]
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute("DELETE FROM bookings WHERE lesson_id = ?", (lesson_id,))
         cursor = await db.execute("DELETE FROM lessons WHERE id = ?", (lesson_id,))
-        await db.commit()
-        return (cursor.rowcount > 0, lesson, user_ids)
-
-
-async def get_all_lesson_ids():
-    """Все id уроков (для очистки напоминаний)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id FROM lessons")
-        rows = await cursor.fetchall()
-        return [r[0] for r in rows]
+    _touch_schedule(("day", lesson["lesson_date"]))
+    return (cursor.rowcount > 0, lesson, user_ids)
 
 
 async def add_free_time_request(
@@ -497,19 +677,17 @@ async def add_free_time_request(
     requested_time: str,
 ) -> None:
     """Сохранить заявку ученика на свободное время."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             """INSERT INTO free_time_requests (user_id, username, first_name, requested_date, requested_time, created_at)
                VALUES (?, ?, ?, ?, ?, ?)""",
             (user_id, username or "", first_name or "", requested_date, requested_time, datetime.utcnow().isoformat()),
         )
-        await db.commit()
 
 
 async def get_free_time_requests(limit: int = 50):
     """Список заявок на свободное время (новые сверху)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             """SELECT * FROM free_time_requests ORDER BY created_at DESC LIMIT ?""",
             (limit,),
@@ -520,7 +698,7 @@ async def get_free_time_requests(limit: int = 50):
 
 async def clear_all_schedule() -> tuple[int, int]:
     """Удаляет все уроки, записи и занятые слоты. Возвращает (кол-во уроков, кол-во слотов)."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         cursor = await db.execute("SELECT COUNT(*) FROM lessons")
         (n_lessons,) = (await cursor.fetchone())
         cursor = await db.execute("SELECT COUNT(*) FROM blocked_slots")
@@ -528,31 +706,32 @@ async def clear_all_schedule() -> tuple[int, int]:
         await db.execute("DELETE FROM bookings")
         await db.execute("DELETE FROM lessons")
         await db.execute("DELETE FROM blocked_slots")
-        await db.commit()
+    _touch_schedule(("all",))
     return (n_lessons, n_slots)
 
 
 async def clear_lessons_only() -> int:
     """Удаляет только уроки и записи на них; занятые слоты не трогает. Возвращает кол-во удалённых уроков."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         cursor = await db.execute("SELECT COUNT(*) FROM lessons")
         (n,) = (await cursor.fetchone())
         await db.execute("DELETE FROM bookings")
         await db.execute("DELETE FROM lessons")
-        await db.commit()
+    _touch_schedule(("all",))
     return n
 
 
 async def update_blocked_slot_link(slot_id: int, link: str) -> bool:
     """Установить ссылку для закреплённого слота."""
     link = (link or "").strip()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         cursor = await db.execute(
             "UPDATE blocked_slots SET lesson_link = ? WHERE id = ?",
             (link, slot_id),
         )
-        await db.commit()
-        return cursor.rowcount > 0
+        updated = cursor.rowcount > 0
+    _touch_schedule(("slots",))
+    return updated
 
 
 async def update_blocked_slots_user_id(username: str, user_id: int) -> None:
@@ -560,108 +739,127 @@ async def update_blocked_slots_user_id(username: str, user_id: int) -> None:
     if not (username or "").strip():
         return
     u = (username or "").strip().lower().lstrip("@")
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE blocked_slots SET student_user_id = ? WHERE LOWER(TRIM(REPLACE(COALESCE(student_username,''), '@', ''))) = ?",
-            (user_id, u),
+    async with _write() as db:
+        # Вызывается на каждый /start: уже привязанные слоты не трогаем (индекс слотов не сбрасывается зря)
+        cursor = await db.execute(
+            """UPDATE blocked_slots SET student_user_id = ?
+               WHERE LOWER(TRIM(REPLACE(COALESCE(student_username,''), '@', ''))) = ?
+                 AND student_user_id IS NOT ?""",
+            (user_id, u, user_id),
         )
-        await db.commit()
+        updated = cursor.rowcount > 0
+    if updated:
+        _touch_schedule(("slots",))
 
 
-# ——— Раздел ЕГЭ (27 заданий) ———
+# ——— Кэш ответов на домашку (homework_llm) ———
 
-def _subtask_row(task_number: int, row: dict, part: int, default_title: str) -> dict | None:
-    import json
-    raw = (row.get("subtasks") or "").strip()
-    if not raw:
-        return None
-    try:
-        data = json.loads(raw)
-        sub = data.get(str(part)) or {}
-        return {
-            "task_number": task_number,
-            "title": sub.get("title", default_title),
-            "example_solution": sub.get("example_solution", ""),
-            "explanation": sub.get("explanation", ""),
-            "source_url": row.get("source_url", ""),
-            "solution_image": sub.get("solution_image", ""),
-            "task_image": sub.get("task_image", ""),
-        }
-    except Exception:
+async def get_homework_answer(key: str, max_age_seconds: float) -> str | None:
+    """Ответ из кэша, если он моложе max_age_seconds; попадание обновляет used_at (для вытеснения) и hits."""
+    created_after = utc_now(-timedelta(seconds=max_age_seconds))
+    async with _read() as db:
+        cursor = await db.execute(
+            "SELECT answer FROM homework_answers WHERE key = ? AND created_at >= ?", (key, created_after)
+        )
+        row = await cursor.fetchone()
+    if not row:
         return None
+    async with _write() as db:
+        await db.execute(
+            "UPDATE homework_answers SET hits = hits + 1, used_at = ? WHERE key = ?", (utc_now(), key)
+        )
+    return row[0]
 
 
-async def get_ege_task(task_number: int, subtask: int | None = None) -> dict | None:
-    """Возвращает задание ЕГЭ по номеру (1–27). Для 8 и 11: subtask=1 (.X.1) или 2 (.X.2)."""
-    if not (1 <= task_number <= 27):
-        return None
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def put_homework_answer(key: str, question: str, answer: str, max_age_seconds: float, max_rows: int) -> None:
+    """Сохраняет ответ; заодно удаляет устаревшие и, сверх max_rows, давно не использованные записи."""
+    now = utc_now()
+    created_after = utc_now(-timedelta(seconds=max_age_seconds))
+    async with _write() as db:
+        await db.execute(
+            """INSERT OR REPLACE INTO homework_answers (key, question, answer, hits, created_at, used_at)
+               VALUES (?, ?, ?, 0, ?, ?)""",
+            (key, question, answer, now, now),
+        )
+        await db.execute("DELETE FROM homework_answers WHERE created_at < ?", (created_after,))
+        cursor = await db.execute("SELECT COUNT(*) FROM homework_answers")
+        (count,) = await cursor.fetchone()
+        if count > max_rows:
+            await db.execute(
+                """DELETE FROM homework_answers WHERE key IN (
+                       SELECT key FROM homework_answers ORDER BY used_at, rowid LIMIT ?
+                   )""",
+                (count - max_rows,),
+            )
+
+
+async def homework_answers_stats() -> dict:
+    """Сколько ответов в кэше и сколько раз они были выданы повторно (за всё время хранения)."""
+    async with _read() as db:
+        cursor = await db.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM homework_answers")
+        entries, stored_hits = await cursor.fetchone()
+    return {"entries": entries, "stored_hits": stored_hits}
+
+
+# ——— Раздел ЕГЭ (27 заданий) ———
+
+# Подзадания (таблица ege_subtasks): номер задания -> допустимые part. Часть 1 — сама строка ege_tasks.
+EGE_SUBTASK_PARTS = {
+    8: (2,), 11: (2,), 14: (2,), 17: (2,), 19: (2,), 20: (2,), 21: (2,), 22: (2,), 24: (2,),
+    26: (2, 3, 4, 5),
+    27: (2,),
+}
+
+
+async def _cached(key, load):
+    """Чтение контента ЕГЭ через _ege_cache. Внутри transaction() кэш не заполняем: данные ещё могут откатиться."""
+    if _tx_conn.get() is not None:
+        return await load()
+    value = _ege_cache.get(key)
+    if value is MISSING:
+        generation = _ege_cache.generation
+        value = await load()
+        _ege_cache.put(key, value, generation)
+    return value
+
+
+def ege_cache_stats() -> dict:
+    """Попадания/промахи кэша контента ЕГЭ (size, maxsize, hits, misses, hit_rate)."""
+    return _ege_cache.stats()
+
+
+async def _fetch_ege_task(task_number: int, subtask: int | None) -> dict | None:
+    async with _read() as db:
+        if subtask is not None:
+            cursor = await db.execute(
+                """SELECT s.task_number, s.title, s.example_solution, s.explanation, t.source_url,
+                          s.solution_image, s.task_image
+                   FROM ege_subtasks s JOIN ege_tasks t ON t.task_number = s.task_number
+                   WHERE s.task_number = ? AND s.part = ?""",
+                (task_number, subtask),
+            )
+            row = await cursor.fetchone()
+            if not row:
+                return None
+            row = dict(row)
+            row["title"] = row["title"] or f"Задача {task_number}.{subtask}"
+            return row
         cursor = await db.execute(
-            "SELECT task_number, title, example_solution, explanation, source_url, solution_image, task_image, subtasks FROM ege_tasks WHERE task_number = ?",
+            "SELECT task_number, title, example_solution, explanation, source_url, solution_image, task_image FROM ege_tasks WHERE task_number = ?",
             (task_number,),
         )
         row = await cursor.fetchone()
-        if not row:
-            return None
-        row = dict(row)
-        if task_number == 8 and subtask == 2:
-            out = _subtask_row(8, row, 2, "Задача 8.2")
-            if out:
-                return out
-            return None
-        if task_number == 11 and subtask == 2:
-            out = _subtask_row(11, row, 2, "Задача 11.2")
-            if out:
-                return out
-            return None
-        if task_number == 14 and subtask == 2:
-            out = _subtask_row(14, row, 2, "Задача 14.2")
-            if out:
-                return out
-            return None
-        if task_number == 17 and subtask == 2:
-            out = _subtask_row(17, row, 2, "Задача 17.2")
-            if out:
-                return out
-            return None
-        if task_number == 19 and subtask == 2:
-            out = _subtask_row(19, row, 2, "Задача 19.2")
-            if out:
-                return out
-            return None
-        if task_number == 20 and subtask == 2:
-            out = _subtask_row(20, row, 2, "Задача 20.2")
-            if out:
-                return out
-            return None
-        if task_number == 21 and subtask == 2:
-            out = _subtask_row(21, row, 2, "Задача 21.2")
-            if out:
-                return out
-            return None
-        if task_number == 22 and subtask == 2:
-            out = _subtask_row(22, row, 2, "Задача 22.2")
-            if out:
-                return out
-            return None
-        if task_number == 24 and subtask == 2:
-            out = _subtask_row(24, row, 2, "Задача 24.2")
-            if out:
-                return out
-            return None
-        if task_number == 26 and subtask is not None and 2 <= subtask <= 5:
-            out = _subtask_row(26, row, subtask, f"Задача 26.{subtask}")
-            if out:
-                return out
-            return None
-        if task_number == 27 and subtask == 2:
-            out = _subtask_row(27, row, 2, "Задача 27.2")
-            if out:
-                return out
-            return None
-        row.pop("subtasks", None)
-        return row
+        return dict(row) if row else None
+
+
+async def get_ege_task(task_number: int, subtask: int | None = None) -> dict | None:
+    """Возвращает задание ЕГЭ по номеру (1–27). subtask — номер подзадания из EGE_SUBTASK_PARTS (8.2, 26.3 …)."""
+    if not (1 <= task_number <= 27):
+        return None
+    if subtask not in EGE_SUBTASK_PARTS.get(task_number, ()):
+        subtask = None
+    row = await _cached(("ege_task", task_number, subtask), lambda: _fetch_ege_task(task_number, subtask))
+    return dict(row) if row else None
 
 
 async def set_ege_task(
@@ -676,7 +874,7 @@ async def set_ege_task(
     """Создаёт или обновляет задание ЕГЭ (1–27). task_image/solution_image — путь (ege_images/1_task.png) или URL."""
     if not (1 <= task_number <= 27):
         return
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             """INSERT INTO ege_tasks (task_number, title, example_solution, explanation, source_url, solution_image, task_image)
                VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -689,326 +887,132 @@ async def set_ege_task(
                  task_image = excluded.task_image""",
             (task_number, title or "", example_solution or "", explanation or "", source_url or "", solution_image or "", task_image or ""),
         )
-        await db.commit()
+    # source_url основного задания входит и в строки подзаданий
+    _ege_cache.invalidate(
+        ("ege_task", task_number, None),
+        ("ege_task_numbers",),
+        *(("ege_task", task_number, part) for part in EGE_SUBTASK_PARTS.get(task_number, ())),
+    )
 
 
-async def set_ege_task_8_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 8.2 (part=2) в JSON subtasks строки task_number=8."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 8")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 8", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_11_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 11.2 (part=2) в JSON subtasks строки task_number=11."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 11")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 11", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_14_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 14.2 (part=2) в JSON subtasks строки task_number=14."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 14")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 14", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_17_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 17.2 (part=2) в JSON subtasks строки task_number=17."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 17")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 17", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_19_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 19.2 (part=2) в JSON subtasks строки task_number=19."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 19")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 19", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_20_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 20.2 (part=2) в JSON subtasks строки task_number=20."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 20")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 20", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_21_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 21.2 (part=2) в JSON subtasks строки task_number=21."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 21")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 21", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_22_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 22.2 (part=2) в JSON subtasks строки task_number=22."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 22")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 22", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_24_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 24.2 (part=2) в JSON subtasks строки task_number=24."""
-    if part != 2:
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 24")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 24", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_26_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 26.2–26.5 (part=2,3,4,5) в JSON subtasks строки task_number=26."""
-    if part not in (2, 3, 4, 5):
-        return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 26")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data[str(part)] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 26", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
-
-
-async def set_ege_task_27_subtask(part: int, title: str = "", task_image: str = "", solution_image: str = "", example_solution: str = "") -> None:
-    """Обновляет подзадание 27.2 (part=2) в JSON subtasks строки task_number=27."""
-    if part != 2:
+async def set_ege_subtask(
+    task_number: int,
+    part: int,
+    title: str = "",
+    task_image: str = "",
+    solution_image: str = "",
+    example_solution: str = "",
+    explanation: str = "",
+) -> None:
+    """Создаёт или обновляет подзадание ЕГЭ (например 8.2 или 26.4). Номера и части — из EGE_SUBTASK_PARTS."""
+    if part not in EGE_SUBTASK_PARTS.get(task_number, ()):
         return
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT subtasks FROM ege_tasks WHERE task_number = 27")
-        row = await cursor.fetchone()
-        import json
-        raw = (row[0] if row else "") or "{}"
-        try:
-            data = json.loads(raw)
-        except Exception:
-            data = {}
-        data["2"] = {
-            "title": title,
-            "task_image": task_image or "",
-            "solution_image": solution_image or "",
-            "example_solution": example_solution or "",
-        }
-        await db.execute("UPDATE ege_tasks SET subtasks = ? WHERE task_number = 27", (json.dumps(data, ensure_ascii=False),))
-        await db.commit()
+    async with _write() as db:
+        await db.execute(
+            """INSERT INTO ege_subtasks (task_number, part, title, example_solution, explanation, solution_image, task_image)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(task_number, part) DO UPDATE SET
+                 title = excluded.title,
+                 example_solution = excluded.example_solution,
+                 explanation = excluded.explanation,
+                 solution_image = excluded.solution_image,
+                 task_image = excluded.task_image""",
+            (task_number, part, title or "", example_solution or "", explanation or "", solution_image or "", task_image or ""),
+        )
+    _ege_cache.invalidate(("ege_task", task_number, part))
 
 
-async def get_all_ege_task_numbers() -> list[int]:
-    """Номера заданий ЕГЭ, для которых есть запись в БД."""
-    async with aiosqlite.connect(DB_PATH) as db:
+async def _fetch_ege_task_numbers() -> list[int]:
+    async with _read() as db:
         cursor = await db.execute("SELECT task_number FROM ege_tasks ORDER BY task_number")
         rows = await cursor.fetchall()
         return [r[0] for r in rows]
 
 
+async def get_all_ege_task_numbers() -> list[int]:
+    """Номера заданий ЕГЭ, для которых есть запись в БД."""
+    return list(await _cached(("ege_task_numbers",), _fetch_ege_task_numbers))
+
+
 # ——— ЕГЭ Математика: банк вариантов (по номеру 1–19 может быть несколько заданий) ———
 
-async def get_ege_math_task(task_number: int) -> dict | None:
-    """Возвращает одно случайное задание из банка по номеру (1–19) или None."""
+async def _fetch_ege_math_max_id() -> int:
+    async with _read() as db:
+        cursor = await db.execute("SELECT MAX(id) FROM ege_math_bank")
+        return (await cursor.fetchone())[0] or 0
+
+
+async def _pick_ege_math_task(task_number: int | None, user_id: int | None) -> dict | None:
+    """Случайное задание через индекс в памяти; индекс перечитывается, если банк менялся мимо бота (скрипты)."""
+    # MAX(id) кэшируется на EGE_CACHE_TTL: новые задания из скриптов видны не позже чем через это время
+    max_id = await get_ege_math_max_id()
+    if not _math_index.loaded or max_id != _math_index.max_id:
+        async with _read() as db:
+            cursor = await db.execute(
+                "SELECT id, task_number FROM ege_math_bank WHERE COALESCE(TRIM(task_text), '') != ''"
+            )
+            _math_index.load(await cursor.fetchall(), max_id)
+    bank_id = _math_index.pick(task_number, user_id)
+    if bank_id is None:
+        return None
+    return await get_ege_math_task_by_id(bank_id)
+
+
+async def get_ege_math_task(task_number: int, user_id: int | None = None) -> dict | None:
+    """Возвращает одно случайное задание из банка по номеру (1–19) или None. С user_id — без повторов, пока не пройдены все варианты."""
     if not (1 <= task_number <= 19):
         return None
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """SELECT id, task_number, task_text, solution_text FROM ege_math_bank
-               WHERE task_number = ? AND COALESCE(TRIM(task_text), '') != ''
-               ORDER BY RANDOM() LIMIT 1""",
-            (task_number,),
-        )
-        row = await cursor.fetchone()
-        if not row:
-            return None
-        return dict(row)
+    return await _pick_ege_math_task(task_number, user_id)
 
 
-async def get_ege_math_task_by_id(bank_id: int) -> dict | None:
-    """Возвращает задание из банка по id (для показа решения конкретного варианта)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def _fetch_ege_math_task_by_id(bank_id: int) -> dict | None:
+    async with _read() as db:
         cursor = await db.execute(
             "SELECT id, task_number, task_text, solution_text FROM ege_math_bank WHERE id = ?",
             (bank_id,),
         )
         row = await cursor.fetchone()
-        if not row:
-            return None
-        return dict(row)
+        return dict(row) if row else None
+
+
+async def get_ege_math_task_by_id(bank_id: int) -> dict | None:
+    """Возвращает задание из банка по id (для показа решения конкретного варианта)."""
+    row = await _cached(("ege_math_row", bank_id), lambda: _fetch_ege_math_task_by_id(bank_id))
+    return dict(row) if row else None
 
 
 async def set_ege_math_task(task_number: int, task_text: str = "", solution_text: str = "") -> None:
     """Добавляет вариант задания в банк ЕГЭ Математика (1–19)."""
     if not (1 <= task_number <= 19):
         return
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
+    task_text = (task_text or "").strip()
+    async with _write() as db:
+        cursor = await db.execute(
             "INSERT INTO ege_math_bank (task_number, task_text, solution_text) VALUES (?, ?, ?)",
-            (task_number, (task_text or "").strip(), (solution_text or "").strip()),
+            (task_number, task_text, (solution_text or "").strip()),
         )
-        await db.commit()
+        bank_id = cursor.lastrowid
+    _ege_cache.invalidate(("ege_math_max_id",), ("ege_math_row", bank_id))
+    if _math_index.loaded:
+        _math_index.add(bank_id, task_number, listed=bool(task_text))
+
 
+async def get_ege_math_max_id() -> int:
+    """MAX(id) в банке ЕГЭ Математика (кэшируется на EGE_CACHE_TTL) — по нему видно, что банк пополнялся."""
+    return await _cached(("ege_math_max_id",), _fetch_ege_math_max_id)
 
-async def get_ege_math_random_task() -> dict | None:
-    """Возвращает одно случайное задание из банка (любой номер)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+
+async def get_ege_math_texts() -> tuple[list[tuple[int, str]], int]:
+    """Тексты заданий банка, у которых есть решение (для поиска похожего задания), и MAX(id) банка."""
+    max_id = await _fetch_ege_math_max_id()
+    async with _read() as db:
         cursor = await db.execute(
-            """SELECT id, task_number, task_text, solution_text FROM ege_math_bank
-               WHERE COALESCE(TRIM(task_text), '') != ''
-               ORDER BY RANDOM() LIMIT 1"""
+            "SELECT id, task_text FROM ege_math_bank "
+            "WHERE COALESCE(TRIM(task_text), '') != '' AND COALESCE(TRIM(solution_text), '') != ''"
         )
-        row = await cursor.fetchone()
-        if not row:
-            return None
-        return dict(row)
+        return [(r[0], r[1]) for r in await cursor.fetchall()], max_id
+
+
+async def get_ege_math_random_task(user_id: int | None = None) -> dict | None:
+    """Возвращает одно случайное задание из банка (любой номер). С user_id — без повторов, пока не пройден весь банк."""
+    return await _pick_ege_math_task(None, user_id)
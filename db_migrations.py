@@ -0,0 +1,359 @@
+"""
+Миграции схемы SQLite по PRAGMA user_version (вызываются из database.init_db).
+Каждый шаг — отдельная транзакция: изменения шага и новый user_version фиксируются вместе или откатываются вместе.
+Шаги идемпотентны: БД без user_version, созданная прежним init_db, проходит их все без ошибок.
+Новое изменение схемы — новая функция в конце MIGRATIONS; уже выпущенные шаги не меняем.
+"""
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+async def _columns(conn, table: str) -> set[str]:
+    cursor = await conn.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in await cursor.fetchall()}
+
+
+async def _add_column(conn, table: str, column: str, ddl: str) -> bool:
+    """ALTER TABLE ADD COLUMN, если колонки ещё нет. True — колонка добавлена сейчас."""
+    if column in await _columns(conn, table):
+        return False
+    await conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return True
+
+
+async def _base_schema(conn) -> None:
+    """Таблицы бота и колонки, которые раньше добавлялись ALTER'ами в init_db."""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS lessons (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            lesson_date TEXT NOT NULL,
+            lesson_time TEXT NOT NULL,
+            duration_minutes INTEGER DEFAULT 60,
+            max_students INTEGER DEFAULT 1,
+            description TEXT DEFAULT '',
+            lesson_link TEXT DEFAULT '',
+            created_at TEXT NOT NULL
+        )
+    """)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lesson_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            created_at TEXT NOT NULL,
+            UNIQUE(lesson_id, user_id),
+            FOREIGN KEY (lesson_id) REFERENCES lessons(id)
+        )
+    """)
+    # blocked_slots: несколько учеников на одно время (без UNIQUE)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS blocked_slots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_name TEXT NOT NULL,
+            day_of_week INTEGER NOT NULL,
+            lesson_time TEXT NOT NULL,
+            student_username TEXT DEFAULT '',
+            created_at TEXT NOT NULL,
+            lesson_link TEXT DEFAULT '',
+            student_user_id INTEGER
+        )
+    """)
+    # Раздел ЕГЭ: 27 заданий (пример решения + краткое объяснение), источник — code-enjoy.ru
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS ege_tasks (
+            task_number INTEGER PRIMARY KEY CHECK (task_number >= 1 AND task_number <= 27),
+            title TEXT NOT NULL DEFAULT '',
+            example_solution TEXT NOT NULL DEFAULT '',
+            explanation TEXT NOT NULL DEFAULT '',
+            source_url TEXT DEFAULT '',
+            solution_image TEXT DEFAULT '',
+            task_image TEXT DEFAULT '',
+            subtasks TEXT DEFAULT ''
+        )
+    """)
+    # ЕГЭ Математика: 19 заданий (текст задания + решение)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS ege_math_tasks (
+            task_number INTEGER PRIMARY KEY CHECK (task_number >= 1 AND task_number <= 19),
+            task_text TEXT DEFAULT '',
+            solution_text TEXT DEFAULT ''
+        )
+    """)
+    # Банк вариантов ЕГЭ Математика: по номеру (1–19) может быть несколько заданий
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS ege_math_bank (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_number INTEGER NOT NULL CHECK (task_number >= 1 AND task_number <= 19),
+            task_text TEXT DEFAULT '',
+            solution_text TEXT DEFAULT ''
+        )
+    """)
+    # Репетиторы, добавленные админом через бота (объединяются с TUTOR_USER_IDS из конфига)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS tutor_user_ids (
+            user_id INTEGER PRIMARY KEY
+        )
+    """)
+    # Заявки учеников на свободное время (раздел для репетитора)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS free_time_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            username TEXT DEFAULT '',
+            first_name TEXT DEFAULT '',
+            requested_date TEXT NOT NULL,
+            requested_time TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+    # Колонки, которых нет в БД, созданных старыми версиями бота
+    await _add_column(conn, "lessons", "description", "TEXT DEFAULT ''")
+    await _add_column(conn, "lessons", "lesson_link", "TEXT DEFAULT ''")
+    await _add_column(conn, "blocked_slots", "lesson_link", "TEXT DEFAULT ''")
+    await _add_column(conn, "blocked_slots", "student_user_id", "INTEGER")
+    for col in ("solution_image", "task_image", "subtasks"):
+        await _add_column(conn, "ege_tasks", col, "TEXT DEFAULT ''")
+
+
+async def _blocked_slots_without_unique(conn) -> None:
+    """Старые БД: blocked_slots с UNIQUE(day_of_week, lesson_time) — пересоздаём таблицу без ограничения."""
+    cursor = await conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'blocked_slots'")
+    row = await cursor.fetchone()
+    if not row or "UNIQUE" not in (row[0] or "").upper():
+        return
+    await conn.execute("""
+        CREATE TABLE blocked_slots_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_name TEXT NOT NULL,
+            day_of_week INTEGER NOT NULL,
+            lesson_time TEXT NOT NULL,
+            student_username TEXT DEFAULT '',
+            created_at TEXT NOT NULL,
+            lesson_link TEXT DEFAULT '',
+            student_user_id INTEGER
+        )
+    """)
+    await conn.execute("""
+        INSERT INTO blocked_slots_new
+        SELECT id, student_name, day_of_week, lesson_time, COALESCE(student_username,''), created_at,
+               COALESCE(lesson_link,''), student_user_id
+        FROM blocked_slots
+    """)
+    await conn.execute("DROP TABLE blocked_slots")
+    await conn.execute("ALTER TABLE blocked_slots_new RENAME TO blocked_slots")
+
+
+async def _seed_ege_math_bank(conn) -> None:
+    """Один раз переносим задания из ege_math_tasks в банк, если банк пуст."""
+    cursor = await conn.execute("SELECT 1 FROM ege_math_bank LIMIT 1")
+    if await cursor.fetchone():
+        return
+    await conn.execute("""
+        INSERT INTO ege_math_bank (task_number, task_text, solution_text)
+        SELECT task_number, COALESCE(task_text, ''), COALESCE(solution_text, '')
+        FROM ege_math_tasks
+        WHERE COALESCE(TRIM(task_text), '') != ''
+        ORDER BY task_number
+    """)
+
+
+async def _lessons_booked_count(conn) -> None:
+    """lessons.booked_count = число записей на урок, поддерживается триггерами на bookings."""
+    if await _add_column(conn, "lessons", "booked_count", "INTEGER NOT NULL DEFAULT 0"):
+        await conn.execute(
+            "UPDATE lessons SET booked_count = (SELECT COUNT(*) FROM bookings b WHERE b.lesson_id = lessons.id)"
+        )
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookings_booked_count_insert AFTER INSERT ON bookings BEGIN
+            UPDATE lessons SET booked_count = booked_count + 1 WHERE id = NEW.lesson_id;
+        END
+    """)
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookings_booked_count_delete AFTER DELETE ON bookings BEGIN
+            UPDATE lessons SET booked_count = booked_count - 1 WHERE id = OLD.lesson_id;
+        END
+    """)
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS bookings_booked_count_move AFTER UPDATE OF lesson_id ON bookings
+        WHEN NEW.lesson_id != OLD.lesson_id BEGIN
+            UPDATE lessons SET booked_count = booked_count - 1 WHERE id = OLD.lesson_id;
+            UPDATE lessons SET booked_count = booked_count + 1 WHERE id = NEW.lesson_id;
+        END
+    """)
+
+
+async def _indexes(conn) -> None:
+    """Индексы под запросы database.py (проверяются tests/test_query_plans.py: без полных сканов таблиц)."""
+    for ddl in (
+        # get_lessons_on_date / get_lessons_at / get_upcoming_lessons / get_lessons_in_range
+        "CREATE INDEX IF NOT EXISTS idx_lessons_date_time ON lessons(lesson_date, lesson_time)",
+        # get_my_bookings (по lesson_id ищет UNIQUE(lesson_id, user_id))
+        "CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings(user_id)",
+        # get_blocked_slots / get_blocked_slots_for_day / get_all_blocked_slots
+        "CREATE INDEX IF NOT EXISTS idx_blocked_slots_day_time ON blocked_slots(day_of_week, lesson_time)",
+        # get_blocked_slots_for_student
+        "CREATE INDEX IF NOT EXISTS idx_blocked_slots_username ON blocked_slots(LOWER(TRIM(student_username)))",
+        # update_blocked_slots_user_id
+        (
+            "CREATE INDEX IF NOT EXISTS idx_blocked_slots_username_bare "
+            "ON blocked_slots(LOWER(TRIM(REPLACE(COALESCE(student_username,''), '@', ''))))"
+        ),
+        # get_free_time_requests
+        "CREATE INDEX IF NOT EXISTS idx_free_time_requests_created ON free_time_requests(created_at)",
+        # get_ege_math_task
+        "CREATE INDEX IF NOT EXISTS idx_ege_math_bank_task ON ege_math_bank(task_number)",
+    ):
+        await conn.execute(ddl)
+
+
+async def _ege_subtasks(conn) -> None:
+    """Подзадания ЕГЭ (8.2, 26.2–26.5 …) — таблица с ключом (task_number, part) вместо JSON в ege_tasks.subtasks."""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS ege_subtasks (
+            task_number INTEGER NOT NULL CHECK (task_number >= 1 AND task_number <= 27),
+            part INTEGER NOT NULL,
+            title TEXT NOT NULL DEFAULT '',
+            example_solution TEXT NOT NULL DEFAULT '',
+            explanation TEXT NOT NULL DEFAULT '',
+            solution_image TEXT DEFAULT '',
+            task_image TEXT DEFAULT '',
+            PRIMARY KEY (task_number, part)
+        )
+    """)
+    # Переносим данные из JSON; сама колонка subtasks остаётся (старые версии бота), но больше не читается
+    cursor = await conn.execute("SELECT task_number, subtasks FROM ege_tasks WHERE COALESCE(subtasks, '') != ''")
+    rows = []
+    for task_number, raw in await cursor.fetchall():
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            logger.warning("ege_tasks.subtasks задания %s — не JSON, пропускаем", task_number)
+            continue
+        for part, sub in data.items():
+            if not (str(part).isdigit() and isinstance(sub, dict)):
+                continue
+            rows.append((
+                task_number, int(part), sub.get("title") or "", sub.get("example_solution") or "",
+                sub.get("explanation") or "", sub.get("solution_image") or "", sub.get("task_image") or "",
+            ))
+    await conn.executemany(
+        """INSERT OR IGNORE INTO ege_subtasks
+           (task_number, part, title, example_solution, explanation, solution_image, task_image)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        rows,
+    )
+
+
+async def _reminders(conn) -> None:
+    """Напоминания об уроках (за день/за час) в БД: переживают перезапуск, при старте бот их восстанавливает."""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminders (
+            lesson_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            remind_at TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            PRIMARY KEY (lesson_id, kind)
+        )
+    """)
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders(remind_at) WHERE status = 'pending'")
+    await conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS lessons_reminders_delete AFTER DELETE ON lessons BEGIN
+            DELETE FROM reminders WHERE lesson_id = OLD.id;
+        END
+    """)
+    # Уже созданные уроки: напоминания для тех, что ещё впереди (прошедшие по времени отсеются при старте бота)
+    await conn.execute("""
+        INSERT OR IGNORE INTO reminders (lesson_id, kind, remind_at)
+        SELECT l.id, k.kind, strftime('%Y-%m-%d %H:%M', l.lesson_date || ' ' || l.lesson_time, k.shift)
+        FROM lessons l, (SELECT '1day' AS kind, '-1 day' AS shift UNION ALL SELECT '1hour', '-1 hour') k
+        WHERE l.lesson_date >= date('now', '-1 day')
+          AND strftime('%Y-%m-%d %H:%M', l.lesson_date || ' ' || l.lesson_time) IS NOT NULL
+    """)
+
+
+async def _outbox(conn) -> None:
+    """Исходящие уведомления: пишутся вместе с изменением записи, отправляются фоновой задачей (outbox.py)."""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TEXT NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL
+        )
+    """)
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_next_attempt ON outbox(next_attempt_at)")
+
+
+async def _homework_answers(conn) -> None:
+    """Кэш ответов Yandex GPT на домашку: ключ — хэш нормализованного вопроса (homework_llm)."""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS homework_answers (
+            key TEXT PRIMARY KEY,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            used_at TEXT NOT NULL
+        )
+    """)
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_homework_answers_created ON homework_answers(created_at)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_homework_answers_used ON homework_answers(used_at)")
+
+
+# Порядок = номер версии (user_version после шага). Только дописывать в конец.
+MIGRATIONS = [
+    _base_schema,
+    _blocked_slots_without_unique,
+    _seed_ege_math_bank,
+    _lessons_booked_count,
+    _indexes,
+    _ege_subtasks,
+    _reminders,
+    _outbox,
+    _homework_answers,
+]
+
+
+async def migrate(conn) -> int:
+    """
+    Доводит схему до последней версии. Возвращает итоговый user_version.
+    Актуальная БД — одно чтение PRAGMA user_version, больше ничего.
+    """
+    latest = len(MIGRATIONS)
+    cursor = await conn.execute("PRAGMA user_version")
+    (version,) = await cursor.fetchone()
+    if version >= latest:
+        return version
+    started = time.perf_counter()
+    logger.info("Схема БД: версия %s, нужна %s — применяем миграции", version, latest)
+    for target, step in enumerate(MIGRATIONS, start=1):
+        if target <= version:
+            continue
+        t0 = time.perf_counter()
+        # IMMEDIATE: второй процесс с тем же файлом ждёт здесь, а затем видит уже новую версию
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = await conn.execute("PRAGMA user_version")
+            (current,) = await cursor.fetchone()
+            if current >= target:
+                await conn.rollback()
+                continue
+            await step(conn)
+            await conn.execute(f"PRAGMA user_version = {target}")
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            logger.error("Миграция БД %s (%s) не применена, изменения откатены", target, step.__name__)
+            raise
+        logger.info("Миграция БД %s (%s): %.0f мс", target, step.__name__, (time.perf_counter() - t0) * 1000)
+    logger.info("Схема БД обновлена до версии %s за %.0f мс", latest, (time.perf_counter() - started) * 1000)
+    return latest
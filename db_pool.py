@@ -0,0 +1,96 @@
+"""
+Пул соединений SQLite для database.py: N соединений для чтения и одно соединение для записи.
+Открывается в post_init (main.py), закрывается при остановке бота. Писатель один — записи идут по очереди.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+async def connect(path, pragmas: dict | None = None) -> aiosqlite.Connection:
+    """Открывает соединение с общими настройками: строки как aiosqlite.Row и PRAGMA из профиля (по порядку)."""
+    conn = await aiosqlite.connect(path)
+    conn.row_factory = aiosqlite.Row
+    for name, value in (pragmas or {}).items():
+        await conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class ConnectionPool:
+    """Долгоживущие соединения: читатели выдаются из очереди, писатель — под asyncio.Lock."""
+
+    def __init__(self, readers: int = 4, pragmas: dict | None = None):
+        self.readers = max(1, readers)
+        self.pragmas = pragmas or {}
+        self._free: asyncio.Queue | None = None
+        self._reader_conns: list[aiosqlite.Connection] = []
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock: asyncio.Lock | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def open(self, path) -> None:
+        if self.is_open:
+            return
+        self._writer = await connect(path, self.pragmas)
+        self._write_lock = asyncio.Lock()
+        self._free = asyncio.Queue()
+        for _ in range(self.readers):
+            conn = await connect(path, self.pragmas)
+            self._reader_conns.append(conn)
+            self._free.put_nowait(conn)
+        logger.info("Пул БД открыт: %s читателей + 1 писатель (%s)", self.readers, path)
+
+    async def close(self) -> None:
+        if not self.is_open:
+            return
+        async with self._write_lock:
+            # Дожидаемся, пока все читатели вернутся в очередь
+            for _ in self._reader_conns:
+                await self._free.get()
+            for conn in self._reader_conns:
+                await conn.close()
+            # Переносим WAL в основной файл, чтобы после остановки БД была одним файлом
+            try:
+                await self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except Exception as e:
+                logger.warning("wal_checkpoint при закрытии пула: %s", e)
+            await self._writer.close()
+            self._reader_conns = []
+            self._free = None
+            self._writer = None
+        logger.info("Пул БД закрыт.")
+
+    async def checkpoint(self, mode: str = "PASSIVE") -> tuple[int, int, int]:
+        """PRAGMA wal_checkpoint на соединении писателя. Возвращает (busy, страниц в WAL, перенесено страниц)."""
+        async with self._write_lock:
+            cursor = await self._writer.execute(f"PRAGMA wal_checkpoint({mode})")
+            row = await cursor.fetchone()
+        return tuple(row) if row else (0, 0, 0)
+
+    @asynccontextmanager
+    async def reader(self):
+        """Соединение только для SELECT. Возвращается в пул после выхода из блока."""
+        conn = await self._free.get()
+        try:
+            yield conn
+        finally:
+            self._free.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Единственное соединение для записи: commit при выходе, rollback при исключении."""
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
@@ -0,0 +1,62 @@
+"""
+Индекс банка ЕГЭ Математика в памяти: id непустых заданий по номеру (1–19) и общий список.
+Выбор случайного задания — O(1) без ORDER BY RANDOM(). Для ученика — перетасованная «колода»:
+пока он не увидит все варианты номера, повторов нет. Заполняется и обновляется из database.py.
+"""
+import random
+from collections import OrderedDict
+
+
+class EgeMathIndex:
+    """Номер задания -> id вариантов; колоды учеников по ключу (user_id, номер или None для «любого»)."""
+
+    def __init__(self, max_decks: int = 10000):
+        self.max_decks = max_decks
+        self.loaded = False
+        self.max_id = 0
+        self._by_number: dict[int, list[int]] = {}
+        self._all: list[int] = []
+        self._decks: OrderedDict[tuple[int, int | None], list[int]] = OrderedDict()
+
+    def load(self, rows, max_id: int) -> None:
+        """Полная перезагрузка: rows — пары (id, task_number) непустых заданий; max_id — MAX(id) в банке."""
+        self._by_number = {}
+        self._all = []
+        for bank_id, task_number in rows:
+            self._by_number.setdefault(task_number, []).append(bank_id)
+            self._all.append(bank_id)
+        self._decks.clear()
+        self.max_id = max_id
+        self.loaded = True
+
+    def add(self, bank_id: int, task_number: int, listed: bool = True) -> None:
+        """Новая строка банка. listed=False — задание без текста: в выдачу не попадает, но max_id учитываем."""
+        if bank_id <= self.max_id:
+            return  # уже попал в индекс при перезагрузке (id в банке только растут)
+        self.max_id = bank_id
+        if not listed:
+            return
+        self._by_number.setdefault(task_number, []).append(bank_id)
+        self._all.append(bank_id)
+        # Новый вариант попадает в ещё не пройденную часть уже начатых колод
+        for (_, deck_number), deck in self._decks.items():
+            if deck_number in (None, task_number):
+                deck.insert(random.randint(0, len(deck)), bank_id)
+
+    def pick(self, task_number: int | None = None, user_id: int | None = None) -> int | None:
+        """id случайного задания (номер task_number или любой). С user_id — без повторов до конца колоды."""
+        pool = self._all if task_number is None else self._by_number.get(task_number)
+        if not pool:
+            return None
+        if user_id is None:
+            return random.choice(pool)
+        key = (user_id, task_number)
+        deck = self._decks.get(key)
+        if not deck:
+            deck = pool[:]
+            random.shuffle(deck)
+            self._decks[key] = deck
+            if len(self._decks) > self.max_decks:
+                self._decks.popitem(last=False)
+        self._decks.move_to_end(key)
+        return deck.pop()
@@ -0,0 +1,118 @@
+"""
+Поиск похожего задания в банке ЕГЭ Математика по тексту вопроса: TF-IDF по символьным триграммам, косинусная
+близость. Вектора хранятся «по признаку» (инвертированный индекс) в плоских массивах array — без словаря на
+каждое задание; запрос перебирает только задания, у которых есть общие с ним триграммы.
+Строится из database.py (get_ege_math_texts) в homework_llm при старте и при изменении банка.
+"""
+import math
+import re
+from array import array
+
+NGRAM = 3
+_NON_WORD_RE = re.compile(r"[^\w²³√+\-*/=<>^()]+")
+# «4 - x» и «4-x» — одно и то же
+_OPERATOR_SPACES_RE = re.compile(r" ?([+\-*/=<>^()]) ?")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def _normalize(text: str) -> str:
+    text = (text or "").lower().replace("ё", "е")
+    return _OPERATOR_SPACES_RE.sub(r"\1", " ".join(_NON_WORD_RE.sub(" ", text).split()))
+
+
+def numbers(text: str) -> tuple[str, ...]:
+    """Числа из текста по порядку: задания, отличающиеся только числами, похожи, но ответы у них разные."""
+    return tuple(n.replace(",", ".") for n in _NUMBER_RE.findall(text or ""))
+
+
+def ngram_counts(text: str, n: int = NGRAM) -> dict[str, int]:
+    """Триграммы нормализованного текста (с пробелом по краям — чтобы учитывались начала и концы слов)."""
+    text = f" {_normalize(text)} "
+    counts: dict[str, int] = {}
+    for i in range(len(text) - n + 1):
+        gram = text[i:i + n]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+class EgeSimilarityIndex:
+    """
+    _terms: триграмма -> номер признака; _idf[признак]. Постинги признака t — срез
+    [_offsets[t], _offsets[t + 1]) в _doc_ids / _weights (id задания и его нормированный вес TF-IDF).
+    _numbers: id задания -> числа из его текста (для match).
+    """
+
+    def __init__(self):
+        self.max_id = 0
+        self.loaded = False
+        self._terms: dict[str, int] = {}
+        self._idf = array("f")
+        self._offsets = array("l", [0])
+        self._doc_ids = array("l")
+        self._weights = array("f")
+        self._numbers: dict[int, tuple[str, ...]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def build(self, rows, max_id: int) -> None:
+        """rows — пары (id, текст задания); max_id — MAX(id) в банке (по нему видно, что банк менялся)."""
+        rows = [(bank_id, text) for bank_id, text in rows if (text or "").strip()]
+        docs = [(bank_id, ngram_counts(text)) for bank_id, text in rows]
+        df: dict[str, int] = {}
+        for _, counts in docs:
+            for gram in counts:
+                df[gram] = df.get(gram, 0) + 1
+        terms = {gram: i for i, gram in enumerate(df)}
+        idf = array("f", (math.log((1 + len(docs)) / (1 + df[gram])) + 1 for gram in terms))
+        postings: list[list[tuple[int, float]]] = [[] for _ in terms]
+        for bank_id, counts in docs:
+            weights = {gram: (1 + math.log(c)) * idf[terms[gram]] for gram, c in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for gram, w in weights.items():
+                postings[terms[gram]].append((bank_id, w / norm))
+        offsets, doc_ids, values = array("l", [0]), array("l"), array("f")
+        for posting in postings:
+            for bank_id, w in posting:
+                doc_ids.append(bank_id)
+                values.append(w)
+            offsets.append(len(doc_ids))
+        self._terms, self._idf = terms, idf
+        self._offsets, self._doc_ids, self._weights = offsets, doc_ids, values
+        self._numbers = {bank_id: numbers(text) for bank_id, text in rows}
+        self._count = len(docs)
+        self.max_id = max_id
+        self.loaded = True
+
+    def best(self, text: str) -> tuple[int, float] | None:
+        """(id самого похожего задания, косинусная близость 0..1) или None, если общих триграмм нет."""
+        if not self.loaded:
+            return None
+        query, unknown = {}, 0.0
+        for gram, c in ngram_counts(text).items():
+            term = self._terms.get(gram)
+            if term is not None:
+                query[term] = (1 + math.log(c)) * self._idf[term]
+            else:
+                # Норма — по всем триграммам запроса, и неизвестным банку: «лишний» текст снижает близость
+                unknown += ((1 + math.log(c)) * (math.log(1 + self._count) + 1)) ** 2
+        if not query:
+            return None
+        norm = math.sqrt(sum(w * w for w in query.values()) + unknown)
+        scores: dict[int, float] = {}
+        for term, w in query.items():
+            for i in range(self._offsets[term], self._offsets[term + 1]):
+                bank_id = self._doc_ids[i]
+                scores[bank_id] = scores.get(bank_id, 0.0) + w * self._weights[i]
+        bank_id = max(scores, key=scores.get)
+        return bank_id, min(1.0, scores[bank_id] / norm)
+
+    def match(self, text: str, threshold: float) -> tuple[int, float] | None:
+        """Задание, совпадающее с вопросом: близость не ниже threshold и те же числа в том же порядке."""
+        found = self.best(text)
+        if found is None or found[1] < threshold:
+            return None
+        if self._numbers.get(found[0]) != numbers(text):
+            return None
+        return found
@@ -5,6 +5,8 @@ import logging
 from telegram import Update, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
+import llm_scheduler
+
 from . import common
 from . import student
 from . import ege
@@ -39,7 +41,8 @@ add_lesson_start = tutor.add_lesson_start
 add_lesson_receive = tutor.add_lesson_receive
 summary_cmd = tutor.summary_cmd
 daily_summary_callback = tutor.daily_summary_callback
-send_lesson_links_callback = tutor.send_lesson_links_callback
+start_lesson_dispatcher = tutor.start_lesson_dispatcher
+restore_reminders = tutor.restore_reminders
 
 add_tutor_receive = admin.add_tutor_receive
 subscription_check = common.subscription_check
@@ -71,6 +74,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             for key in FLOW_KEYS:
                 context.user_data.pop(key, None)
             user = query.from_user
+            llm_scheduler.cancel_user(user.id)
             text, keyboard = common._build_main_menu_content(
                 user.id, user.first_name, context.bot_data, context.user_data
             )
@@ -1,5 +1,6 @@
 """
-Обработчики для администратора: выбор режима, добавить репетитора, скачать БД, как видят ученики.
+Обработчики для администратора: выбор режима, добавить репетитора, скачать БД, кэш ответов на домашку,
+как видят ученики.
 """
 import io
 import logging
@@ -7,6 +8,8 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import ContextTypes
 
 import database as db
+import homework_llm
+import homework_photo
 
 from .common import (
     KEYBOARD_BACK_TO_MAIN,
@@ -62,6 +65,23 @@ async def add_tutor_receive(update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     return True
 
 
+def _kb(size: int) -> str:
+    return f"{size / 1024:.0f} КБ"
+
+
+def _photo_stats_text() -> str:
+    """Фото для OCR: скачано и отправлено в Vision против «всегда самый большой размер», среднее время OCR."""
+    photo = homework_photo.stats
+    if not photo["photos"]:
+        return "Фото с запуска бота не скачивались."
+    avg = f"{photo['ocr_seconds'] / photo['ocr_calls']:.1f} с" if photo["ocr_calls"] else "—"
+    return (
+        f"Фото: {photo['photos']}, скачано {_kb(photo['downloaded_bytes'])} "
+        f"(самый большой размер — {_kb(photo['largest_bytes'])}), "
+        f"в Vision {_kb(photo['payload_bytes'])}, OCR в среднем {avg}."
+    )
+
+
 async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str, user_id: int) -> bool:
     if data == "choose_mode_admin":
         if not is_admin(user_id, context.bot_data):
@@ -118,8 +138,7 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
                     reply_markup=InlineKeyboardMarkup(KEYBOARD_BACK_TO_MAIN),
                 )
                 return True
-            with open(path, "rb") as f:
-                data_bytes = f.read()
+            data_bytes = await db.export_db_bytes()
             await query.edit_message_text("📥 Отправляю файл базы данных…")
             await context.bot.send_document(
                 chat_id=query.message.chat_id,
@@ -137,6 +156,29 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
                 reply_markup=InlineKeyboardMarkup(KEYBOARD_BACK_TO_MAIN),
             )
         return True
+    if data == "admin_homework_cache":
+        if not is_admin(user_id, context.bot_data):
+            await query.edit_message_text("Статистика доступна только администратору.")
+            return True
+        stats = await homework_llm.cache_stats()
+        asked = stats["hits"] + stats["misses"]
+        rate = f"{100 * stats['hits'] / asked:.0f}%" if asked else "—"
+        entries, reused = (stats[k] if stats[k] is not None else "?" for k in ("entries", "stored_hits"))
+        ege = db.ege_cache_stats()
+        await query.edit_message_text(
+            "📈 Кэш ответов на домашку\n\n"
+            f"С запуска бота: {stats['hits']} из кэша, {stats['misses']} через Yandex GPT (попаданий {rate}), "
+            f"{stats['bank']} из банка ЕГЭ.\n"
+            f"Сохранено ответов: {entries} (лимит {homework_llm.HOMEWORK_CACHE_SIZE}, "
+            f"хранятся {homework_llm.HOMEWORK_CACHE_TTL_DAYS:g} дн.).\n"
+            f"Выдано повторно за всё время: {reused}.\n\n"
+            f"Распознанные фото: {stats['ocr']['size']} в памяти, повторных {stats['ocr']['hits']}.\n"
+            + _photo_stats_text()
+            + f"\n\nЗадания ЕГЭ в памяти: {ege['size']} из {ege['maxsize']}, "
+            f"попаданий {ege['hits']} из {ege['hits'] + ege['misses']} ({100 * ege['hit_rate']:.0f}%).",
+            reply_markup=InlineKeyboardMarkup(KEYBOARD_BACK_TO_MAIN),
+        )
+        return True
     if data == "tutor_preview_student":
         if not is_admin(user_id, context.bot_data):
             await query.edit_message_text("Доступно только администратору.")
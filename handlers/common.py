@@ -7,6 +7,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 import database as db
+import llm_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -222,6 +223,7 @@ def _build_main_menu_content(
             keyboard = [
                 [InlineKeyboardButton("➕ Добавить репетитора", callback_data="admin_add_tutor")],
                 [InlineKeyboardButton("📥 Скачать БД", callback_data="admin_download_db")],
+                [InlineKeyboardButton("📈 Кэш ответов", callback_data="admin_homework_cache")],
             ]
         else:
             text += "\n\n━━━━━━━━━━━━━━━━━━━━\n👩‍🏫 Режим репетитора"
@@ -304,16 +306,12 @@ def parse_day_of_week(s: str) -> int | None:
     return None
 
 
-def normalize_slot_time(t: str) -> str:
-    parsed = parse_time(t or "")
-    return parsed if parsed else (t or "").strip()
-
-
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     for key in FLOW_KEYS:
         context.user_data.pop(key, None)
     context.user_data.pop("view_as_student", None)
     user = update.effective_user
+    llm_scheduler.cancel_user(user.id)  # вопросы к GPT, ещё ждущие очереди, больше не нужны
     if is_admin(user.id, context.bot_data):
         context.user_data.pop("admin_mode", None)
     logger.info(
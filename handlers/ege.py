@@ -55,7 +55,7 @@ async def handle_callback(query, context, data: str, user_id: int) -> bool:
         if not (1 <= num <= 19):
             await query.answer("Некорректный номер.")
             return True
-        task = await db.get_ege_math_task(num)
+        task = await db.get_ege_math_task(num, user_id=query.from_user.id)
         if not task or not (task.get("task_text") or "").strip():
             await query.answer("Задание с этим номером пока не добавлено.", show_alert=True)
             return True
@@ -77,7 +77,7 @@ async def handle_callback(query, context, data: str, user_id: int) -> bool:
 
     # Случайное задание по математике (из всего банка)
     if data == "ege_math_random":
-        task = await db.get_ege_math_random_task()
+        task = await db.get_ege_math_random_task(user_id=query.from_user.id)
         if not task:
             await query.edit_message_text(
                 "Пока нет заданий по математике. Репетитор добавит их позже.",
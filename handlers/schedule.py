@@ -9,6 +9,8 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 import database as db
+from broadcast import broadcast
+from job_registry import get_registry
 
 from config_loader import now_tz
 from .common import (
@@ -24,7 +26,6 @@ from .common import (
     parse_date,
     parse_time,
     parse_day_of_week,
-    normalize_slot_time,
 )
 
 logger = logging.getLogger(__name__)
@@ -36,6 +37,13 @@ _ROOT = Path(__file__).resolve().parent.parent
 _MONTH_GENITIVE = ("января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа", "сентября", "октября", "ноября", "декабря")
 
 
+def _dispatcher_add_slot(context: ContextTypes.DEFAULT_TYPE, day_of_week: int, lesson_time: str) -> None:
+    """Новый закреплённый слот — в таймлайн ссылок к началу (lesson_dispatcher)."""
+    dispatcher = context.bot_data.get("lesson_dispatcher")
+    if dispatcher:
+        dispatcher.add_slot(day_of_week, lesson_time)
+
+
 def _format_invite_date_time(lesson_date: str, lesson_time: str) -> str:
     """Форматирует дату и время для текста приглашения: «23 февраля в 14:30»."""
     try:
@@ -68,7 +76,7 @@ async def _build_schedule_message(context: ContextTypes.DEFAULT_TYPE):
         from_date, to_date = today, to_7
         lessons = await db.get_lessons_in_range(from_date, to_date)
         period_label = f"{datetime.strptime(today, '%Y-%m-%d').strftime('%d.%m.%Y')} — {datetime.strptime(to_7, '%Y-%m-%d').strftime('%d.%m.%Y')} (7 дней)"
-    blocked = await db.get_all_blocked_slots()
+    blocked = (await db.get_slot_index()).slots
     text = "📅 Расписание"
     if period_label:
         text += f" ({period_label})\n\n"
@@ -99,8 +107,7 @@ async def _build_schedule_message(context: ContextTypes.DEFAULT_TYPE):
             text += f"——— {DAY_NAMES_FULL[dow].capitalize()} ———\n"
             by_time = {}
             for b in by_day[dow]:
-                key = normalize_slot_time(b.get("lesson_time", "") or "")
-                by_time.setdefault(key, []).append(b)
+                by_time.setdefault(b["lesson_time"], []).append(b)
             for lt in sorted(by_time.keys()):
                 names = ", ".join(s["student_name"] for s in by_time[lt])
                 text += f"   • {DAY_NAMES[dow]} {lt} — {names}\n"
@@ -226,6 +233,7 @@ async def block_slot_receive(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 data["student_name"], data["day_of_week"], data["time"],
                 student_username=data["student_username"],
             )
+            _dispatcher_add_slot(context, data["day_of_week"], data["time"])
             data["slots_added"] = data.get("slots_added", 0) + 1
             data["step"] = "more_slot"
             await update.message.reply_text(msg + "\n\nЗакрепить ещё слот за этим учеником? да или нет.")
@@ -239,6 +247,7 @@ async def block_slot_receive(update: Update, context: ContextTypes.DEFAULT_TYPE)
             data["student_name"], data["day_of_week"], data["time"],
             student_username=student_username,
         )
+        _dispatcher_add_slot(context, data["day_of_week"], data["time"])
         data["student_username"] = student_username
         data["slots_added"] = data.get("slots_added", 0) + 1
         data["step"] = "more_slot"
@@ -385,17 +394,8 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
         title = lesson.get("title") or "Урок"
         date_time_str = _format_invite_date_time(lesson.get("lesson_date") or "", lesson.get("lesson_time") or "")
         msg = f"{tutor_name} приглашает вас на занятие\n\n«{title}» {date_time_str}\n\nСсылка на занятие: {link}"
-        sent = 0
-        for b in bookings:
-            uid = b.get("user_id")
-            if not uid:
-                continue
-            try:
-                await context.bot.send_message(chat_id=uid, text=msg)
-                sent += 1
-            except Exception as e:
-                logger.warning("send_invite to %s failed: %s", uid, e)
-        await query.answer(f"Приглашение отправлено {sent} из {len(bookings)} записанным.")
+        report = await broadcast(context.bot, [b.get("user_id") for b in bookings], msg)
+        await query.answer(f"Приглашение отправлено {report.sent} из {len(bookings)} записанным.")
         text, reply_markup = await _build_schedule_message(context)
         if len(text) > SCHEDULE_TEXT_MAX:
             text = text[:SCHEDULE_TEXT_MAX] + "\n\n…"
@@ -421,16 +421,10 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
         if not is_tutor(user_id, context.bot_data):
             await query.edit_message_text(MSG_ONLY_TUTOR)
             return True
-        lesson_ids = await db.get_all_lesson_ids()
-        jq = context.application.job_queue
-        if jq and jq.scheduler:
-            for lid in lesson_ids:
-                for name in (f"remind_1d_{lid}", f"remind_1h_{lid}"):
-                    try:
-                        jq.scheduler.remove_job(name)
-                    except Exception:
-                        pass
+        get_registry(context.bot_data).cancel_all()
         n = await db.clear_lessons_only()
+        if context.bot_data.get("lesson_dispatcher"):
+            context.bot_data["lesson_dispatcher"].clear_lessons()
         text, reply_markup = await _build_schedule_message(context)
         await query.edit_message_text(f"✅ Удалено уроков: {n}.\n\n" + text, reply_markup=reply_markup)
         return True
@@ -457,16 +451,10 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
         if not is_tutor(user_id, context.bot_data):
             await query.edit_message_text(MSG_ONLY_TUTOR)
             return True
-        lesson_ids = await db.get_all_lesson_ids()
-        jq = context.application.job_queue
-        if jq and jq.scheduler:
-            for lid in lesson_ids:
-                for name in (f"remind_1d_{lid}", f"remind_1h_{lid}"):
-                    try:
-                        jq.scheduler.remove_job(name)
-                    except Exception:
-                        pass
+        get_registry(context.bot_data).cancel_all()
         n_lessons, n_slots = await db.clear_all_schedule()
+        if context.bot_data.get("lesson_dispatcher"):
+            context.bot_data["lesson_dispatcher"].clear()
         text, reply_markup = await _build_schedule_message(context)
         await query.edit_message_text(f"✅ Очищено: уроков {n_lessons}, слотов {n_slots}.\n\n" + text, reply_markup=reply_markup)
         return True
@@ -539,18 +527,10 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
         ok, lesson, user_ids = await db.delete_lesson(lesson_id)
         if ok and lesson:
             cancel_text = f"❌ Урок отменён\n\n▫️ {lesson['title']}\n📅 {lesson['lesson_date']}  ·  🕐 {lesson['lesson_time']}"
-            for uid in user_ids:
-                try:
-                    await context.bot.send_message(chat_id=uid, text=cancel_text)
-                except Exception:
-                    pass
-            jq = context.application.job_queue
-            if jq and jq.scheduler:
-                for name in (f"remind_1d_{lesson_id}", f"remind_1h_{lesson_id}"):
-                    try:
-                        jq.scheduler.remove_job(name)
-                    except Exception:
-                        pass
+            await broadcast(context.bot, user_ids, cancel_text)
+            if context.bot_data.get("lesson_dispatcher"):
+                context.bot_data["lesson_dispatcher"].remove_lesson(lesson_id)
+            get_registry(context.bot_data).cancel(lesson_id)
         await query.edit_message_text(
             "✅ Урок удалён." if ok else "❌ Не удалось удалить.",
             reply_markup=InlineKeyboardMarkup(KEYBOARD_BACK_TO_MAIN),
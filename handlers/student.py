@@ -2,11 +2,16 @@
 Обработчики для ученика: уроки, записи, свободное время, помощь с домашкой.
 """
 import logging
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 import database as db
+from broadcast import broadcast
 import homework_llm
+import homework_photo
+import llm_scheduler
+import outbox
 
 from .common import (
     FLOW_KEYS,
@@ -114,24 +119,35 @@ async def booking_username_receive(update: Update, context: ContextTypes.DEFAULT
     context.user_data.pop("booking_username_input", None)
     user_id = update.effective_user.id
     first_name = update.effective_user.first_name
-    ok, msg = await db.book_lesson(lesson_id, user_id, username=username, first_name=first_name)
+    ok, msg = await _book_and_notify(context, lesson_id, user_id, username, first_name)
     await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(KEYBOARD_BACK_TO_MAIN))
     if ok:
         await db.update_blocked_slots_user_id(username, user_id)
-        lesson = await db.get_lesson(lesson_id)
-        tutor_id = context.bot_data.get("tutor_user_id")
-        tutor_ids = context.bot_data.get("tutor_user_ids") or {tutor_id} if tutor_id else set()
-        if lesson and tutor_ids:
-            student_name = first_name or username or f"ID{user_id}"
-            notify = f"🔔 Новая запись на урок\n\n👤 {student_name} @{username}\n\n▫️ {lesson['title']}\n📅 {lesson['lesson_date']}  ·  🕐 {lesson['lesson_time']}"
-            for tid in tutor_ids:
-                try:
-                    await context.bot.send_message(chat_id=tid, text=notify)
-                except Exception:
-                    pass
+        await outbox.kick(context)
     return True
 
 
+def _tutor_ids(context: ContextTypes.DEFAULT_TYPE) -> set:
+    tutor_id = context.bot_data.get("tutor_user_id")
+    return context.bot_data.get("tutor_user_ids") or ({tutor_id} if tutor_id else set())
+
+
+async def _book_and_notify(
+    context: ContextTypes.DEFAULT_TYPE, lesson_id: int, user_id: int, username: str, first_name: str | None,
+) -> tuple[bool, str]:
+    """Запись на урок и уведомление репетиторам в outbox — одной транзакцией; отправит outbox.py."""
+    async with db.transaction():
+        ok, msg = await db.book_lesson(lesson_id, user_id, username=username, first_name=first_name)
+        lesson = await db.get_lesson(lesson_id) if ok else None
+        if lesson:
+            notify = f"🔔 Новая запись на урок\n\n👤 {first_name or username or f'ID{user_id}'}"
+            if username:
+                notify += f" @{username}"
+            notify += f"\n\n▫️ {lesson['title']}\n📅 {lesson['lesson_date']}  ·  🕐 {lesson['lesson_time']}"
+            await db.add_notifications(_tutor_ids(context), notify)
+    return ok, msg
+
+
 async def my_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     username = (update.effective_user.username or "").strip()
@@ -144,36 +160,142 @@ async def my_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     await update.message.reply_text(text, reply_markup=reply_markup)
 
 
+# Ответ GPT приходит потоком: черновик — одно сообщение, которое правится не чаще раза в HOMEWORK_EDIT_INTERVAL сек
+# (лимиты Telegram на редактирование); итоговое форматирование — одной последней правкой.
+HOMEWORK_EDIT_INTERVAL = 1.5
+_DRAFT_MAX = 3900
+# Кнопка «Ответить заново» у каждого ответа своя: homework_refresh_<id>, вопросы последних ответов — в user_data
+_HOMEWORK_QUESTIONS_KEEP = 20
+
+
+def _remember_homework_question(user_data: dict, question: dict) -> dict:
+    """Запоминает вопрос под новым id (старые сверх _HOMEWORK_QUESTIONS_KEEP забываются) и возвращает его."""
+    questions = user_data.setdefault("homework_questions", {})
+    question_id = user_data.get("homework_seq", 0) + 1
+    user_data["homework_seq"] = question_id
+    question["id"] = question_id
+    questions[question_id] = question
+    while len(questions) > _HOMEWORK_QUESTIONS_KEEP:
+        del questions[next(iter(questions))]
+    return question
+
+
+def _homework_refresh_keyboard(question_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton("🔄 Ответить заново", callback_data=f"homework_refresh_{question_id}")]]
+    )
+
+
+class _StreamingReply:
+    """Прогрессивный ответ на сообщение ученика: первый кусок — новое сообщение, дальше — его правка."""
+
+    def __init__(self, message, interval: float = HOMEWORK_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self.sent = None
+        self._shown = ""
+        self._edited_at = 0.0
+
+    async def update(self, text: str) -> None:
+        now = time.monotonic()
+        if self.sent is not None and now - self._edited_at < self.interval:
+            return
+        draft = (text[:_DRAFT_MAX] + " …") if len(text) > _DRAFT_MAX else text + " ▌"
+        if draft == self._shown:
+            return
+        try:
+            if self.sent is None:
+                self.sent = await self.message.reply_text(draft)
+            else:
+                await self.sent.edit_text(draft)
+        except Exception as e:
+            logger.debug("homework draft: %s", e)  # RetryAfter / not modified — следующий кусок догонит
+        self._shown = draft
+        self._edited_at = now
+
+    async def status(self, text: str) -> None:
+        """Служебный текст (место в очереди) в том же сообщении — потом его заменит ответ."""
+        try:
+            if self.sent is None:
+                self.sent = await self.message.reply_text(text)
+            else:
+                await self.sent.edit_text(text)
+        except Exception as e:
+            logger.debug("homework draft: %s", e)
+        self._shown = text
+
+    async def finish(self, text: str, parse_mode: str | None = None, reply_markup=None) -> None:
+        """Итоговый текст: правкой черновика, а если черновика не было (или правка не удалась) — новым сообщением."""
+        if self.sent is not None:
+            try:
+                await self.sent.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+                return
+            except Exception as e:
+                logger.warning("homework draft: итоговая правка не удалась: %s", e)
+        await self.message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+
+
 async def homework_receive(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     if not context.user_data.get("homework_help"):
         return False
     text = (update.message.text or update.message.caption or "").strip()
     photo = update.message.photo
+    if not photo and len(text) < 2:
+        await update.message.reply_text("Напиши вопрос или задание текстом, либо пришли фото с заданием.")
+        return True
+    # Для кнопки «Ответить заново»: тот же вопрос мимо кэша ответов
+    # Кэш OCR — по file_unique_id самого большого размера: он один на фото, какой бы размер ни скачивался
+    question = _remember_homework_question(context.user_data, {
+        "text": text,
+        "photo": homework_photo.pick_photo_size(photo) if photo else None,
+        "largest": photo[-1] if photo else None,
+        "file_unique_id": photo[-1].file_unique_id if photo else None,
+    })
+    # Ответ — отдельной задачей: ожидание очереди и GPT не задерживает остальные обновления бота
+    context.application.create_task(
+        _answer_homework(update.message, context, update.effective_user.id, question),
+        update=update,
+    )
+    return True
+
+
+async def _answer_homework(
+    message, context: ContextTypes.DEFAULT_TYPE, user_id: int, question: dict, use_cache: bool = True
+) -> None:
+    """Скачивает фото (если оно ещё не распознано), ждёт очереди к Yandex GPT, спрашивает и отвечает на message."""
+    text, photo, unique_id = question["text"], question["photo"], question["file_unique_id"]
+    image_text = homework_llm.cached_image_text(unique_id)
     image_bytes = None
-    if photo:
+    if photo and image_text is None:
         try:
-            largest = photo[-1]
-            tg_file = await context.bot.get_file(largest.file_id)
-            image_bytes = bytes(await tg_file.download_as_bytearray())
+            image_bytes = await homework_photo.download(context.bot, photo, question["largest"])
         except Exception as e:
             logger.warning("homework_receive: failed to download photo: %s", e)
-            await update.message.reply_text("Не удалось загрузить фото. Попробуй ещё раз или напиши текстом.")
-            return True
-    if not image_bytes and len(text) < 2:
-        await update.message.reply_text("Напиши вопрос или задание текстом, либо пришли фото с заданием.")
-        return True
+            await message.reply_text("Не удалось загрузить фото. Попробуй ещё раз или напиши текстом.")
+            return
     api_key = context.bot_data.get("yandex_api_key") or ""
     folder_id = context.bot_data.get("yandex_folder_id") or ""
+    draft = _StreamingReply(message)
+
+    async def on_position(position: int) -> None:
+        await draft.status(f"⏳ Сейчас много вопросов — ты {position}-й в очереди. Ответ придёт сюда.")
+
     try:
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-        reply = await homework_llm.ask_homework(text, api_key, folder_id, image_bytes=image_bytes)
+        await context.bot.send_chat_action(chat_id=message.chat_id, action="typing")
+        reply = await homework_llm.ask_homework(
+            text, api_key, folder_id, image_bytes=image_bytes, on_partial=draft.update, use_cache=use_cache,
+            image_id=unique_id, image_text=image_text, user_id=user_id, on_position=on_position,
+        )
+    except llm_scheduler.RequestCancelled:
+        await draft.finish("Вопрос снят: ты вышел из режима помощи с домашкой.")
+        return
     except Exception as e:
         logger.exception("homework_receive: %s", e)
-        await update.message.reply_text("Произошла ошибка при запросе. Попробуй ещё раз или /start.")
-        await update.message.reply_text("💬 Задай следующий вопрос или /start — вернуться в меню.")
-        return True
+        await draft.finish("Произошла ошибка при запросе. Попробуй ещё раз или /start.")
+        await message.reply_text("💬 Задай следующий вопрос или /start — вернуться в меню.")
+        return
     if reply == homework_llm.OCR_FAILED:
-        await update.message.reply_text(
+        await draft.finish(
             "Не удалось распознать текст на фото. Напиши задание текстом или пришли более чёткое фото."
         )
     elif reply:
@@ -181,18 +303,17 @@ async def homework_receive(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         if len(reply) > 4000:
             reply = reply[:3990] + "\n\n… (ответ обрезан)"
         body, parse_mode = _format_homework_reply_for_telegram(reply)
-        await update.message.reply_text(body, parse_mode=parse_mode)
+        await draft.finish(body, parse_mode=parse_mode, reply_markup=_homework_refresh_keyboard(question["id"]))
     else:
         if api_key and folder_id:
-            await update.message.reply_text(
+            await draft.finish(
                 "Не удалось получить ответ от Yandex GPT. Попробуй позже — репетитор может посмотреть логи."
             )
         else:
-            await update.message.reply_text(
+            await draft.finish(
                 "Не удалось получить ответ. Проверь, что у репетитора заданы YANDEX_API_KEY и YANDEX_FOLDER_ID."
             )
-    await update.message.reply_text("💬 Задай следующий вопрос или /start — вернуться в меню.")
-    return True
+    await message.reply_text("💬 Задай следующий вопрос или /start — вернуться в меню.")
 
 
 async def request_slot_receive(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
@@ -228,16 +349,7 @@ async def request_slot_receive(update: Update, context: ContextTypes.DEFAULT_TYP
         if user.username:
             req += f" @{user.username}"
         req += f"\n\nЖелаемые дата и время: {data['date']} в {time}\n\nСоздайте урок в /add_lesson — тогда он появится у ученика в «Записаться на урок»."
-        try:
-            await context.bot.send_message(chat_id=tutor_id, text=req)
-        except Exception:
-            pass
-        admin_id = context.bot_data.get("admin_user_id")
-        if admin_id and admin_id != tutor_id:
-            try:
-                await context.bot.send_message(chat_id=admin_id, text=req)
-            except Exception:
-                pass
+        await broadcast(context.bot, [tutor_id, context.bot_data.get("admin_user_id")], req)
         await update.message.reply_text(
             "✅ Запрос отправлен репетитору.\n\n"
             "Когда урок будет создан, он появится в разделе «Записаться на урок» — зайди туда и запишись.",
@@ -247,11 +359,9 @@ async def request_slot_receive(update: Update, context: ContextTypes.DEFAULT_TYP
 
 
 async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str, user_id: int) -> bool:
-    """Обрабатывает коллбэки student_*, book_, cancel_, student_unblock_. Возвращает True если обработано."""
+    """Обрабатывает коллбэки student_*, book_, cancel_, student_unblock_, homework_refresh_. Возвращает True если обработано."""
     from .common import _build_main_menu_content, KEYBOARD_BACK_TO_MAIN, format_lesson
 
-    tutor_id = context.bot_data["tutor_user_id"]
-
     if data == "student_lessons":
         lessons = await db.get_upcoming_lessons(limit=_LESSONS_LIST_MAX + 1)
         if not lessons:
@@ -317,6 +427,16 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
         )
         return True
 
+    if data.startswith("homework_refresh_"):
+        question_id = data[len("homework_refresh_"):]
+        questions = context.user_data.get("homework_questions", {})
+        question = questions.get(int(question_id)) if question_id.isdigit() else None
+        if not question:
+            await query.message.reply_text("Этот вопрос устарел — пришли его ещё раз.")
+            return True
+        context.application.create_task(_answer_homework(query.message, context, user_id, question, use_cache=False))
+        return True
+
     if data.startswith("book_"):
         lesson_id = int(data.split("_")[1])
         username = (query.from_user.username or "").strip()
@@ -328,28 +448,11 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
                 reply_markup=InlineKeyboardMarkup(KEYBOARD_BACK_TO_MAIN),
             )
             return True
-        ok, msg = await db.book_lesson(
-            lesson_id, user_id,
-            username=username,
-            first_name=query.from_user.first_name,
-        )
+        ok, msg = await _book_and_notify(context, lesson_id, user_id, username, query.from_user.first_name)
         await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(KEYBOARD_BACK_TO_MAIN))
-        if ok and username:
-            await db.update_blocked_slots_user_id(username, user_id)
         if ok:
-            lesson = await db.get_lesson(lesson_id)
-            if lesson:
-                student_name = query.from_user.first_name or username or f"ID{user_id}"
-                notify = f"🔔 Новая запись на урок\n\n👤 {student_name}"
-                if username:
-                    notify += f" @{username}"
-                notify += f"\n\n▫️ {lesson['title']}\n📅 {lesson['lesson_date']}  ·  🕐 {lesson['lesson_time']}"
-                tutor_ids = context.bot_data.get("tutor_user_ids") or {tutor_id}
-                for tid in tutor_ids:
-                    try:
-                        await context.bot.send_message(chat_id=tid, text=notify)
-                    except Exception:
-                        pass
+            await db.update_blocked_slots_user_id(username, user_id)
+            await outbox.kick(context)
         return True
 
     if data.startswith("student_unblock_"):
@@ -378,20 +481,18 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
     if data.startswith("cancel_"):
         lesson_id = int(data.split("_")[1])
         lesson = await db.get_lesson(lesson_id)
-        ok, msg = await db.cancel_booking(lesson_id, user_id)
+        async with db.transaction():
+            ok, msg = await db.cancel_booking(lesson_id, user_id)
+            if ok and lesson:
+                student_name = query.from_user.first_name or query.from_user.username or f"ID{user_id}"
+                notify = f"❌ Отмена записи\n\n👤 {student_name}"
+                if query.from_user.username:
+                    notify += f" @{query.from_user.username}"
+                notify += f" отменил(а) запись на урок\n\n▫️ {lesson.get('title', 'Урок')}\n📅 {lesson.get('lesson_date', '')}  ·  🕐 {lesson.get('lesson_time', '')}"
+                await db.add_notifications(_tutor_ids(context), notify)
         await query.edit_message_text(msg, reply_markup=InlineKeyboardMarkup(KEYBOARD_BACK_TO_MAIN))
-        if ok and lesson:
-            student_name = query.from_user.first_name or query.from_user.username or f"ID{user_id}"
-            notify = f"❌ Отмена записи\n\n👤 {student_name}"
-            if query.from_user.username:
-                notify += f" @{query.from_user.username}"
-            notify += f" отменил(а) запись на урок\n\n▫️ {lesson.get('title', 'Урок')}\n📅 {lesson.get('lesson_date', '')}  ·  🕐 {lesson.get('lesson_time', '')}"
-            tutor_ids = context.bot_data.get("tutor_user_ids") or {tutor_id}
-            for tid in tutor_ids:
-                try:
-                    await context.bot.send_message(chat_id=tid, text=notify)
-                except Exception:
-                    pass
+        if ok:
+            await outbox.kick(context)
         return True
 
     return False
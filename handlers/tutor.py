@@ -7,6 +7,10 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 import database as db
+from broadcast import broadcast, broadcast_each
+from cache import MISSING, LRUCache
+from job_registry import get_registry
+from lesson_dispatcher import LessonDispatcher
 
 from config_loader import now_tz, localize_naive
 from .common import (
@@ -44,81 +48,66 @@ def _format_summary(day_date: str, lessons: list, blocked_today: list | None = N
     return "".join(parts)
 
 
+# Готовый текст сводки по дате вместе с db.schedule_version на момент чтения: пересобирается, только если
+# с тех пор менялись уроки/записи этого дня или слоты его дня недели (ttl — на случай записи мимо бота)
+_summary_cache = LRUCache(maxsize=8, ttl=600)
+
+
+async def today_summary() -> str:
+    now = now_tz()
+    today = now.strftime("%Y-%m-%d")
+    version = db.schedule_version(today)
+    cached = _summary_cache.get(today)
+    if cached is not MISSING and cached[0] == version:
+        return cached[1]
+    lessons = await db.get_lessons_on_date(today)
+    blocked_today = (await db.get_slot_index()).on_date(now.date())
+    text = _format_summary(today, lessons, blocked_today)
+    _summary_cache.put(today, (version, text))
+    return text
+
+
 async def summary_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not is_tutor(update.effective_user.id, context.bot_data):
         await update.message.reply_text(MSG_ONLY_TUTOR)
         return
-    now = now_tz()
-    today = now.strftime("%Y-%m-%d")
-    today_weekday = now.weekday()
-    lessons = await db.get_lessons_on_date(today)
-    all_blocked = await db.get_all_blocked_slots()
-    blocked_today = [b for b in all_blocked if b["day_of_week"] == today_weekday]
     keyboard = [[InlineKeyboardButton("📅 Расписание", callback_data="tutor_schedule")]]
     keyboard.extend(KEYBOARD_BACK_TO_MAIN)
     await update.message.reply_text(
-        _format_summary(today, lessons, blocked_today),
+        await today_summary(),
         reply_markup=InlineKeyboardMarkup(keyboard),
     )
 
 
 async def daily_summary_callback(context: ContextTypes.DEFAULT_TYPE) -> None:
-    now = now_tz()
-    today = now.strftime("%Y-%m-%d")
-    today_weekday = now.weekday()
-    lessons = await db.get_lessons_on_date(today)
-    all_blocked = await db.get_all_blocked_slots()
-    blocked_today = [b for b in all_blocked if b["day_of_week"] == today_weekday]
+    """Ежедневная сводка всем репетиторам (tutor_user_ids)."""
     tutor_id = context.bot_data.get("tutor_user_id")
-    if not tutor_id:
+    tutor_ids = context.bot_data.get("tutor_user_ids") or ({tutor_id} if tutor_id else set())
+    if not tutor_ids:
         return
-    try:
-        await context.bot.send_message(
-            chat_id=tutor_id,
-            text=_format_summary(today, lessons, blocked_today),
-        )
-    except Exception:
-        pass
+    await broadcast(context.bot, tutor_ids, await today_summary())
 
 
-def _normalize_slot_time(s: str) -> str:
-    s = (s or "").strip()
-    if not s:
-        return ""
-    parts = s.split(":")
-    if len(parts) >= 2:
-        try:
-            h, m = int(parts[0]), int(parts[1])
-            return f"{h:02d}:{m:02d}"
-        except ValueError:
-            return s
-    return s
-
-
-async def send_lesson_links_callback(context: ContextTypes.DEFAULT_TYPE) -> None:
-    global_link = (context.bot_data.get("lesson_link") or "").strip()
-    now = now_tz()
-    target = now + timedelta(minutes=1)
-    target_date = target.strftime("%Y-%m-%d")
-    target_time = target.strftime("%H:%M")
-    lessons = await db.get_lessons_at(target_date, target_time)
-    for lesson in lessons:
-        link = (lesson.get("lesson_link") or "").strip() or global_link
+async def send_lesson_start_link(context: ContextTypes.DEFAULT_TYPE, key: tuple) -> bool:
+    """
+    Событие LessonDispatcher: за минуту до начала — ссылка записанным ученикам (урок) или ученикам слота.
+    Данные читаются в момент события (актуальная ссылка). False — урока/слота больше нет, событие можно забыть.
+    """
+    if key[0] == "lesson":
+        lesson = await db.get_lesson(key[1])
+        if not lesson:
+            return False
+        link = (lesson.get("lesson_link") or "").strip() or (context.bot_data.get("lesson_link") or "").strip()
         if not link:
-            continue
-        bookings = await db.get_bookings_for_lesson(lesson["id"])
+            return True
         title = lesson.get("title") or "Урок"
         msg = f"🕐 Через минуту начало: {title}\n\n👉 Ссылка на урок: {link}"
-        for b in bookings:
-            try:
-                await context.bot.send_message(chat_id=b["user_id"], text=msg)
-            except Exception:
-                pass
-    target_weekday = target.weekday()
-    slots = await db.get_blocked_slots_for_day(target_weekday)
+        await broadcast(context.bot, [b["user_id"] for b in await db.get_bookings_for_lesson(lesson["id"])], msg)
+        return True
+    _, day_of_week, target_time = key
+    slots = (await db.get_slot_index()).slots_at(day_of_week, target_time)
+    messages = []
     for slot in slots:
-        if _normalize_slot_time(slot.get("lesson_time") or "") != target_time:
-            continue
         link = (slot.get("lesson_link") or "").strip()
         if not link:
             continue
@@ -126,48 +115,101 @@ async def send_lesson_links_callback(context: ContextTypes.DEFAULT_TYPE) -> None
         if not uid:
             continue
         student_name = (slot.get("student_name") or "").strip() or "Урок"
-        msg = f"🕐 Через минуту начало: {student_name}\n\n👉 Ссылка: {link}"
-        try:
-            await context.bot.send_message(chat_id=uid, text=msg)
-        except Exception:
-            pass
+        messages.append((uid, f"🕐 Через минуту начало: {student_name}\n\n👉 Ссылка: {link}"))
+    await broadcast_each(context.bot, messages)
+    return bool(slots)
 
 
-async def _schedule_reminders(context: ContextTypes.DEFAULT_TYPE, lesson_id: int) -> None:
-    lesson = await db.get_lesson(lesson_id)
-    if not lesson:
-        return
-    try:
-        dt = datetime.strptime(f"{lesson['lesson_date']} {lesson['lesson_time']}", "%Y-%m-%d %H:%M")
-    except ValueError:
-        return
-    dt = localize_naive(dt)
+async def start_lesson_dispatcher(application) -> None:
+    """post_init: таймлайн начал уроков и слотов из БД + таймер в job_queue (см. lesson_dispatcher)."""
+    dispatcher = LessonDispatcher(send_lesson_start_link)
+    since = (now_tz() - dispatcher.catch_up).strftime("%Y-%m-%d")
+    lessons = await db.get_lessons_in_range(since, "9999-12-31")
+    slots = (await db.get_slot_index()).slots
+    dispatcher.load(lessons, slots)
+    dispatcher.start(application.job_queue)
+    application.bot_data["lesson_dispatcher"] = dispatcher
+    logger.info("Таймлайн ссылок к началу: %s событий", len(dispatcher))
+
+
+# Напоминание, время которого прошло, пока бот не работал: отправляем, если опоздание не больше REMINDER_GRACE
+# и урок ещё не начался; иначе помечаем пропущенным (текст «через 1 день/час» был бы уже неправдой).
+REMINDER_GRACE = timedelta(minutes=30)
+
+_REMINDER_JOB_PREFIX = {"1day": "remind_1d_", "1hour": "remind_1h_"}
+
+
+def _run_reminder(job_queue, bot_data: dict, lesson_id: int, kind: str, when) -> None:
+    job = job_queue.run_once(
+        _reminder_callback,
+        when,
+        data={"lesson_id": lesson_id, "kind": kind},
+        name=f"{_REMINDER_JOB_PREFIX[kind]}{lesson_id}",
+    )
+    get_registry(bot_data).add(lesson_id, kind, job)
+
+
+def _schedule_reminders(context: ContextTypes.DEFAULT_TYPE, lessons: list[dict]) -> None:
+    """Напоминания за день и за час для уроков (словари с id, lesson_date, lesson_time) — без запросов к БД."""
     job_queue = context.application.job_queue
     if not job_queue:
         return
-    when_1d = dt - timedelta(days=1)
-    when_1h = dt - timedelta(hours=1)
     now = now_tz()
-    if when_1d > now:
-        job_queue.run_once(
-            _reminder_callback,
-            when_1d,
-            data={"lesson_id": lesson_id, "kind": "1day"},
-            name=f"remind_1d_{lesson_id}",
-        )
-    if when_1h > now:
-        job_queue.run_once(
-            _reminder_callback,
-            when_1h,
-            data={"lesson_id": lesson_id, "kind": "1hour"},
-            name=f"remind_1h_{lesson_id}",
-        )
+    for lesson in lessons:
+        try:
+            dt = datetime.strptime(f"{lesson['lesson_date']} {lesson['lesson_time']}", "%Y-%m-%d %H:%M")
+        except ValueError:
+            continue
+        dt = localize_naive(dt)
+        for kind, offset in db.REMINDER_OFFSETS.items():
+            if dt - offset > now:
+                _run_reminder(job_queue, context.bot_data, lesson["id"], kind, dt - offset)
+
+
+def _plan_reminders(pending: list[dict], now: datetime) -> tuple[list, list, list]:
+    """Раскладывает сохранённые напоминания: (по расписанию [(row, when)], отправить сейчас, пропустить)."""
+    scheduled, late, skipped = [], [], []
+    for row in pending:
+        try:
+            when = localize_naive(datetime.strptime(row["remind_at"], "%Y-%m-%d %H:%M"))
+            start = localize_naive(datetime.strptime(f"{row['lesson_date']} {row['lesson_time']}", "%Y-%m-%d %H:%M"))
+        except ValueError:
+            skipped.append(row)
+            continue
+        if when > now:
+            scheduled.append((row, when))
+        elif now - when <= REMINDER_GRACE and now < start:
+            late.append(row)
+        else:
+            skipped.append(row)
+    return scheduled, late, skipped
+
+
+async def restore_reminders(application) -> None:
+    """post_init: напоминания из таблицы reminders обратно в job_queue (одним запросом), см. REMINDER_GRACE."""
+    job_queue = application.job_queue
+    if not job_queue:
+        return
+    scheduled, late, skipped = _plan_reminders(await db.get_pending_reminders(), now_tz())
+    for row, when in scheduled:
+        _run_reminder(job_queue, application.bot_data, row["lesson_id"], row["kind"], when)
+    for row in late:
+        _run_reminder(job_queue, application.bot_data, row["lesson_id"], row["kind"], 0)
+    await db.skip_reminders([(row["lesson_id"], row["kind"]) for row in skipped])
+    logger.info(
+        "Напоминания восстановлены: по расписанию %s, с опозданием %s, пропущено %s",
+        len(scheduled), len(late), len(skipped),
+    )
 
 
 async def _reminder_callback(context: ContextTypes.DEFAULT_TYPE) -> None:
     job = context.job
     lesson_id = job.data.get("lesson_id")
     kind = job.data.get("kind", "")
+    get_registry(context.bot_data).discard(lesson_id, kind)
+    # Отметка в reminders: одно напоминание уходит один раз, даже если задание поставлено дважды
+    if not await db.claim_reminder(lesson_id, kind):
+        return
     lesson = await db.get_lesson(lesson_id)
     if not lesson:
         return
@@ -176,15 +218,8 @@ async def _reminder_callback(context: ContextTypes.DEFAULT_TYPE) -> None:
         f"⏰ Напоминание: через {'1 день' if kind == '1day' else '1 час'} урок\n\n"
         f"▫️ {lesson['title']}\n📅 {lesson['lesson_date']}  ·  🕐 {lesson['lesson_time']}"
     )
-    try:
-        await context.bot.send_message(chat_id=tutor_id, text=text)
-    except Exception:
-        pass
-    for b in await db.get_bookings_for_lesson(lesson_id):
-        try:
-            await context.bot.send_message(chat_id=b["user_id"], text=text)
-        except Exception:
-            pass
+    recipients = [tutor_id] + [b["user_id"] for b in await db.get_bookings_for_lesson(lesson_id)]
+    await broadcast(context.bot, recipients, text)
 
 
 async def _post_lesson_to_channel(context: ContextTypes.DEFAULT_TYPE, lesson: dict, bot_username: str) -> None:
@@ -222,24 +257,28 @@ async def _do_create_lessons(update: Update, context: ContextTypes.DEFAULT_TYPE,
     weeks = data.get("repeat_weeks", 1)
     times = data.get("times") or [data["time"]]
     base_date = datetime.strptime(data["date"], "%Y-%m-%d").date()
-    created = []
-    for i in range(weeks):
-        lesson_date = (base_date + timedelta(weeks=i)).strftime("%Y-%m-%d")
-        for t in times:
-            lesson_id = await db.add_lesson(
-                title=data["title"],
-                lesson_date=lesson_date,
-                lesson_time=t,
-                max_students=data.get("max_students", 1),
-                description=data.get("description", ""),
-                lesson_link=data.get("lesson_link", ""),
-            )
-            await _schedule_reminders(context, lesson_id)
-            created.append((lesson_id, lesson_date, t))
-    if context.bot_data.get("channel_id") and created:
-        lesson = await db.get_lesson(created[0][0])
-        if lesson:
-            await _post_lesson_to_channel(context, lesson, context.bot_data.get("bot_username", ""))
+    lessons = [
+        {
+            "title": data["title"],
+            "lesson_date": (base_date + timedelta(weeks=i)).strftime("%Y-%m-%d"),
+            "lesson_time": t,
+            "max_students": data.get("max_students", 1),
+            "description": data.get("description", ""),
+            "lesson_link": data.get("lesson_link", ""),
+        }
+        for i in range(weeks)
+        for t in times
+    ]
+    # Вся серия — одна транзакция; напоминания ставим по тем же словарям, не перечитывая уроки
+    for lesson, lesson_id in zip(lessons, await db.add_lessons_bulk(lessons)):
+        lesson["id"] = lesson_id
+    _schedule_reminders(context, lessons)
+    dispatcher = context.bot_data.get("lesson_dispatcher")
+    if dispatcher:
+        dispatcher.add_lessons(lessons)
+    created = [(lesson["id"], lesson["lesson_date"], lesson["lesson_time"]) for lesson in lessons]
+    if context.bot_data.get("channel_id") and lessons:
+        await _post_lesson_to_channel(context, lessons[0], context.bot_data.get("bot_username", ""))
     n = len(created)
     if n == 1:
         await update.message.reply_text(f"✅ Урок создан (ID {created[0][0]}). Ученики видят в /lessons.")
@@ -352,14 +391,19 @@ async def add_lesson_receive(update: Update, context: ContextTypes.DEFAULT_TYPE)
             weeks = data.get("repeat_weeks", 1)
             times = data.get("times") or [data["time"]]
             base_date = datetime.strptime(data["date"], "%Y-%m-%d").date()
-            blocked_names_by_dt = []
+            # Закреплённые слоты, пересекающиеся с любым уроком серии: занятие -> {id слота: ученик}
+            slot_index = await db.get_slot_index()
+            overlapping = {}
             for i in range(weeks):
                 d = base_date + timedelta(weeks=i)
                 for t in times:
-                    slots = await db.get_blocked_slots(d.weekday(), t)
-                    if slots:
-                        names = ", ".join(s["student_name"] for s in slots)
-                        blocked_names_by_dt.append((d.strftime("%d.%m"), t, names))
+                    start = datetime.combine(d, datetime.strptime(t, "%H:%M").time())
+                    for at, slot in slot_index.conflicts(start):
+                        overlapping.setdefault(at, {})[slot["id"]] = slot["student_name"]
+            blocked_names_by_dt = [
+                (at.strftime("%d.%m"), at.strftime("%H:%M"), ", ".join(names.values()))
+                for at, names in sorted(overlapping.items())
+            ]
             if blocked_names_by_dt:
                 parts = [f"{d} {t} — {names}" for d, t, names in blocked_names_by_dt[:5]]
                 msg = "В это время закреплено за: " + "; ".join(parts)
@@ -389,16 +433,10 @@ async def handle_callback(query, context: ContextTypes.DEFAULT_TYPE, data: str,
         if not is_tutor(user_id, context.bot_data):
             await query.edit_message_text(MSG_ONLY_TUTOR)
             return True
-        now = now_tz()
-        today = now.strftime("%Y-%m-%d")
-        today_weekday = now.weekday()
-        lessons = await db.get_lessons_on_date(today)
-        all_blocked = await db.get_all_blocked_slots()
-        blocked_today = [b for b in all_blocked if b["day_of_week"] == today_weekday]
         keyboard = [[InlineKeyboardButton("📅 Расписание", callback_data="tutor_schedule")]]
         keyboard.extend(KEYBOARD_BACK_TO_MAIN)
         await query.edit_message_text(
-            _format_summary(today, lessons, blocked_today),
+            await today_summary(),
             reply_markup=InlineKeyboardMarkup(keyboard),
         )
         return True
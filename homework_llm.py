@@ -2,14 +2,118 @@
 Помощь с домашкой: Yandex GPT API + Yandex Vision OCR для фото.
 Нужны YANDEX_API_KEY и YANDEX_FOLDER_ID (каталог в Yandex Cloud).
 """
+import asyncio
 import base64
+import hashlib
+import json
 import logging
+import os
+import re
+from contextlib import asynccontextmanager
+
+import database as db
+import homework_photo
+import llm_scheduler
+import resilience
+from cache import LRUCache
+from ege_similarity import EgeSimilarityIndex
 
 logger = logging.getLogger(__name__)
 
 YANDEX_COMPLETION_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
 YANDEX_VISION_URL = "https://vision.api.cloud.yandex.net/vision/v1/batchAnalyze"
 
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, "").strip() or default)
+    except ValueError:
+        return default
+
+
+# Один HTTP-клиент на всё приложение (open_http_session в post_init, close_http_session при остановке):
+# соединения с API Yandex держатся открытыми (keep-alive), TCP/TLS-рукопожатие и DNS — не на каждый вопрос.
+# YANDEX_HTTP_LIMIT — соединений всего, YANDEX_HTTP_LIMIT_PER_HOST — к одному хосту,
+# YANDEX_HTTP_KEEPALIVE — сек простоя до закрытия соединения, *_TIMEOUT — сек на запрос / на подключение.
+YANDEX_HTTP_LIMIT = int(_env_float("YANDEX_HTTP_LIMIT", 20))
+YANDEX_HTTP_LIMIT_PER_HOST = int(_env_float("YANDEX_HTTP_LIMIT_PER_HOST", 10))
+YANDEX_HTTP_KEEPALIVE = _env_float("YANDEX_HTTP_KEEPALIVE", 60)
+YANDEX_CONNECT_TIMEOUT = _env_float("YANDEX_CONNECT_TIMEOUT", 10)
+YANDEX_GPT_TIMEOUT = _env_float("YANDEX_GPT_TIMEOUT", 60)
+YANDEX_OCR_TIMEOUT = _env_float("YANDEX_OCR_TIMEOUT", 30)
+# Временные ошибки API (429, 5xx, обрыв, таймаут): YANDEX_RETRIES повторов, пауза от YANDEX_RETRY_DELAY сек
+# (удваивается, со случайным разбросом). После YANDEX_BREAKER_FAILURES таких ошибок подряд запросы
+# YANDEX_BREAKER_RESET сек не отправляются — ученик сразу получает «попробуй позже» вместо ожидания таймаута.
+# *_HEDGE_AFTER — через сколько сек без ответа отправить дублирующий запрос (0 — не дублировать; у GPT
+# по умолчанию выключено — это второй платный запрос).
+YANDEX_RETRIES = int(_env_float("YANDEX_RETRIES", 2))
+YANDEX_RETRY_DELAY = _env_float("YANDEX_RETRY_DELAY", 0.5)
+YANDEX_BREAKER_FAILURES = int(_env_float("YANDEX_BREAKER_FAILURES", 5))
+YANDEX_BREAKER_RESET = _env_float("YANDEX_BREAKER_RESET", 30)
+YANDEX_OCR_HEDGE_AFTER = _env_float("YANDEX_OCR_HEDGE_AFTER", 5)
+YANDEX_GPT_HEDGE_AFTER = _env_float("YANDEX_GPT_HEDGE_AFTER", 0)
+# Ответ GPT потоком (текст появляется у ученика по мере генерации); 0 — ждать ответ целиком
+YANDEX_GPT_STREAM = os.environ.get("YANDEX_GPT_STREAM", "1").strip() not in ("0", "false", "no")
+
+# Кэш ответов в БД (homework_answers): одна и та же задача из учебника от разных учеников — один запрос к GPT.
+# HOMEWORK_CACHE_TTL_DAYS — сколько дней ответ годен, HOMEWORK_CACHE_SIZE — сколько ответов хранить (0 — кэш выключен)
+HOMEWORK_CACHE_TTL_DAYS = _env_float("HOMEWORK_CACHE_TTL_DAYS", 30)
+HOMEWORK_CACHE_SIZE = int(_env_float("HOMEWORK_CACHE_SIZE", 2000))
+
+# Распознанный текст фото в памяти: то же фото (file_unique_id Telegram, а для пересланного/пересохранённого —
+# sha256 содержимого) не скачивается и не отправляется в Vision повторно
+OCR_CACHE_SIZE = int(_env_float("OCR_CACHE_SIZE", 500))
+OCR_CACHE_TTL = _env_float("OCR_CACHE_TTL", 86400)
+
+# Вопрос почти дословно совпадает с заданием банка ЕГЭ Математика (близость не ниже EGE_MATCH_THRESHOLD, 0..1,
+# и те же числа) — отвечаем сохранённым решением без GPT; 0 — не искать в банке
+EGE_MATCH_THRESHOLD = _env_float("EGE_MATCH_THRESHOLD", 0.8)
+
+_session = None
+_ege_index = EgeSimilarityIndex()
+_gpt_breaker = resilience.CircuitBreaker("Yandex GPT", YANDEX_BREAKER_FAILURES, YANDEX_BREAKER_RESET)
+_vision_breaker = resilience.CircuitBreaker("Yandex Vision", YANDEX_BREAKER_FAILURES, YANDEX_BREAKER_RESET)
+_ocr_cache = LRUCache(maxsize=OCR_CACHE_SIZE, ttl=OCR_CACHE_TTL or None)
+# Попадания/промахи кэша ответов и ответы из банка ЕГЭ с запуска бота (для админки)
+_cache_stats = {"hits": 0, "misses": 0, "bank": 0}
+
+
+async def open_http_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        return
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(
+        limit=YANDEX_HTTP_LIMIT,
+        limit_per_host=YANDEX_HTTP_LIMIT_PER_HOST,
+        keepalive_timeout=YANDEX_HTTP_KEEPALIVE,
+        ttl_dns_cache=300,
+    )
+    _session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=YANDEX_GPT_TIMEOUT, connect=YANDEX_CONNECT_TIMEOUT),
+    )
+
+
+async def close_http_session() -> None:
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+@asynccontextmanager
+async def _http():
+    """Общая сессия бота, а вне бота (test_yandex_gpt.py и т.п.) — одноразовая."""
+    if _session is not None and not _session.closed:
+        yield _session
+        return
+    import aiohttp
+
+    async with aiohttp.ClientSession() as session:
+        yield session
+
 # Специальное значение, когда пользователь отправил только фото и OCR не смог распознать текст
 OCR_FAILED = "__OCR_FAILED__"
 
@@ -32,6 +136,35 @@ SYSTEM_PROMPT = (
 )
 
 
+def cached_image_text(file_unique_id: str | None) -> str | None:
+    """Текст фото, уже распознанного под этим file_unique_id, — тогда фото можно не скачивать."""
+    if not file_unique_id:
+        return None
+    return _ocr_cache.get(("file", file_unique_id), None)
+
+
+async def recognize_image(image_bytes: bytes, api_key: str, file_unique_id: str | None = None) -> str | None:
+    """
+    OCR с кэшем: по file_unique_id, затем по хэшу скачанного содержимого; неудачное распознавание не кэшируется.
+    В Vision уходит картинка после homework_photo.prepare (уменьшенная, если была крупнее нужного).
+    """
+    text = cached_image_text(file_unique_id)
+    if text is not None:
+        return text
+    digest = ("sha256", hashlib.sha256(image_bytes).hexdigest())
+    text = _ocr_cache.get(digest, None)
+    if text is None:
+        payload = await homework_photo.prepare(image_bytes)
+        with homework_photo.ocr_timer():
+            text = await _ocr_image(payload, api_key)
+        if not text:
+            return None
+        _ocr_cache.put(digest, text)
+    if file_unique_id:
+        _ocr_cache.put(("file", file_unique_id), text)
+    return text
+
+
 async def _ocr_image(image_bytes: bytes, api_key: str) -> str | None:
     """Извлекает текст с изображения через Yandex Vision OCR. Возвращает None при ошибке."""
     api_key = (api_key or "").strip()
@@ -46,15 +179,18 @@ async def _ocr_image(image_bytes: bytes, api_key: str) -> str | None:
             }],
         }],
     }
-    try:
+    headers = {"Authorization": f"Api-Key {api_key}", "Content-Type": "application/json"}
+
+    async def attempt():
         import aiohttp
-        async with aiohttp.ClientSession() as session:
+        async with _http() as session:
             async with session.post(
                 YANDEX_VISION_URL,
                 json=payload,
-                headers={"Authorization": f"Api-Key {api_key}", "Content-Type": "application/json"},
-                timeout=aiohttp.ClientTimeout(total=30),
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=YANDEX_OCR_TIMEOUT, connect=YANDEX_CONNECT_TIMEOUT),
             ) as resp:
+                await _raise_retryable(resp)
                 if resp.status != 200:
                     body = await resp.text()
                     preview = (body[:500] + "...") if len(body) > 500 else body
@@ -65,10 +201,21 @@ async def _ocr_image(image_bytes: bytes, api_key: str) -> str | None:
                         preview,
                     )
                     return None
-                data = await resp.json()
+                return await resp.json()
+
+    try:
+        data = await resilience.call(
+            attempt, _vision_breaker,
+            retries=YANDEX_RETRIES, base_delay=YANDEX_RETRY_DELAY, hedge_after=YANDEX_OCR_HEDGE_AFTER,
+        )
+    except resilience.CircuitOpen:
+        logger.warning("Yandex Vision OCR: API недавно не отвечало — запрос не отправлен")
+        return None
     except Exception as e:
         logger.warning("Yandex Vision OCR failed: %s", e)
         return None
+    if data is None:
+        return None
     try:
         results = data.get("results", [])
         if not results:
@@ -107,9 +254,148 @@ async def _ocr_image(image_bytes: bytes, api_key: str) -> str | None:
         return None
 
 
-async def ask_homework(user_text: str, api_key: str, folder_id: str = "", image_bytes: bytes | None = None) -> str | None:
+# Знаки препинания, не влияющие на смысл задачи; точка и запятая между цифрами (3.5, 2,75) остаются
+_PUNCT_RE = re.compile(r"(?<!\d)[.,]|[.,](?!\d)|[!?;:…«»\"'“”„]")
+
+
+async def load_ege_index() -> None:
+    """(Пере)строить поиск по банку ЕГЭ — при старте бота и когда банк пополнился."""
+    global _ege_index
+    rows, max_id = await db.get_ege_math_texts()
+    index = EgeSimilarityIndex()
+    await asyncio.to_thread(index.build, rows, max_id)
+    _ege_index = index
+    logger.info("Поиск по банку ЕГЭ: %s заданий с решением", len(index))
+
+
+async def _bank_answer(question: str) -> str | None:
+    """Решение из банка ЕГЭ, если вопрос — это задание из банка; иначе None."""
+    if EGE_MATCH_THRESHOLD <= 0:
+        return None
+    try:
+        if not _ege_index.loaded or await db.get_ege_math_max_id() != _ege_index.max_id:
+            await load_ege_index()
+        found = _ege_index.match(question, EGE_MATCH_THRESHOLD)
+        task = await db.get_ege_math_task_by_id(found[0]) if found else None
+    except Exception as e:
+        logger.warning("Поиск по банку ЕГЭ не удался: %s", e)
+        return None
+    solution = ((task or {}).get("solution_text") or "").strip()
+    if not solution:
+        return None
+    logger.info("Ответ из банка ЕГЭ: задание id=%s (близость %.2f)", found[0], found[1])
+    return f"📚 Это задание №{task['task_number']} из банка ЕГЭ по математике. Решение:\n\n{solution}"
+
+
+def normalize_question(text: str) -> str:
+    """Вид вопроса для ключа кэша: без регистра, «ё», лишних пробелов и знаков препинания."""
+    text = (text or "").lower().replace("ё", "е")
+    return " ".join(_PUNCT_RE.sub(" ", text).split())
+
+
+def _cache_key(user_text: str) -> str:
+    # Промпт в ключе: после его правки старые ответы просто перестают находиться
+    return hashlib.sha256(f"{SYSTEM_PROMPT}\0{normalize_question(user_text)}".encode()).hexdigest()
+
+
+async def _cache_get(key: str) -> str | None:
+    try:
+        return await db.get_homework_answer(key, HOMEWORK_CACHE_TTL_DAYS * 86400)
+    except Exception as e:
+        logger.warning("Кэш ответов: чтение не удалось: %s", e)
+        return None
+
+
+async def _cache_put(key: str, user_text: str, answer: str) -> None:
+    try:
+        await db.put_homework_answer(
+            key, user_text.strip(), answer, HOMEWORK_CACHE_TTL_DAYS * 86400, HOMEWORK_CACHE_SIZE
+        )
+    except Exception as e:
+        logger.warning("Кэш ответов: запись не удалась: %s", e)
+
+
+async def cache_stats() -> dict:
+    """Попадания/промахи с запуска и что лежит в БД: hits, misses, entries, stored_hits; ocr — кэш распознавания фото."""
+    stats = dict(_cache_stats, ocr=_ocr_cache.stats())
+    try:
+        stats.update(await db.homework_answers_stats())
+    except Exception as e:
+        logger.warning("Кэш ответов: статистика не прочиталась: %s", e)
+        stats.update(entries=None, stored_hits=None)
+    return stats
+
+
+def _alternative_text(data: dict) -> str | None:
+    """Текст первой альтернативы из ответа (или очередного куска потока) Yandex GPT."""
+    alternatives = (data.get("result") or {}).get("alternatives") or []
+    if alternatives and "message" in alternatives[0]:
+        return (alternatives[0]["message"].get("text") or "").strip()
+    return None
+
+
+async def _raise_retryable(resp) -> None:
+    """429 / 5xx -> resilience.RetryableStatus (запрос повторят); остальное разбирает вызывающий."""
+    if resp.status not in resilience.RETRYABLE_STATUSES:
+        return
+    try:
+        retry_after = float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        retry_after = None
+    raise resilience.RetryableStatus(resp.status, await resp.text(), retry_after)
+
+
+async def _read_stream(resp, on_partial) -> str | None:
+    """
+    Потоковый ответ: по строке JSON на кусок, в каждом — весь текст на данный момент.
+    on_partial(text) вызывается на каждый кусок с новым текстом; возвращает итоговый текст.
+    """
+    text = None
+    try:
+        async for raw in resp.content:
+            line = raw.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if "error" in data:
+                logger.warning("Yandex GPT: ошибка в потоке ответа: %s", data["error"])
+                return None
+            chunk = _alternative_text(data)
+            if chunk and chunk != text:
+                text = chunk
+                await on_partial(text)
+    except Exception as e:
+        if text is None:
+            raise  # ученик ещё ничего не видел — запрос можно повторить
+        # Повтор начал бы ответ заново поверх уже показанного
+        logger.warning("Yandex GPT: поток оборвался после части ответа: %s", e)
+        return None
+    return text
+
+
+async def ask_homework(
+    user_text: str,
+    api_key: str,
+    folder_id: str = "",
+    image_bytes: bytes | None = None,
+    on_partial=None,
+    use_cache: bool = True,
+    image_id: str | None = None,
+    image_text: str | None = None,
+    user_id: int | None = None,
+    on_position=None,
+) -> str | None:
     """
     Отправляет вопрос в Yandex GPT, возвращает ответ или None при ошибке/отсутствии ключа.
+    on_partial — корутина от текста: ответ запрашивается потоком (YANDEX_GPT_STREAM) и она получает
+    текст по мере генерации (весь текст на данный момент); возвращается всё равно итоговый текст.
+    Задание из банка ЕГЭ (см. _bank_answer) и тот же вопрос, что уже задавали (с точностью до normalize_question),
+    отвечаются без запроса к GPT и без on_partial; use_cache=False — спросить GPT заново (новый ответ заменит
+    сохранённый).
+    image_id — file_unique_id фото для кэша OCR; image_text — текст фото из кэша (cached_image_text), тогда
+    image_bytes не нужны.
+    user_id — сам запрос к GPT ждёт общей очереди (llm_scheduler.submit, on_position — её место в ней); банк,
+    кэш и OCR очереди не ждут. RequestCancelled — если вопрос сняли из очереди.
     """
     api_key = (api_key or "").strip()
     folder_id = (folder_id or "").strip()
@@ -119,9 +405,12 @@ async def ask_homework(user_text: str, api_key: str, folder_id: str = "", image_
         )
         return None
     # Если есть фото — сначала OCR, затем объединяем с текстом
-    if image_bytes:
-        ocr_text = await _ocr_image(image_bytes, api_key)
+    bank_query = user_text
+    if image_bytes or image_text:
+        ocr_text = image_text or await recognize_image(image_bytes, api_key, image_id)
         if ocr_text:
+            # Подпись к фото — часть вопроса («проверь мой ответ 7»): с ней задание ищется в банке тоже
+            bank_query = f"{ocr_text}\n{user_text.strip()}".strip()
             user_text = f"Текст с фото задания:\n{ocr_text}\n\n" + (user_text.strip() or "Помоги решить это задание.")
         elif user_text.strip():
             user_text = user_text.strip()
@@ -130,11 +419,38 @@ async def ask_homework(user_text: str, api_key: str, folder_id: str = "", image_
             return OCR_FAILED
     if len(user_text.strip()) < 2:
         return None
+    gpt = {"user_id": user_id, "on_position": on_position}
+    if use_cache:
+        answer = await _bank_answer(bank_query)
+        if answer is not None:
+            _cache_stats["bank"] += 1
+            return answer
+    if HOMEWORK_CACHE_SIZE <= 0:
+        return await _complete(user_text, api_key, folder_id, on_partial, **gpt)
+    key = _cache_key(user_text)
+    if use_cache:
+        answer = await _cache_get(key)
+        if answer is not None:
+            _cache_stats["hits"] += 1
+            return answer
+        _cache_stats["misses"] += 1
+    # use_cache=False («Ответить заново»): сохранённый ответ не читается, но заменяется новым
+    answer = await _complete(user_text, api_key, folder_id, on_partial, **gpt)
+    if answer:
+        await _cache_put(key, user_text, answer)
+    return answer
+
+
+async def _complete(
+    user_text: str, api_key: str, folder_id: str, on_partial, user_id: int | None = None, on_position=None
+) -> str | None:
+    """Сам запрос к Yandex GPT (без кэша); с user_id — через очередь llm_scheduler."""
+    stream = on_partial is not None and YANDEX_GPT_STREAM
     model_uri = f"gpt://{folder_id}/yandexgpt/latest"
     payload = {
         "modelUri": model_uri,
         "completionOptions": {
-            "stream": False,
+            "stream": stream,
             "temperature": 0.6,
             "maxTokens": "1500",
         },
@@ -147,12 +463,17 @@ async def ask_homework(user_text: str, api_key: str, folder_id: str = "", image_
         "Authorization": f"Api-Key {api_key}",
         "Content-Type": "application/json",
     }
-    try:
+
+    async def attempt():
         import aiohttp
-        async with aiohttp.ClientSession() as session:
+        async with _http() as session:
             async with session.post(
-                YANDEX_COMPLETION_URL, json=payload, headers=headers, timeout=aiohttp.ClientTimeout(total=60)
+                YANDEX_COMPLETION_URL,
+                json=payload,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=YANDEX_GPT_TIMEOUT, connect=YANDEX_CONNECT_TIMEOUT),
             ) as resp:
+                await _raise_retryable(resp)
                 if resp.status != 200:
                     text = await resp.text()
                     preview = text[:1000] + ("..." if len(text) > 1000 else "")
@@ -163,17 +484,35 @@ async def ask_homework(user_text: str, api_key: str, folder_id: str = "", image_
                         preview,
                     )
                     return None
-                data = await resp.json()
+                if stream:
+                    return await _read_stream(resp, on_partial)
+                return await resp.json()
+
+    def request():
+        # Поток не дублируется: два потока писали бы в один черновик у ученика
+        return resilience.call(
+            attempt, _gpt_breaker,
+            retries=YANDEX_RETRIES, base_delay=YANDEX_RETRY_DELAY, hedge_after=0 if stream else YANDEX_GPT_HEDGE_AFTER,
+        )
+
+    try:
+        if user_id is None:
+            data = await request()
+        else:
+            data = await llm_scheduler.submit(user_id, request, on_position=on_position)
+    except llm_scheduler.RequestCancelled:
+        raise
+    except resilience.CircuitOpen:
+        logger.warning("Yandex GPT: API недавно не отвечало — запрос не отправлен")
+        return None
     except Exception as e:
         logger.exception("Yandex GPT request failed (сеть/таймаут/разбор ответа): %s", e)
         return None
+    if stream or data is None:
+        return data
     try:
-        result = data.get("result", {})
-        alternatives = result.get("alternatives", [])
-        if alternatives and "message" in alternatives[0]:
-            return alternatives[0]["message"].get("text", "").strip()
-        return None
-    except (KeyError, IndexError, TypeError) as e:
+        return _alternative_text(data)
+    except (KeyError, IndexError, TypeError, AttributeError) as e:
         logger.warning(
             "Yandex GPT: неожиданная структура ответа (result/alternatives/text). "
             "Ответ: %s. Ошибка: %s",
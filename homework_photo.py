@@ -0,0 +1,103 @@
+"""
+Фото задания перед OCR: из размеров, которые хранит Telegram, берётся самый маленький, на котором текст ещё
+читается (OCR_MIN_SIDE по длинной стороне), а не всегда самый большой. Если картинка всё равно крупнее, чем нужно
+Vision (OCR_MAX_SIDE / OCR_MAX_BYTES), она уменьшается и пережимается в JPEG в отдельном потоке — если установлен
+Pillow; без него уходит как есть. Счётчики stats показывают, сколько байт скачано и отправлено против «всегда
+самое большое фото», и сколько занимает распознавание.
+"""
+import asyncio
+import io
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+try:
+    OCR_MIN_SIDE = int(os.environ.get("OCR_MIN_SIDE", "").strip() or 1200)
+except ValueError:
+    OCR_MIN_SIDE = 1200
+try:
+    OCR_MAX_SIDE = int(os.environ.get("OCR_MAX_SIDE", "").strip() or 1600)
+except ValueError:
+    OCR_MAX_SIDE = 1600
+# Vision принимает файл до 1 МБ
+try:
+    OCR_MAX_BYTES = int(os.environ.get("OCR_MAX_BYTES", "").strip() or 1_000_000)
+except ValueError:
+    OCR_MAX_BYTES = 1_000_000
+JPEG_QUALITY = 85
+
+# photos — фото, скачано/было бы скачано (самый большой размер), отправлено в Vision; ocr_* — вызовы Vision
+stats = {
+    "photos": 0,
+    "largest_bytes": 0,
+    "downloaded_bytes": 0,
+    "payload_bytes": 0,
+    "ocr_calls": 0,
+    "ocr_seconds": 0.0,
+}
+
+
+def pick_photo_size(sizes: list, min_side: int = OCR_MIN_SIDE):
+    """Самый маленький PhotoSize с длинной стороной не меньше min_side; если таких нет — самый большой."""
+    ordered = sorted(sizes, key=lambda s: s.width * s.height)
+    for size in ordered:
+        if max(size.width, size.height) >= min_side:
+            return size
+    return ordered[-1]
+
+
+async def download(bot, size, largest=None) -> bytes:
+    """Скачивает фото в память одним буфером (без bytearray -> bytes). largest — для счётчика «как было»."""
+    tg_file = await bot.get_file(size.file_id)
+    buf = io.BytesIO()
+    await tg_file.download_to_memory(buf)
+    data = buf.getvalue()
+    stats["photos"] += 1
+    stats["downloaded_bytes"] += len(data)
+    stats["largest_bytes"] += (largest.file_size if largest is not None and largest.file_size else len(data))
+    return data
+
+
+def compact(data: bytes, max_side: int = OCR_MAX_SIDE, max_bytes: int = OCR_MAX_BYTES) -> bytes:
+    """Уменьшает и пережимает картинку, если она крупнее нужного; без Pillow или при ошибке — data как есть."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= max_side and len(data) <= max_bytes:
+                return data
+            # Для распознавания текста цвет не нужен: оттенки серого заметно меньше в JPEG
+            image = image.convert("L")
+            image.thumbnail((max_side, max_side))
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        logger.warning("Фото для OCR не пережато: %s", e)
+        return data
+    compacted = out.getvalue()
+    return compacted if len(compacted) < len(data) else data
+
+
+async def prepare(data: bytes) -> bytes:
+    """compact в отдельном потоке — разбор картинки не держит цикл событий бота."""
+    payload = await asyncio.to_thread(compact, data)
+    stats["payload_bytes"] += len(payload)
+    if payload is not data:
+        logger.info("Фото для OCR пережато: %s -> %s байт", len(data), len(payload))
+    return payload
+
+
+@contextmanager
+def ocr_timer():
+    """with ocr_timer(): ... — учитывает вызов Vision в stats."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        stats["ocr_calls"] += 1
+        stats["ocr_seconds"] += time.monotonic() - started
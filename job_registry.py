@@ -0,0 +1,56 @@
+"""
+Задания job_queue, привязанные к урокам (напоминания за день/час), по lesson_id.
+Удаление урока или очистка расписания снимает только задания этих уроков — без перебора всех заданий
+job_queue по имени. Реестр живёт в bot_data["job_registry"] и ведётся там, где задания ставятся и срабатывают.
+"""
+
+BOT_DATA_KEY = "job_registry"
+
+
+class JobRegistry:
+    """lesson_id -> {вид задания: Job}. Новое задание того же вида заменяет старое (старое снимается)."""
+
+    def __init__(self):
+        self._jobs: dict[int, dict[str, object]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(jobs) for jobs in self._jobs.values())
+
+    def jobs(self, lesson_id: int) -> dict[str, object]:
+        return dict(self._jobs.get(lesson_id, {}))
+
+    def add(self, lesson_id: int, kind: str, job) -> None:
+        jobs = self._jobs.setdefault(lesson_id, {})
+        old = jobs.get(kind)
+        if old is not None and old is not job:
+            old.schedule_removal()
+        jobs[kind] = job
+
+    def discard(self, lesson_id: int, kind: str) -> None:
+        """Задание отработало само — просто забыть его."""
+        jobs = self._jobs.get(lesson_id)
+        if jobs is None:
+            return
+        jobs.pop(kind, None)
+        if not jobs:
+            del self._jobs[lesson_id]
+
+    def cancel(self, lesson_id: int) -> int:
+        """Снимает все задания урока. Возвращает, сколько снято."""
+        jobs = self._jobs.pop(lesson_id, {})
+        for job in jobs.values():
+            job.schedule_removal()
+        return len(jobs)
+
+    def cancel_all(self) -> int:
+        cancelled = 0
+        for lesson_id in list(self._jobs):
+            cancelled += self.cancel(lesson_id)
+        return cancelled
+
+
+def get_registry(bot_data: dict) -> JobRegistry:
+    registry = bot_data.get(BOT_DATA_KEY)
+    if registry is None:
+        registry = bot_data[BOT_DATA_KEY] = JobRegistry()
+    return registry
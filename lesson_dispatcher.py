@@ -0,0 +1,166 @@
+"""
+Рассылка ссылок перед началом уроков и закреплённых слотов — по событиям, без опроса БД каждую минуту.
+В памяти — куча ближайших «начал» (урок: один раз; слот: каждую неделю), в job_queue — один таймер на ближайшее.
+При старте таймлайн строится из БД, дальше обработчики добавляют/убирают события сами.
+Событие срабатывает один раз; если бот проспал момент (перезапуск, задержка), оно ещё отправляется в течение catch_up.
+"""
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta
+
+from config_loader import localize_naive, now_tz
+from recurrence import parse_slot_time
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "lesson_start_dispatcher"
+
+
+class LessonDispatcher:
+    """
+    Ключи событий: ("lesson", id) и ("slot", день недели 0–6, "HH:MM").
+    fire(context, key) — корутина, отправляющая ссылки; данные урока/слота она читает из БД в момент события.
+    Если fire вернула False (урока/слота больше нет), повторы слота снимаются.
+    """
+
+    def __init__(self, fire, lead: timedelta = timedelta(minutes=1), catch_up: timedelta = timedelta(minutes=5)):
+        self.fire = fire
+        self.lead = lead
+        self.catch_up = catch_up
+        self.job_queue = None
+        self._heap: list[tuple[datetime, int, tuple]] = []
+        # Актуальное время срабатывания по ключу; записи кучи с другим временем — устаревшие (ленивое удаление)
+        self._due: dict[tuple, datetime] = {}
+        self._seq = itertools.count()
+        self._job = None
+        self._job_at: datetime | None = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    # ——— наполнение ———
+
+    def load(self, lessons: list[dict], slots: list[dict], now: datetime | None = None) -> None:
+        """Полная сборка таймлайна: уроки (id, lesson_date, lesson_time) и слоты (day_of_week, lesson_time)."""
+        now = now or now_tz()
+        self._heap = []
+        self._due = {}
+        for lesson in lessons:
+            self._add_lesson(lesson, now)
+        for slot in slots:
+            self._add_slot(slot, now)
+        self.arm()
+
+    def add_lessons(self, lessons: list[dict]) -> None:
+        now = now_tz()
+        for lesson in lessons:
+            self._add_lesson(lesson, now)
+        self.arm()
+
+    def remove_lesson(self, lesson_id: int) -> None:
+        self._due.pop(("lesson", lesson_id), None)
+        self.arm()
+
+    def add_slot(self, day_of_week: int, lesson_time: str) -> None:
+        self._add_slot({"day_of_week": day_of_week, "lesson_time": lesson_time}, now_tz())
+        self.arm()
+
+    def clear_lessons(self) -> None:
+        self._due = {key: at for key, at in self._due.items() if key[0] != "lesson"}
+        self.arm()
+
+    def clear(self) -> None:
+        self._due = {}
+        self._heap = []
+        self.arm()
+
+    def _push(self, key: tuple, at: datetime) -> None:
+        self._due[key] = at
+        heapq.heappush(self._heap, (at, next(self._seq), key))
+
+    def _add_lesson(self, lesson: dict, now: datetime) -> None:
+        try:
+            start = datetime.strptime(f"{lesson['lesson_date']} {lesson['lesson_time']}", "%Y-%m-%d %H:%M")
+        except ValueError:
+            return
+        at = localize_naive(start) - self.lead
+        if at >= now - self.catch_up:
+            self._push(("lesson", lesson["id"]), at)
+
+    def _add_slot(self, slot: dict, now: datetime) -> None:
+        hm = parse_slot_time(slot.get("lesson_time") or "")
+        if hm is None:
+            return
+        key = ("slot", int(slot["day_of_week"]), f"{hm[0]:02d}:{hm[1]:02d}")
+        at = self._next_slot_at(key, now - self.catch_up)
+        if key not in self._due or at < self._due[key]:
+            self._push(key, at)
+
+    def _next_slot_at(self, key: tuple, after: datetime) -> datetime:
+        """Ближайшее срабатывание еженедельного слота позже after."""
+        _, day_of_week, hhmm = key
+        hour, minute = parse_slot_time(hhmm)
+        day = after.date() + timedelta(days=(day_of_week - after.weekday()) % 7)
+        while True:
+            at = localize_naive(datetime(day.year, day.month, day.day, hour, minute)) - self.lead
+            if at > after:
+                return at
+            day += timedelta(days=7)
+
+    # ——— срабатывание ———
+
+    def next_at(self) -> datetime | None:
+        while self._heap:
+            at, _, key = self._heap[0]
+            if self._due.get(key) == at:
+                return at
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime) -> tuple[list[tuple], list[tuple]]:
+        """Снимает наступившие события: (к отправке, пропущенные — старше catch_up). Слоты переносятся на неделю."""
+        due, missed = [], []
+        while (at := self.next_at()) is not None and at <= now:
+            _, _, key = heapq.heappop(self._heap)
+            del self._due[key]
+            (due if at >= now - self.catch_up else missed).append(key)
+            if key[0] == "slot":
+                self._push(key, self._next_slot_at(key, at))
+        return due, missed
+
+    def start(self, job_queue) -> None:
+        self.job_queue = job_queue
+        self.arm()
+
+    def arm(self) -> None:
+        """Один run_once на ближайшее событие; перевзводится, только если оно поменялось."""
+        if self.job_queue is None:
+            return
+        at = self.next_at()
+        if self._job is not None and self._job_at == at:
+            return
+        if self._job is not None:
+            self._job.schedule_removal()
+            self._job = None
+        self._job_at = at
+        if at is None:
+            return
+        delay = max(0.0, (at - now_tz()).total_seconds())
+        self._job = self.job_queue.run_once(self._on_timer, delay, name=JOB_NAME)
+
+    async def _on_timer(self, context) -> None:
+        self._job = None
+        due, missed = self.pop_due(now_tz())
+        for key in missed:
+            logger.warning("Ссылка к началу %s не отправлена: событие пропущено больше чем на %s", key, self.catch_up)
+        for key in due:
+            try:
+                exists = await self.fire(context, key)
+            except Exception as e:
+                logger.warning("Рассылка ссылки %s: %s", key, e)
+                continue
+            if exists is False:
+                # Урок удалён / у слота не осталось учеников — следующего повтора не будет
+                self._due.pop(key, None)
+        self.arm()
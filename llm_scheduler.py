@@ -0,0 +1,150 @@
+"""
+Очередь вопросов к Yandex GPT (помощь с домашкой). Одновременно идёт не больше LLM_CONCURRENCY запросов на весь
+бот и не больше одного на ученика; следующий запрос берётся по кругу у учеников, а не по времени прихода —
+ученик, приславший десять вопросов подряд, не задерживает остальных. Ожидающий узнаёт своё место в очереди,
+а его вопросы снимаются, когда он выходит из режима (/start, «На главную»).
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+try:
+    LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "").strip() or 4)
+except ValueError:
+    LLM_CONCURRENCY = 4
+
+
+class RequestCancelled(Exception):
+    """Вопрос снят из очереди (cancel_user)."""
+
+
+class FairScheduler:
+    """
+    limit — запросов одновременно. _waiting: user_id -> очередь «билетов» (Future) этого ученика;
+    порядок ключей словаря — круг: получивший очередь ученик переезжает в конец.
+    """
+
+    def __init__(self, limit: int = LLM_CONCURRENCY):
+        self.limit = max(1, limit)
+        self._running: set[int] = set()
+        self._waiting: dict[int, deque] = {}
+        self._changed = None
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._waiting.values())
+
+    async def run(self, user_id: int, factory, on_position=None):
+        """
+        Дождаться очереди и выполнить factory() (корутина). on_position(n) — корутина, вызывается, пока запрос
+        ждёт, при каждом изменении места (1 — следующий). RequestCancelled — если вопрос сняли, не дождавшись.
+        """
+        turn = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append(turn)
+        self._dispatch()
+        try:
+            shown = None
+            while not turn.done():
+                position = self.position(user_id, turn)
+                if on_position is not None and position != shown:
+                    shown = position
+                    await on_position(position)
+                if turn.done():
+                    break
+                await asyncio.wait([turn, self._changed_future()], return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            if turn.done() and not turn.cancelled() and turn.exception() is None:
+                self._release(user_id)  # очередь уже выдана, но запрос не пойдёт
+            else:
+                self._forget(user_id, turn)
+            raise
+        turn.result()  # RequestCancelled
+        try:
+            return await factory()
+        finally:
+            self._release(user_id)
+
+    def position(self, user_id: int, turn) -> int:
+        """Место билета с учётом очереди по кругу: сколько билетов (включая его) выйдет раньше или вместе с ним."""
+        queue = self._waiting.get(user_id)
+        if not queue or turn not in queue:
+            return 0
+        rounds = queue.index(turn)
+        ahead = rounds
+        before = True
+        for other, other_queue in self._waiting.items():
+            if other == user_id:
+                before = False
+                continue
+            ahead += min(len(other_queue), rounds + (1 if before else 0))
+        return ahead + 1
+
+    def cancel_user(self, user_id: int) -> int:
+        """Снимает ждущие вопросы ученика (идущий запрос доработает). Возвращает, сколько снято."""
+        queue = self._waiting.pop(user_id, None)
+        if not queue:
+            return 0
+        for turn in queue:
+            if not turn.done():
+                turn.set_exception(RequestCancelled())
+        self._notify()
+        return len(queue)
+
+    def _dispatch(self) -> None:
+        changed = False
+        while len(self._running) < self.limit:
+            user_id = next((u for u in self._waiting if u not in self._running), None)
+            if user_id is None:
+                break
+            queue = self._waiting.pop(user_id)
+            turn = queue.popleft()
+            if queue:
+                self._waiting[user_id] = queue  # в конец круга
+            if turn.done():
+                continue
+            self._running.add(user_id)
+            turn.set_result(None)
+            changed = True
+        if changed:
+            self._notify()
+
+    def _release(self, user_id: int) -> None:
+        self._running.discard(user_id)
+        self._dispatch()
+
+    def _forget(self, user_id: int, turn) -> None:
+        queue = self._waiting.get(user_id)
+        if queue is not None and turn in queue:
+            queue.remove(turn)
+            if not queue:
+                del self._waiting[user_id]
+            self._notify()
+
+    def _changed_future(self):
+        if self._changed is None or self._changed.done():
+            self._changed = asyncio.get_running_loop().create_future()
+        return self._changed
+
+    def _notify(self) -> None:
+        """Будит ждущих: места в очереди пересчитываются."""
+        if self._changed is not None and not self._changed.done():
+            self._changed.set_result(None)
+
+
+_default = FairScheduler()
+
+
+async def submit(user_id: int, factory, on_position=None):
+    """Запрос через общую для бота очередь (см. FairScheduler.run)."""
+    return await _default.run(user_id, factory, on_position)
+
+
+def cancel_user(user_id: int) -> int:
+    return _default.cancel_user(user_id)
@@ -12,6 +12,8 @@ from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQu
 from config_loader import config
 import database as db
 import handlers as h
+import homework_llm
+import outbox
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -139,8 +141,22 @@ def main() -> None:
 
     app.add_error_handler(on_error)
 
+    async def wal_checkpoint_job(context):
+        try:
+            await db.checkpoint_wal()
+        except Exception as e:
+            logger.warning("wal_checkpoint не выполнен: %s", e)
+
     async def post_init(application):
         await db.init_db()
+        await db.open_pool()
+        # HTTP-клиент для Yandex GPT / Vision: соединения переиспользуются между вопросами
+        await homework_llm.open_http_session()
+        # Поиск по банку ЕГЭ для вопросов из домашки — до первого вопроса, а не на нём
+        try:
+            await homework_llm.load_ege_index()
+        except Exception as e:
+            logger.warning("Поиск по банку ЕГЭ не построен при старте: %s", e)
         # Репетиторы из конфига + добавленные админом через бота
         extra_tutors = await db.get_tutor_user_ids_from_db()
         application.bot_data["tutor_user_ids"] = application.bot_data["tutor_user_ids"] | extra_tutors
@@ -162,23 +178,37 @@ def main() -> None:
         if getattr(config, "MATERIALS_CHANNEL_LINK", None):
             commands.append(BotCommand("materials", "Материалы к урокам"))
         await application.bot.set_my_commands(commands)
-        # Ежедневная сводка репетитору
+        # Ежедневная сводка всем репетиторам (текст из кэша сводки, см. h.tutor.today_summary)
         summary_hour = getattr(config, "SUMMARY_DAILY_HOUR", None)
         if summary_hour is not None and application.job_queue:
             application.job_queue.run_daily(
                 h.daily_summary_callback,
                 time=dt_time(hour=int(summary_hour), minute=0),
             )
-        # За 1 минуту до урока — отправить ссылку записанным ученикам (если LESSON_LINK задан)
-        if application.bot_data.get("lesson_link") and application.job_queue:
+        # За 1 минуту до урока или закреплённого слота — ссылка ученикам (ссылка урока/слота или LESSON_LINK).
+        # Один таймер на ближайшее начало, БД между событиями не опрашивается.
+        if application.job_queue:
+            await h.start_lesson_dispatcher(application)
+        # Напоминания за день/час из БД (после перезапуска); пропущенные за время простоя — по h.tutor.REMINDER_GRACE
+        await h.restore_reminders(application)
+        # Уведомления репетиторам из outbox (в т.ч. не отправленные до перезапуска)
+        if application.job_queue:
+            outbox.start_worker(application.job_queue)
+        # Checkpoint WAL по расписанию (см. DATABASE_CHECKPOINT_INTERVAL, DATABASE_WAL_MAX_MB)
+        if application.job_queue and db.DB_CHECKPOINT_INTERVAL > 0:
             application.job_queue.run_repeating(
-                h.send_lesson_links_callback,
-                interval=60,
-                first=10,
+                wal_checkpoint_job,
+                interval=db.DB_CHECKPOINT_INTERVAL,
+                first=db.DB_CHECKPOINT_INTERVAL,
             )
         logger.info("Database initialized.")
 
+    async def post_shutdown(application):
+        await homework_llm.close_http_session()
+        await db.close_pool()
+
     app.post_init = post_init
+    app.post_shutdown = post_shutdown
     logger.info("Bot starting...")
     app.run_polling(allowed_updates=["message", "callback_query"])
 
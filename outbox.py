@@ -0,0 +1,84 @@
+"""
+Исходящие уведомления репетиторам (outbox). Обработчик пишет их в таблицу outbox той же транзакцией,
+что и запись/отмену урока, и сразу отвечает ученику; отправляет фоновая задача job_queue с повторами.
+Неотправленное переживает перезапуск: при старте задача подхватывает всё, что осталось в таблице.
+Доставка «хотя бы раз»: если бот упадёт между отправкой и удалением строки, уведомление уйдёт повторно.
+"""
+import logging
+from datetime import timedelta
+
+import database as db
+from broadcast import SENT, broadcast_each
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "outbox_drain"
+# Страховочный обход таблицы (сек); обычно отправку будит kick() сразу после записи
+POLL_INTERVAL = 60
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+
+_draining = False
+_again = False
+
+
+def _backoff(attempts: int) -> timedelta:
+    """Пауза перед повтором: 10 с, 20 с, 40 с … не больше часа."""
+    return timedelta(seconds=min(10 * 2 ** attempts, 3600))
+
+
+async def drain(bot) -> int:
+    """Отправляет все созревшие уведомления пачками. Возвращает, сколько доставлено."""
+    global _draining, _again
+    if _draining:
+        _again = True  # идущий обход сделает ещё круг
+        return 0
+    _draining = True
+    delivered = 0
+    try:
+        while True:
+            _again = False
+            rows = await db.get_due_notifications(BATCH_SIZE)
+            if rows:
+                delivered += await _send_batch(bot, rows)
+            if len(rows) < BATCH_SIZE and not _again:
+                return delivered
+    finally:
+        _draining = False
+
+
+async def _send_batch(bot, rows: list[dict]) -> int:
+    report = await broadcast_each(bot, [(row["chat_id"], row["text"]) for row in rows])
+    done, retry = [], []
+    for row, outcome in zip(rows, report.outcomes):
+        if outcome == SENT:
+            done.append(row["id"])
+        elif row["attempts"] + 1 >= MAX_ATTEMPTS:
+            logger.warning("Уведомление %s для %s снято после %s попыток: %s", row["id"], row["chat_id"], MAX_ATTEMPTS, outcome)
+            done.append(row["id"])
+        else:
+            next_at = db.utc_now(_backoff(row["attempts"]))
+            retry.append((next_at, outcome, row["id"]))
+    await db.finish_notifications(done, retry)
+    return report.outcomes.count(SENT)
+
+
+async def _drain_job(context) -> None:
+    try:
+        await drain(context.bot)
+    except Exception as e:
+        logger.warning("Отправка outbox: %s", e)
+
+
+def start_worker(job_queue) -> None:
+    """post_init: периодический обход outbox, первый — сразу (остатки с прошлого запуска)."""
+    job_queue.run_repeating(_drain_job, interval=POLL_INTERVAL, first=0, name=JOB_NAME)
+
+
+async def kick(context) -> None:
+    """Разбудить отправку после записи в outbox. Без job_queue — отправить прямо здесь."""
+    job_queue = context.application.job_queue
+    if job_queue:
+        job_queue.run_once(_drain_job, 0, name=f"{JOB_NAME}_kick")
+    else:
+        await drain(context.bot)
@@ -0,0 +1,101 @@
+"""
+Закреплённые слоты (blocked_slots: день недели + время строкой) как конкретные занятия.
+Индекс один раз нормализует время слотов и разворачивает их в отсортированный список занятий на скользящем
+горизонте; «занятия с t1 по t2» и «что пересекается с уроком» — бинарный поиск, без пересканирования слотов.
+Строится и сбрасывается в database.py (get_slot_index) при записи в blocked_slots.
+"""
+import bisect
+from datetime import date, datetime, time, timedelta
+
+# У слота нет длительности в БД — считаем как урок по умолчанию
+SLOT_DURATION = timedelta(minutes=60)
+HORIZON = timedelta(weeks=8)
+
+
+def parse_slot_time(value: str) -> tuple[int, int] | None:
+    """«9:00» / «09:00» -> (9, 0); свободный текст -> None."""
+    parts = (value or "").strip().split(":")
+    try:
+        hour, minute = int(parts[0]), int(parts[1])
+    except (IndexError, ValueError):
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        return None
+    return hour, minute
+
+
+class SlotOccurrenceIndex:
+    """
+    slots — все слоты (копии строк БД, lesson_time приведено к «HH:MM», где это возможно), по дню и времени.
+    Занятия — (начало, слот) в наивном местном времени, как lesson_date/lesson_time у уроков.
+    """
+
+    def __init__(self, slots: list[dict], duration: timedelta = SLOT_DURATION, horizon: timedelta = HORIZON):
+        self.duration = duration
+        self.horizon = horizon
+        self.slots: list[dict] = []
+        # (день недели, час, минута, слот) — только слоты с разобранным временем
+        self._weekly: list[tuple[int, int, int, dict]] = []
+        self._by_time: dict[tuple[int, str], list[dict]] = {}
+        for slot in slots:
+            slot = dict(slot)
+            hm = parse_slot_time(slot.get("lesson_time") or "")
+            if hm is not None:
+                slot["lesson_time"] = f"{hm[0]:02d}:{hm[1]:02d}"
+                self._weekly.append((int(slot["day_of_week"]), hm[0], hm[1], slot))
+                self._by_time.setdefault((int(slot["day_of_week"]), slot["lesson_time"]), []).append(slot)
+            else:
+                slot["lesson_time"] = (slot.get("lesson_time") or "").strip()
+            self.slots.append(slot)
+        self.slots.sort(key=lambda s: (s["day_of_week"], s["lesson_time"]))
+        self._from: date | None = None
+        self._until: date | None = None
+        self._starts: list[datetime] = []
+        self._occurrences: list[tuple[datetime, dict]] = []
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def slots_at(self, day_of_week: int, lesson_time: str) -> list[dict]:
+        """Слоты на день недели и время («9:00» и «09:00» — одно и то же)."""
+        hm = parse_slot_time(lesson_time)
+        if hm is None:
+            return []
+        return list(self._by_time.get((day_of_week, f"{hm[0]:02d}:{hm[1]:02d}"), ()))
+
+    def between(self, start: datetime, end: datetime) -> list[tuple[datetime, dict]]:
+        """Занятия, начинающиеся в [start, end), по времени."""
+        self._cover(start, end)
+        lo = bisect.bisect_left(self._starts, start)
+        hi = bisect.bisect_left(self._starts, end)
+        return self._occurrences[lo:hi]
+
+    def on_date(self, day: date) -> list[dict]:
+        """Слоты, которые идут в этот день, по времени."""
+        start = datetime.combine(day, time())
+        return [slot for _, slot in self.between(start, start + timedelta(days=1))]
+
+    def conflicts(self, start: datetime, duration: timedelta = SLOT_DURATION) -> list[tuple[datetime, dict]]:
+        """Занятия, пересекающиеся с уроком [start, start + duration)."""
+        # Длительность у всех занятий одна, поэтому пересекаются ровно те, что начались после start - self.duration
+        return self.between(start - self.duration + timedelta(microseconds=1), start + duration)
+
+    def _cover(self, start: datetime, end: datetime) -> None:
+        """Разворачивает занятия так, чтобы окно [start, end) было внутри горизонта."""
+        first, last = start.date(), end.date()
+        if self._from is not None and self._from <= first and last < self._until:
+            return
+        if self._from is None or first >= self._until:
+            new_from, new_until = first, max(last, first + self.horizon)  # горизонт «съезжает» вперёд
+        else:
+            new_from, new_until = min(self._from, first), max(self._until - timedelta(days=1), last, first + self.horizon)
+        occurrences = []
+        for day_of_week, hour, minute, slot in self._weekly:
+            day = new_from + timedelta(days=(day_of_week - new_from.weekday()) % 7)
+            while day <= new_until:
+                occurrences.append((datetime(day.year, day.month, day.day, hour, minute), slot))
+                day += timedelta(days=7)
+        occurrences.sort(key=lambda o: (o[0], o[1].get("id") or 0))
+        self._from, self._until = new_from, new_until + timedelta(days=1)
+        self._occurrences = occurrences
+        self._starts = [at for at, _ in occurrences]
@@ -0,0 +1,147 @@
+"""
+Устойчивость запросов к внешним API (Yandex GPT / Vision): повтор с экспоненциальной паузой и случайным
+разбросом на временных ошибках (429, 5xx, обрыв, таймаут), предохранитель (circuit breaker), который при
+серии таких ошибок какое-то время сразу отказывает вместо ожидания таймаутов, и «подстраховочный» второй
+запрос, если первый отвечает дольше hedge_after секунд — берётся ответ, пришедший первым.
+"""
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryableStatus(Exception):
+    """Ответ API с временной ошибкой. retry_after — из заголовка Retry-After (сек), если был."""
+
+    def __init__(self, status: int, body: str = "", retry_after: float | None = None):
+        super().__init__(f"status={status} body={body[:300]}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpen(Exception):
+    """Предохранитель разомкнут: API недавно падало, запрос не отправлялся."""
+
+
+def _retryable(error: BaseException) -> bool:
+    import aiohttp
+
+    return isinstance(error, (RetryableStatus, asyncio.TimeoutError, aiohttp.ClientConnectionError))
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold временных ошибок подряд размыкается на reset_timeout сек: call() сразу бросает
+    CircuitOpen. Потом пропускает один пробный запрос — успех замыкает, ошибка размыкает снова.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("%s снова отвечает — предохранитель замкнут", self.name)
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def abandon(self) -> None:
+        """Пробная попытка отменена, не дойдя до ответа, — следующий запрос сможет попробовать снова."""
+        self._probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+            logger.warning(
+                "%s: %s ошибок подряд — запросы не отправляются %s с", self.name, self.failures, self.reset_timeout
+            )
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+
+async def _hedged(factory, hedge_after: float):
+    """factory() один раз, а если не ответил за hedge_after сек — ещё раз параллельно; побеждает первый успех."""
+    tasks = [asyncio.ensure_future(factory())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after if hedge_after > 0 else None)
+        if done:
+            return tasks[0].result()
+        logger.info("Медленный ответ (> %s с) — отправлен дублирующий запрос", hedge_after)
+        tasks.append(asyncio.ensure_future(factory()))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call(
+    factory,
+    breaker: CircuitBreaker,
+    retries: int = 2,
+    base_delay: float = 0.5,
+    max_delay: float = 8.0,
+    hedge_after: float = 0.0,
+):
+    """
+    factory() — корутина одной попытки; временную ошибку она бросает (RetryableStatus, таймаут, обрыв),
+    всё прочее возвращает или бросает как есть (без повтора). hedge_after > 0 — дублировать медленную попытку.
+    """
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpen(breaker.name)
+        try:
+            result = await _hedged(factory, hedge_after)
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
+        except Exception as e:
+            if not _retryable(e):
+                breaker.success()  # API отвечает, ошибка не в нём
+                raise
+            breaker.failure()
+            if attempt >= retries:
+                raise
+            # «Полный разброс»: случайная пауза до экспоненциальной границы, чтобы повторы не шли залпом
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if isinstance(e, RetryableStatus) and e.retry_after:
+                delay = max(delay, min(e.retry_after, max_delay))
+            attempt += 1
+            logger.info("%s: %s — повтор %s/%s через %.1f с", breaker.name, e, attempt, retries, delay)
+            await asyncio.sleep(delay)
+            continue
+        breaker.success()
+        return result
@@ -698,7 +698,8 @@ async def fill_ege_tasks_7_9() -> None:
         task_image="ege_images/8_1_task.png",
     )
     # Задание 8.2 — в subtasks
-    await db.set_ege_task_8_subtask(
+    await db.set_ege_subtask(
+        task_number=8,
         part=2,
         title="Задача 8.2 — шестибуквенные слова",
         task_image="ege_images/8_2_task.png",
@@ -736,7 +737,8 @@ async def fill_ege_tasks_10_11_12() -> None:
         solution_image="ege_images/11_1_solution.png",
         task_image="ege_images/11_1_task.png",
     )
-    await db.set_ege_task_11_subtask(
+    await db.set_ege_subtask(
+        task_number=11,
         part=2,
         title="Задача 11.2 — серийные номера, 248 символов",
         task_image="ege_images/11_2_task.png",
@@ -775,7 +777,8 @@ async def fill_ege_tasks_13_14() -> None:
         solution_image="ege_images/14_1_solution.png",
         task_image="ege_images/14_1_task.png",
     )
-    await db.set_ege_task_14_subtask(
+    await db.set_ege_subtask(
+        task_number=14,
         part=2,
         title="Задача 14.2 — пятеричная система, максимум нулей",
         task_image="ege_images/14_2_task.png",
@@ -813,7 +816,8 @@ async def fill_ege_tasks_15_16_17() -> None:
         solution_image="ege_images/17_1_solution.png",
         task_image="ege_images/17_1_task.png",
     )
-    await db.set_ege_task_17_subtask(
+    await db.set_ege_subtask(
+        task_number=17,
         part=2,
         title="Задача 17.2 — пары, двузначные, файл 17.txt",
         task_image="ege_images/17_2_task.png",
@@ -842,7 +846,8 @@ async def fill_ege_tasks_18_19_20_21() -> None:
         solution_image="ege_images/19_1_solution.png",
         task_image="ege_images/19_1_task.png",
     )
-    await db.set_ege_task_19_subtask(
+    await db.set_ege_subtask(
+        task_number=19,
         part=2,
         title="Задача 19.2 — куча, ходы −3, −6, :3; конец при ≤25",
         task_image="ege_images/19_2_task.png",
@@ -858,7 +863,8 @@ async def fill_ege_tasks_18_19_20_21() -> None:
         solution_image="ege_images/20_1_solution.png",
         task_image="ege_images/20_1_task.png",
     )
-    await db.set_ege_task_20_subtask(
+    await db.set_ege_subtask(
+        task_number=20,
         part=2,
         title="Задача 20.2 — два наименьших S (игра из задания 19)",
         task_image="ege_images/20_2_task.png",
@@ -874,7 +880,8 @@ async def fill_ege_tasks_18_19_20_21() -> None:
         solution_image="ege_images/21_1_solution.png",
         task_image="ege_images/21_1_task.png",
     )
-    await db.set_ege_task_21_subtask(
+    await db.set_ege_subtask(
+        task_number=21,
         part=2,
         title="Задача 21.2 — мин S: те же условия",
         task_image="ege_images/21_2_task.png",
@@ -894,7 +901,8 @@ async def fill_ege_tasks_22_23_24() -> None:
         solution_image="ege_images/22_1_solution.png",
         task_image="ege_images/22_1_task.png",
     )
-    await db.set_ege_task_22_subtask(
+    await db.set_ege_subtask(
+        task_number=22,
         part=2,
         title="Задача 22.2 — минимальное общее время выполнения",
         task_image="ege_images/22_2_task.png",
@@ -919,7 +927,8 @@ async def fill_ege_tasks_22_23_24() -> None:
         solution_image="ege_images/24_1_solution.png",
         task_image="ege_images/24_1_task.png",
     )
-    await db.set_ege_task_24_subtask(
+    await db.set_ege_subtask(
+        task_number=24,
         part=2,
         title="Задача 24.2 — с нечётной цифры, ровно 30 F",
         task_image="ege_images/24_2_task.png",
@@ -979,28 +988,32 @@ async def fill_ege_tasks_26() -> None:
         solution_image=TASK_26_1_SOLUTION_IMAGES,
         task_image="ege_images/26_1_task.png",
     )
-    await db.set_ege_task_26_subtask(
+    await db.set_ege_subtask(
+        task_number=26,
         part=2,
         title="Задача 26.2 — конференция: макс мероприятий, раннее начало последнего",
         task_image="ege_images/26_2_task.png",
         solution_image="ege_images/26_2_solution.png",
         example_solution=TASK_26_2_CODE,
     )
-    await db.set_ege_task_26_subtask(
+    await db.set_ege_subtask(
+        task_number=26,
         part=3,
         title="Задача 26.3 — детали: шлифовка/окрашивание, конвейер",
         task_image="ege_images/26_3_task.png",
         solution_image="ege_images/26_3_solution.png",
         example_solution=TASK_26_3_CODE,
     )
-    await db.set_ege_task_26_subtask(
+    await db.set_ege_subtask(
+        task_number=26,
         part=4,
         title="Задача 26.4 — камера хранения: выручка и номер последней ячейки",
         task_image="ege_images/26_4_task.png",
         solution_image="ege_images/26_4_solution.png",
         example_solution=TASK_26_4_CODE,
     )
-    await db.set_ege_task_26_subtask(
+    await db.set_ege_subtask(
+        task_number=26,
         part=5,
         title="Задача 26.5 — контейнеры: число контейнеров и сумма в предпоследнем",
         task_image="ege_images/26_5_task.png",
@@ -1024,7 +1037,8 @@ async def fill_ege_tasks_27() -> None:
         solution_image="",
         task_image=TASK_27_1_IMAGES,
     )
-    await db.set_ege_task_27_subtask(
+    await db.set_ege_subtask(
+        task_number=27,
         part=2,
         title="Задача 27.2 — центроиды: Mx, My для A; Dx, Dy для B",
         task_image="ege_images/27_2_task.png",
@@ -1033,347 +1047,47 @@ async def fill_ege_tasks_27() -> None:
     )
 
 
+async def fill_all_ege_tasks() -> None:
+    """Все задания 1–27 одной транзакцией: при сбое раздел не остаётся заполненным наполовину."""
+    async with db.transaction():
+        await fill_ege_tasks_1_6()
+        await fill_ege_tasks_7_9()
+        await fill_ege_tasks_10_11_12()
+        await fill_ege_tasks_13_14()
+        await fill_ege_tasks_15_16_17()
+        await fill_ege_tasks_18_19_20_21()
+        await fill_ege_tasks_22_23_24()
+        await fill_ege_tasks_25()
+        await fill_ege_tasks_26()
+        await fill_ege_tasks_27()
+
+
+def _has_task_image(task: dict | None) -> bool:
+    return bool(task and (task.get("task_image") or "").strip())
+
+
 async def ensure_ege_tasks_1_6() -> None:
     """При старте бота: если у любого из заданий 1–27 нет условия или решения — заполняет заново."""
     for num in range(1, 28):
-        if num == 8:
-            task = await db.get_ege_task(8)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(8, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 11:
-            task = await db.get_ege_task(11)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(11, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 14:
-            task = await db.get_ege_task(14)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(14, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 17:
-            task = await db.get_ege_task(17)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(17, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 19:
-            task = await db.get_ege_task(19)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(19, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                return
-        elif num == 20:
-            task = await db.get_ege_task(20)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(20, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 21:
-            task = await db.get_ege_task(21)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(21, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 22:
-            task = await db.get_ege_task(22)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(22, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 24:
-            task = await db.get_ege_task(24)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(24, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 26:
-            task = await db.get_ege_task(26)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            for sub in (2, 3, 4, 5):
-                task_sub = await db.get_ege_task(26, subtask=sub)
-                if not task_sub or not (task_sub.get("task_image") or "").strip():
-                    await fill_ege_tasks_1_6()
-                    await fill_ege_tasks_7_9()
-                    await fill_ege_tasks_10_11_12()
-                    await fill_ege_tasks_13_14()
-                    await fill_ege_tasks_15_16_17()
-                    await fill_ege_tasks_18_19_20_21()
-                    await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-        elif num == 27:
-            task = await db.get_ege_task(27)
-            if not task or not (task.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            task2 = await db.get_ege_task(27, subtask=2)
-            if not task2 or not (task2.get("task_image") or "").strip():
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
+        task = await db.get_ege_task(num)
+        parts = db.EGE_SUBTASK_PARTS.get(num, ())
+        if parts:
+            # Задания с подзаданиями: нужны фото условия у основного и у каждого подзадания
+            complete = _has_task_image(task)
+            for part in parts:
+                complete = complete and _has_task_image(await db.get_ege_task(num, subtask=part))
         else:
-            task = await db.get_ege_task(num)
-            if not task:
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-            ti = (task.get("task_image") or "").strip()
-            si = (task.get("solution_image") or "").strip()
-            ex = (task.get("example_solution") or "").strip()
-            if not ti or (not si and not ex):
-                await fill_ege_tasks_1_6()
-                await fill_ege_tasks_7_9()
-                await fill_ege_tasks_10_11_12()
-                await fill_ege_tasks_13_14()
-                await fill_ege_tasks_15_16_17()
-                await fill_ege_tasks_18_19_20_21()
-                await fill_ege_tasks_22_23_24()
-                await fill_ege_tasks_25()
-                await fill_ege_tasks_26()
-                await fill_ege_tasks_27()
-                return
-    return
+            complete = _has_task_image(task) and bool(
+                (task.get("solution_image") or "").strip() or (task.get("example_solution") or "").strip()
+            )
+        if not complete:
+            await fill_all_ege_tasks()
+            return
 
 
 async def main() -> None:
     await db.init_db()
-    await fill_ege_tasks_1_6()
-    await fill_ege_tasks_7_9()
-    await fill_ege_tasks_10_11_12()
-    await fill_ege_tasks_13_14()
-    await fill_ege_tasks_15_16_17()
-    await fill_ege_tasks_18_19_20_21()
-    await fill_ege_tasks_22_23_24()
-    await fill_ege_tasks_25()
-    await fill_ege_tasks_26()
-    await fill_ege_tasks_27()
+    await fill_all_ege_tasks()
     for num in range(1, 28):
         print(f"Задание {num}: настроено")
     print("Готово. Задания 1–27 (8, 11, 14, 17, 19, 20, 21, 22, 24, 27 — по два типа; 26 — пять типов; 18 — несколько скринов решений).")
@@ -0,0 +1,24 @@
+"""Общие фикстуры: временная БД вместо tutor_bot.db."""
+
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "123456789:test_token_placeholder_for_ci")
+os.environ.setdefault("TUTOR_USER_ID", "1")
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """database с файлом БД во временной папке и созданной схемой (пул закрыт)."""
+    import database
+    from cache import LRUCache
+    from ege_math_index import EgeMathIndex
+
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "test.db")
+    monkeypatch.setattr(database, "_math_index", EgeMathIndex())
+    monkeypatch.setattr(database, "_ege_cache", LRUCache(maxsize=database.EGE_CACHE_SIZE, ttl=database.EGE_CACHE_TTL))
+    asyncio.run(database.init_db())
+    yield database
+    asyncio.run(database.close_pool())
@@ -0,0 +1,81 @@
+"""lessons.booked_count: триггеры на bookings держат счётчик точным при записи, отмене и удалении."""
+
+import asyncio
+import sqlite3
+
+
+def test_booked_count_follows_bookings(temp_db):
+    db = temp_db
+
+    async def scenario():
+        lesson_id = await db.add_lesson("Математика", "2099-01-10", "14:00", max_students=2)
+        counts = []
+        await db.book_lesson(lesson_id, 101, username="a")
+        await db.book_lesson(lesson_id, 102, username="b")
+        counts.append((await db.get_lesson(lesson_id))["booked_count"])
+        ok, _ = await db.book_lesson(lesson_id, 103, username="c")
+        counts.append((await db.get_lessons_on_date("2099-01-10"))[0]["booked_count"])
+        await db.cancel_booking(lesson_id, 101)
+        counts.append((await db.get_upcoming_lessons())[0]["booked_count"])
+        return ok, counts
+
+    ok, counts = asyncio.run(scenario())
+    assert ok is False  # мест нет
+    assert counts == [2, 2, 1]
+
+
+def test_backfill_for_existing_database(temp_db):
+    db = temp_db
+
+    async def add():
+        lesson_id = await db.add_lesson("Физика", "2099-02-01", "09:00", max_students=5)
+        await db.book_lesson(lesson_id, 201)
+        await db.book_lesson(lesson_id, 202)
+        return lesson_id
+
+    lesson_id = asyncio.run(add())
+    # Старая схема: без колонки и триггеров, версия до миграции _lessons_booked_count
+    conn = sqlite3.connect(db.DB_PATH)
+    for name in ("insert", "delete", "move"):
+        conn.execute(f"DROP TRIGGER bookings_booked_count_{name}")
+    conn.execute("ALTER TABLE lessons DROP COLUMN booked_count")
+    conn.execute("PRAGMA user_version = 3")
+    conn.commit()
+    conn.close()
+
+    asyncio.run(db.init_db())
+    assert asyncio.run(db.get_lesson(lesson_id))["booked_count"] == 2
+
+
+def _stress(db, use_pool: bool, students: int) -> None:
+    async def scenario():
+        if use_pool:
+            await db.open_pool()
+        lesson_id = await db.add_lesson("Разбор варианта", "2099-03-01", "18:00", max_students=5)
+        results = await asyncio.gather(*(db.book_lesson(lesson_id, 1000 + i) for i in range(students)))
+        # Повторная запись того же ученика не проходит
+        results.append(await db.book_lesson(lesson_id, 1000))
+        bookings = await db.get_bookings_for_lesson(lesson_id)
+        lesson = await db.get_lesson(lesson_id)
+        await db.close_pool()
+        return results, bookings, lesson
+
+    results, bookings, lesson = asyncio.run(scenario())
+    assert sum(ok for ok, _ in results) == 5
+    assert len(bookings) == 5
+    assert lesson["booked_count"] == 5
+
+
+def test_concurrent_bookings_respect_capacity_with_pool(temp_db):
+    _stress(temp_db, use_pool=True, students=300)
+
+
+def test_concurrent_bookings_respect_capacity_without_pool(temp_db):
+    # Каждый вызов на своём соединении: ёмкость держит BEGIN IMMEDIATE
+    _stress(temp_db, use_pool=False, students=60)
+
+
+def test_book_missing_lesson(temp_db):
+    ok, message = asyncio.run(temp_db.book_lesson(999, 1))
+    assert ok is False
+    assert message == "Урок не найден."
@@ -0,0 +1,66 @@
+"""Рассылка: лимит скорости и параллелизма, пауза на RetryAfter, результат по каждому получателю."""
+
+import asyncio
+import time
+
+from telegram.error import Forbidden, RetryAfter
+
+from broadcast import SENT, Broadcaster
+
+
+class FakeBot:
+    def __init__(self, errors=None, delay=0.0):
+        self.errors = errors or {}  # chat_id -> список исключений на первые попытки
+        self.delay = delay
+        self.sent = []  # (chat_id, text, time.monotonic())
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            pending = self.errors.get(chat_id)
+            if pending:
+                raise pending.pop(0)
+            self.sent.append((chat_id, text, time.monotonic()))
+        finally:
+            self.in_flight -= 1
+
+
+def test_results_per_recipient_and_failures_do_not_stop_others():
+    bot = FakeBot(errors={2: [Forbidden("bot was blocked by the user")]})
+    report = asyncio.run(Broadcaster().send(bot, [1, 2, 3, 3, None], "привет"))
+    assert report.results == {1: SENT, 2: "bot was blocked by the user", 3: SENT}
+    assert report.sent == 2
+    assert list(report.failed) == [2]
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == [1, 3]
+
+
+def test_rate_and_concurrency_are_bounded():
+    bot = FakeBot(delay=0.005)
+    broadcaster = Broadcaster(rate=100, concurrency=4)
+    report = asyncio.run(broadcaster.send(bot, range(1, 151), "x"))
+    assert report.sent == 150
+    assert bot.max_in_flight <= 4
+    # 100 сообщений — запас ведра, остальные 50 — не быстрее 100/с
+    assert report.elapsed >= 0.45
+
+
+def test_retry_after_pauses_and_retries():
+    bot = FakeBot(errors={1: [RetryAfter(1)]})
+    started = time.monotonic()
+    report = asyncio.run(Broadcaster().send(bot, [1, 2], "x"))
+    assert report.results == {1: SENT, 2: SENT}
+    assert report.retries == 1
+    retried_at = next(at for chat_id, _, at in bot.sent if chat_id == 1)
+    assert retried_at - started >= 1
+
+
+def test_same_chat_is_paced():
+    bot = FakeBot()
+    broadcaster = Broadcaster(per_chat_interval=0.2)
+    asyncio.run(broadcaster.send_each(bot, [(7, "первое"), (7, "второе")]))
+    (_, _, first), (_, _, second) = bot.sent
+    assert second - first >= 0.19
@@ -0,0 +1,57 @@
+"""LRUCache и кэш контента ЕГЭ: повторные чтения без БД, сброс при записи."""
+
+import asyncio
+
+from cache import MISSING, LRUCache
+
+
+def test_lru_eviction_ttl_and_counters(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.put("a", 1)
+    cache.put("b", None)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # вытесняется b — дольше всех не читался
+    assert cache.get("b") is MISSING
+    assert cache.get("c") == 3
+    now[0] += 11
+    assert cache.get("a") is MISSING
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_stale_read_not_stored_after_invalidate():
+    cache = LRUCache()
+    generation = cache.generation
+    cache.invalidate("k")  # запись прошла, пока читали из источника
+    cache.put("k", "старое", generation)
+    assert cache.get("k") is MISSING
+
+
+def test_ege_reads_served_from_cache(temp_db):
+    db = temp_db
+    statements = []
+
+    async def scenario():
+        await db.set_ege_task(5, title="Задание 5", task_image="5.png")
+        await db.open_pool()
+        for conn in db._pool._reader_conns:
+            await conn.set_trace_callback(statements.append)
+        first = await db.get_ege_task(5)
+        reads_after_first = len(statements)
+        for _ in range(40):
+            await db.get_ege_task(5)
+            await db.get_all_ege_task_numbers()
+        warm_reads = len(statements)
+        await db.set_ege_task(5, title="Задание 5 (новое)")
+        updated = await db.get_ege_task(5)
+        await db.close_pool()
+        return first, reads_after_first, warm_reads, updated
+
+    first, reads_after_first, warm_reads, updated = asyncio.run(scenario())
+    assert first["title"] == "Задание 5"
+    assert reads_after_first == 1
+    assert warm_reads == 2  # по одному запросу на ключ
+    assert updated["title"] == "Задание 5 (новое)"
+    assert db.ege_cache_stats()["hits"] >= 40
@@ -0,0 +1,80 @@
+"""Пул соединений: чтение видит записи, записи идут по очереди, без пула работают одноразовые соединения."""
+
+import asyncio
+
+
+def test_pool_reads_see_committed_writes(temp_db):
+    db = temp_db
+
+    async def scenario():
+        await db.open_pool()
+        lesson_id = await db.add_lesson("Математика", "2099-01-10", "14:00", max_students=3)
+        lesson = await db.get_lesson(lesson_id)
+        await db.close_pool()
+        return lesson
+
+    lesson = asyncio.run(scenario())
+    assert lesson["title"] == "Математика"
+    assert lesson["max_students"] == 3
+
+
+def test_pool_serializes_concurrent_writes(temp_db):
+    db = temp_db
+
+    async def scenario():
+        await db.open_pool()
+        ids = await asyncio.gather(*(db.add_lesson(f"Урок {i}", "2099-01-10", "10:00") for i in range(50)))
+        lessons = await db.get_lessons_on_date("2099-01-10")
+        await db.close_pool()
+        return ids, lessons
+
+    ids, lessons = asyncio.run(scenario())
+    assert len(set(ids)) == 50
+    assert len(lessons) == 50
+
+
+def test_without_pool_uses_one_off_connections(temp_db):
+    db = temp_db
+
+    async def scenario():
+        lesson_id = await db.add_lesson("Физика", "2099-02-01", "09:00")
+        return await db.get_lesson(lesson_id)
+
+    assert asyncio.run(scenario())["title"] == "Физика"
+
+
+def test_pragma_profile_applied_to_pool_connections(temp_db):
+    db = temp_db
+
+    async def scenario():
+        await db.open_pool()
+        async with db._read() as conn:
+            values = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store"):
+                cursor = await conn.execute(f"PRAGMA {name}")
+                values[name] = (await cursor.fetchone())[0]
+        await db.close_pool()
+        return values
+
+    values = asyncio.run(scenario())
+    assert values["journal_mode"] == "wal"
+    assert values["synchronous"] == 1  # NORMAL
+    assert values["busy_timeout"] == 5000
+    assert values["temp_store"] == 2  # MEMORY
+
+
+def test_checkpoint_and_export_include_wal_data(temp_db):
+    db = temp_db
+
+    async def scenario():
+        await db.open_pool()
+        await db.add_lesson("Химия", "2099-03-01", "12:00")
+        exported = await db.export_db_bytes()
+        busy, _, _ = await db.checkpoint_wal()
+        await db.close_pool()
+        return exported, busy
+
+    exported, busy = asyncio.run(scenario())
+    assert exported.startswith(b"SQLite format 3")
+    assert "Химия".encode() in exported
+    assert busy == 0
@@ -0,0 +1,53 @@
+"""Банк ЕГЭ Математика: выбор через индекс в памяти и колоды учеников без повторов."""
+
+import asyncio
+import sqlite3
+
+from ege_math_index import EgeMathIndex
+
+
+def test_deck_shows_every_variant_before_repeat():
+    index = EgeMathIndex()
+    index.load([(1, 5), (2, 5), (3, 5), (4, 7)], max_id=4)
+    first_cycle = [index.pick(5, user_id=10) for _ in range(3)]
+    second_cycle = [index.pick(5, user_id=10) for _ in range(3)]
+    assert sorted(first_cycle) == [1, 2, 3]
+    assert sorted(second_cycle) == [1, 2, 3]
+    assert index.pick(8, user_id=10) is None
+    assert index.pick(user_id=10) in {1, 2, 3, 4}
+
+
+def test_added_variant_joins_started_deck():
+    index = EgeMathIndex()
+    index.load([(1, 5), (2, 5)], max_id=2)
+    seen = [index.pick(5, user_id=10)]
+    index.add(3, 5)
+    index.add(4, 5, listed=False)
+    seen += [index.pick(5, user_id=10), index.pick(5, user_id=10)]
+    assert sorted(seen) == [1, 2, 3]
+    assert index.max_id == 4
+
+
+def test_bank_picks_without_repeats_and_sees_external_inserts(temp_db):
+    db = temp_db
+
+    async def fill():
+        for i in range(3):
+            await db.set_ege_math_task(4, task_text=f"Вариант {i}", solution_text="ответ")
+        await db.set_ege_math_task(4, task_text="  ")  # пустые в выдачу не попадают
+
+    async def picks(n):
+        return [(await db.get_ege_math_task(4, user_id=77))["task_text"] for _ in range(n)]
+
+    asyncio.run(fill())
+    assert sorted(asyncio.run(picks(3))) == ["Вариант 0", "Вариант 1", "Вариант 2"]
+
+    # Скрипт заполнения пишет в БД мимо бота — после срока жизни кэша индекс перечитывается
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("INSERT INTO ege_math_bank (task_number, task_text) VALUES (9, 'Из скрипта')")
+    conn.commit()
+    conn.close()
+    assert asyncio.run(db.get_ege_math_task(9)) is None
+    db._ege_cache.clear()  # как по истечении EGE_CACHE_TTL
+    assert asyncio.run(db.get_ege_math_task(9))["task_text"] == "Из скрипта"
+    assert asyncio.run(db.get_ege_math_random_task(user_id=77)) is not None
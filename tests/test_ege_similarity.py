@@ -0,0 +1,77 @@
+"""Поиск задания из банка ЕГЭ по тексту вопроса: совпадение с точностью до оформления, разные числа — не совпадение."""
+
+import asyncio
+
+import homework_llm
+from ege_similarity import EgeSimilarityIndex
+from tests.yandex_stub import YandexStub
+
+BANK = [
+    (1, "Найдите корень уравнения log2(4 - x) = 7."),
+    (2, "Найдите значение выражения 5^2 * 3 - 14."),
+    (3, "В треугольнике ABC угол C равен 90°, AC = 6, BC = 8. Найдите AB."),
+    (4, "Найдите корень уравнения log3(5 + x) = 2."),
+]
+
+
+def _index() -> EgeSimilarityIndex:
+    index = EgeSimilarityIndex()
+    index.build(BANK + [(5, "   ")], max_id=5)
+    return index
+
+
+def test_same_task_with_different_formatting_matches():
+    index = _index()
+    assert len(index) == 4
+    bank_id, score = index.match("найдите корень уравнения LOG2(4-x)=7", 0.8)
+    assert bank_id == 1 and score > 0.95
+    assert index.match("В треугольнике ABC угол C равен 90, AC=6, BC=8. Найдите AB", 0.8)[0] == 3
+
+
+def test_other_numbers_or_unrelated_text_do_not_match():
+    index = _index()
+    # Почти тот же текст, но другое число — ответ другой
+    assert index.best("Найдите корень уравнения log2(4 - x) = 8.")[1] > 0.8
+    assert index.match("Найдите корень уравнения log2(4 - x) = 8.", 0.8) is None
+    assert index.match("Сколько будет 2 + 2?", 0.8) is None
+    assert EgeSimilarityIndex().best("что угодно") is None
+
+
+def test_bank_task_is_answered_without_gpt(temp_db, monkeypatch):
+    async def scenario():
+        await temp_db.set_ege_math_task(5, "Найдите корень уравнения log2(4 - x) = 7.", "4 - x = 128, x = -124.")
+        stub = await YandexStub().start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            from_bank = await homework_llm.ask_homework("Найдите корень уравнения log2(4-x) = 7", "key", "folder")
+            other = await homework_llm.ask_homework("Найдите корень уравнения log2(4-x) = 9", "key", "folder")
+        finally:
+            await stub.stop()
+        return stub, from_bank, other
+
+    stub, from_bank, other = asyncio.run(scenario())
+    assert from_bank.startswith("📚 Это задание №5") and from_bank.endswith("x = -124.")
+    assert other == "Ответ"
+    assert stub.requests == ["/completion"]
+
+
+def test_photo_caption_is_part_of_the_bank_query(temp_db, monkeypatch):
+    photo_text = "Найдите корень уравнения log2(4 - x) = 7."
+
+    async def scenario():
+        await temp_db.set_ege_math_task(5, photo_text, "4 - x = 128, x = -124.")
+        stub = await YandexStub().start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            photo_only = await homework_llm.ask_homework("", "key", "folder", image_text=photo_text)
+            with_caption = await homework_llm.ask_homework(
+                "Проверь мой ответ: 7", "key", "folder", image_text=photo_text
+            )
+        finally:
+            await stub.stop()
+        return stub, photo_only, with_caption
+
+    stub, photo_only, with_caption = asyncio.run(scenario())
+    assert photo_only.startswith("📚 Это задание №5")
+    assert with_caption == "Ответ"
+    assert stub.requests == ["/completion"]
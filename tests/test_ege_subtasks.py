@@ -0,0 +1,78 @@
+"""Подзадания ЕГЭ в таблице ege_subtasks: перенос из JSON, upsert, массовое заполнение одной транзакцией."""
+
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+
+def test_subtask_upsert_and_lookup(temp_db):
+    db = temp_db
+
+    async def scenario():
+        await db.set_ege_task(26, title="Задача 26.1", source_url="https://example.org/26")
+        await db.set_ege_subtask(26, part=4, title="", task_image="26_4.png")
+        await db.set_ege_subtask(26, part=4, title="Камера хранения", task_image="26_4_new.png")
+        await db.set_ege_subtask(26, part=9, title="нет такой части")
+        return (
+            await db.get_ege_task(26, subtask=4),
+            await db.get_ege_task(26, subtask=3),
+            await db.get_ege_task(26),
+        )
+
+    sub, missing, main = asyncio.run(scenario())
+    assert sub["title"] == "Камера хранения"
+    assert sub["task_image"] == "26_4_new.png"
+    assert sub["source_url"] == "https://example.org/26"
+    assert missing is None
+    assert main["title"] == "Задача 26.1"
+
+
+def test_json_subtasks_migrated(temp_db):
+    db = temp_db
+    conn = sqlite3.connect(db.DB_PATH)
+    blob = {"2": {"title": "Задача 8.2", "task_image": "8_2.png", "example_solution": "print(1)"}}
+    conn.execute(
+        "INSERT INTO ege_tasks (task_number, title, subtasks) VALUES (8, 'Задача 8.1', ?)",
+        (json.dumps(blob, ensure_ascii=False),),
+    )
+    conn.execute("DROP TABLE ege_subtasks")
+    conn.execute("PRAGMA user_version = 5")
+    conn.commit()
+    conn.close()
+
+    asyncio.run(db.init_db())
+    sub = asyncio.run(db.get_ege_task(8, subtask=2))
+    assert sub["task_image"] == "8_2.png"
+    assert sub["example_solution"] == "print(1)"
+
+
+def test_transaction_is_all_or_nothing(temp_db):
+    db = temp_db
+
+    async def failing_fill():
+        async with db.transaction():
+            await db.set_ege_task(1, title="Задание 1")
+            await db.set_ege_subtask(8, part=2, title="Задача 8.2")
+            assert (await db.get_ege_task(1))["title"] == "Задание 1"  # видно внутри транзакции
+            raise RuntimeError("сбой посреди заполнения")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(failing_fill())
+    assert asyncio.run(db.get_ege_task(1)) is None
+
+
+def test_fill_all_ege_tasks_in_one_transaction(temp_db):
+    import set_ege_images_1_6
+
+    async def scenario():
+        await temp_db.open_pool()
+        await set_ege_images_1_6.ensure_ege_tasks_1_6()
+        result = await temp_db.get_ege_task(26, subtask=5), await temp_db.get_all_ege_task_numbers()
+        await temp_db.close_pool()
+        return result
+
+    sub, numbers = asyncio.run(scenario())
+    assert sub["task_image"] == "ege_images/26_5_task.png"
+    assert numbers == list(range(1, 28))
@@ -0,0 +1,144 @@
+"""
+Кэши homework_llm: повторный вопрос (с точностью до нормализации) не доходит до Yandex GPT,
+повторное фото — до Yandex Vision.
+"""
+
+import asyncio
+from datetime import timedelta
+
+import homework_llm
+import llm_scheduler
+from cache import LRUCache
+from tests.yandex_stub import YandexStub
+
+
+def test_normalize_question_ignores_case_spaces_and_punctuation():
+    assert homework_llm.normalize_question("  Решите уравнение:\n x + 3.5 = 7!  ") == "решите уравнение x + 3.5 = 7"
+    assert homework_llm.normalize_question("Найдите ЁМКОСТЬ, «C».") == "найдите емкость c"
+    # десятичные дроби не склеиваются в другое число
+    assert homework_llm.normalize_question("2,5") != homework_llm.normalize_question("25")
+
+
+def _ask_all(monkeypatch, questions, **kwargs):
+    async def scenario():
+        stub = await YandexStub(answer="x = 4").start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            answers = [await homework_llm.ask_homework(q, "key", "folder", **kwargs) for q in questions]
+        finally:
+            await stub.stop()
+        return stub, answers
+
+    return asyncio.run(scenario())
+
+
+def test_repeated_question_is_served_from_cache(temp_db, monkeypatch):
+    monkeypatch.setattr(homework_llm, "_cache_stats", {"hits": 0, "misses": 0})
+    stub, answers = _ask_all(monkeypatch, ["Реши уравнение x + 3 = 7", "реши уравнение   x + 3 = 7.", "Реши x + 3 = 8"])
+    assert answers == ["x = 4"] * 3
+    assert stub.requests == ["/completion", "/completion"]
+    stats = asyncio.run(homework_llm.cache_stats())
+    assert {k: stats[k] for k in ("hits", "misses", "entries", "stored_hits")} == {
+        "hits": 1, "misses": 2, "entries": 2, "stored_hits": 1,
+    }
+
+
+def test_use_cache_false_bypasses_cache(temp_db, monkeypatch):
+    async def scenario():
+        stub = await YandexStub(answer="старый ответ").start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            first = await homework_llm.ask_homework("Реши уравнение", "key", "folder")
+            stub.answer = "новый ответ"
+            fresh = await homework_llm.ask_homework("Реши уравнение", "key", "folder", use_cache=False)
+            later = await homework_llm.ask_homework("Реши уравнение", "key", "folder")
+        finally:
+            await stub.stop()
+        return stub, [first, fresh, later]
+
+    stub, answers = asyncio.run(scenario())
+    # новый ответ заменил сохранённый: следующий вопрос получает его без запроса к GPT
+    assert answers == ["старый ответ", "новый ответ", "новый ответ"]
+    assert stub.requests == ["/completion", "/completion"]
+
+
+def test_expired_and_excess_answers_are_evicted(temp_db):
+    day = 86400
+
+    async def scenario():
+        await temp_db.put_homework_answer("old", "q", "a", 30 * day, 10)
+        async with temp_db._write() as conn:
+            stale = temp_db.utc_now(-timedelta(days=31))
+            await conn.execute("UPDATE homework_answers SET created_at = ?, used_at = ? WHERE key = 'old'", (stale, stale))
+        assert await temp_db.get_homework_answer("old", 30 * day) is None
+        for n in range(3):
+            await temp_db.put_homework_answer(f"k{n}", "q", "a", 30 * day, 2)
+        return await temp_db.homework_answers_stats(), await temp_db.get_homework_answer("k2", 30 * day)
+
+    stats, newest = asyncio.run(scenario())
+    assert stats["entries"] == 2
+    assert newest == "a"
+
+
+def test_repeated_photo_skips_vision(monkeypatch):
+    monkeypatch.setattr(homework_llm, "HOMEWORK_CACHE_SIZE", 0)
+    monkeypatch.setattr(homework_llm, "EGE_MATCH_THRESHOLD", 0)
+    monkeypatch.setattr(homework_llm, "_ocr_cache", LRUCache())
+
+    async def scenario():
+        stub = await YandexStub(ocr_text="2 + 2 = ?").start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            await homework_llm.ask_homework("", "key", "folder", image_bytes=b"png", image_id="u1")
+            # то же фото: уже скачанное под другим id (переслано) и по file_unique_id без скачивания
+            await homework_llm.ask_homework("", "key", "folder", image_bytes=b"png", image_id="u2")
+            cached = homework_llm.cached_image_text("u2")
+            await homework_llm.ask_homework("", "key", "folder", image_id="u2", image_text=cached)
+        finally:
+            await stub.stop()
+        return stub, cached
+
+    stub, cached = asyncio.run(scenario())
+    assert cached == "2 + 2 = ?"
+    assert stub.requests == ["/vision", "/completion", "/completion", "/completion"]
+    assert homework_llm.cached_image_text("u3") is None
+
+
+def test_cache_hit_does_not_wait_for_busy_gpt_slots(temp_db, monkeypatch):
+    scheduler = llm_scheduler.FairScheduler(limit=1)
+    monkeypatch.setattr(llm_scheduler, "_default", scheduler)
+
+    async def scenario():
+        stub = await YandexStub(answer="x = 4").start()
+        stub.patch(monkeypatch, homework_llm)
+        gate = asyncio.Event()
+        busy = asyncio.create_task(scheduler.run(99, gate.wait))
+        try:
+            await homework_llm.ask_homework("Реши уравнение x + 3 = 7", "key", "folder")
+            await asyncio.sleep(0)
+            assert scheduler.running == 1
+            positions = []
+
+            async def report(position):
+                positions.append(position)
+
+            cached = await asyncio.wait_for(
+                homework_llm.ask_homework("Реши уравнение x + 3 = 7", "key", "folder", user_id=1, on_position=report),
+                timeout=1,
+            )
+            # новый вопрос ждёт места у GPT
+            fresh = asyncio.create_task(
+                homework_llm.ask_homework("Реши x + 3 = 8", "key", "folder", user_id=1, on_position=report)
+            )
+            await asyncio.sleep(0.05)
+            waiting = not fresh.done()
+            gate.set()
+            await asyncio.gather(busy, fresh)
+        finally:
+            await stub.stop()
+        return cached, waiting, positions, stub
+
+    cached, waiting, positions, stub = asyncio.run(scenario())
+    assert cached == "x = 4"
+    assert waiting and positions == [1]
+    assert stub.requests == ["/completion", "/completion"]
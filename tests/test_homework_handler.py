@@ -0,0 +1,97 @@
+"""Обработчик помощи с домашкой: кнопка «Ответить заново» у каждого ответа своя."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import homework_llm
+from handlers import student
+
+
+class FakeMessage:
+    chat_id = 1
+
+    def __init__(self, text="", log=None):
+        self.text, self.caption, self.photo = text, None, None
+        self.log = log if log is not None else []
+
+    async def reply_text(self, text, parse_mode=None, reply_markup=None):
+        self.log.append((text, reply_markup))
+        return FakeMessage(log=self.log)
+
+    async def edit_text(self, text, parse_mode=None, reply_markup=None):
+        self.log.append((text, reply_markup))
+
+
+class FakeBot:
+    async def send_chat_action(self, chat_id, action):
+        pass
+
+
+def _context():
+    tasks = []
+    application = SimpleNamespace(create_task=lambda coro, update=None: tasks.append(coro))
+    context = SimpleNamespace(
+        user_data={"homework_help": True}, bot_data={}, bot=FakeBot(), application=application,
+    )
+    return context, tasks
+
+
+@pytest.fixture
+def asked(monkeypatch):
+    questions = []
+
+    async def fake_ask(text, *args, use_cache=True, **kwargs):
+        questions.append((text, use_cache))
+        return f"ответ на «{text}»"
+
+    monkeypatch.setattr(homework_llm, "ask_homework", fake_ask)
+    return questions
+
+
+def _buttons(log):
+    return [markup.inline_keyboard[0][0].callback_data for _, markup in log if markup is not None]
+
+
+def test_refresh_button_reasks_its_own_question(asked):
+    async def scenario():
+        context, tasks = _context()
+        log = []
+        for text in ("Вопрос один", "Вопрос два"):
+            update = SimpleNamespace(message=FakeMessage(text, log), effective_user=SimpleNamespace(id=7))
+            await student.homework_receive(update, context)
+            await tasks.pop()
+        first, second = _buttons(log)
+        query = SimpleNamespace(message=FakeMessage(log=log))
+        await student.handle_callback(query, context, first, 7)
+        await tasks.pop()
+        return first, second, log
+
+    first, second, log = asyncio.run(scenario())
+    assert first != second
+    assert asked == [("Вопрос один", True), ("Вопрос два", True), ("Вопрос один", False)]
+    # у обновлённого ответа — та же кнопка
+    assert _buttons(log)[-1] == first
+
+
+def test_unknown_refresh_id_is_reported_as_expired(asked):
+    async def scenario():
+        context, tasks = _context()
+        log = []
+        query = SimpleNamespace(message=FakeMessage(log=log))
+        await student.handle_callback(query, context, "homework_refresh_42", 7)
+        return tasks, log
+
+    tasks, log = asyncio.run(scenario())
+    assert tasks == [] and asked == []
+    assert [text for text, _ in log] == ["Этот вопрос устарел — пришли его ещё раз."]
+
+
+def test_only_recent_questions_are_kept():
+    user_data = {}
+    for n in range(student._HOMEWORK_QUESTIONS_KEEP + 5):
+        student._remember_homework_question(user_data, {"text": str(n)})
+    ids = list(user_data["homework_questions"])
+    assert len(ids) == student._HOMEWORK_QUESTIONS_KEEP
+    assert ids[-1] == student._HOMEWORK_QUESTIONS_KEEP + 5
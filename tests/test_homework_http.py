@@ -0,0 +1,57 @@
+"""homework_llm через общую HTTP-сессию: GPT и OCR идут по одному keep-alive соединению к заглушке API."""
+
+import asyncio
+
+import pytest
+
+import homework_llm
+from cache import LRUCache
+from tests.yandex_stub import YandexStub
+
+
+@pytest.fixture(autouse=True)
+def _no_answer_cache(monkeypatch):
+    """Здесь важны сами запросы к API — кэши ответов, OCR и банк ЕГЭ не участвуют."""
+    monkeypatch.setattr(homework_llm, "HOMEWORK_CACHE_SIZE", 0)
+    monkeypatch.setattr(homework_llm, "EGE_MATCH_THRESHOLD", 0)
+    monkeypatch.setattr(homework_llm, "_ocr_cache", LRUCache())
+
+
+async def _ask_twice(stub):
+    return [
+        await homework_llm.ask_homework("", "key", "folder", image_bytes=b"png"),
+        await homework_llm.ask_homework("Реши уравнение", "key", "folder"),
+    ]
+
+
+def test_shared_session_reuses_connections(monkeypatch):
+    async def scenario():
+        stub = await YandexStub(answer="x = 4").start()
+        stub.patch(monkeypatch, homework_llm)
+        await homework_llm.open_http_session()
+        try:
+            answers = await _ask_twice(stub)
+        finally:
+            await homework_llm.close_http_session()
+            await stub.stop()
+        return stub, answers
+
+    stub, answers = asyncio.run(scenario())
+    assert answers == ["x = 4", "x = 4"]
+    assert stub.requests == ["/vision", "/completion", "/completion"]
+    assert len(stub.connections) == 1
+
+
+def test_without_session_each_call_connects(monkeypatch):
+    async def scenario():
+        stub = await YandexStub().start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            await _ask_twice(stub)
+        finally:
+            await stub.stop()
+        return stub
+
+    stub = asyncio.run(scenario())
+    assert len(stub.requests) == 3
+    assert len(stub.connections) == 3  # скрипты вне бота: одноразовая сессия на запрос
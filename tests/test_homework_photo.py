@@ -0,0 +1,56 @@
+"""Фото перед OCR: выбор размера из PhotoSize, скачивание в один буфер, пережатие (если есть Pillow)."""
+
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+
+import homework_photo
+
+
+def _size(side: int, file_size: int):
+    return SimpleNamespace(file_id=f"f{side}", width=side, height=side * 3 // 4, file_size=file_size)
+
+
+SIZES = [_size(90, 1_000), _size(320, 10_000), _size(800, 60_000), _size(1280, 150_000), _size(2560, 600_000)]
+
+
+def test_pick_smallest_readable_size():
+    assert homework_photo.pick_photo_size(SIZES, min_side=1200).width == 1280
+    assert homework_photo.pick_photo_size(SIZES, min_side=600).width == 800
+    # Все меньше порога — берём самое большое, что есть
+    assert homework_photo.pick_photo_size(SIZES[:3], min_side=1200).width == 800
+
+
+def test_download_counts_bytes_against_largest(monkeypatch):
+    monkeypatch.setattr(homework_photo, "stats", dict.fromkeys(homework_photo.stats, 0))
+
+    class FakeFile:
+        async def download_to_memory(self, out):
+            out.write(b"x" * 150_000)
+
+    class FakeBot:
+        async def get_file(self, file_id):
+            assert file_id == "f1280"
+            return FakeFile()
+
+    data = asyncio.run(homework_photo.download(FakeBot(), SIZES[3], SIZES[-1]))
+    assert len(data) == 150_000
+    assert homework_photo.stats["downloaded_bytes"] == 150_000
+    assert homework_photo.stats["largest_bytes"] == 600_000
+
+
+def test_compact_leaves_small_or_unreadable_images_alone():
+    assert homework_photo.compact(b"not an image") == b"not an image"
+
+
+def test_compact_downscales_large_image():
+    Image = pytest.importorskip("PIL.Image")
+    buf = io.BytesIO()
+    Image.effect_noise((3000, 2000), 64).convert("RGB").save(buf, format="PNG")
+    data = buf.getvalue()
+    compacted = homework_photo.compact(data, max_side=1600)
+    assert len(compacted) < len(data)
+    with Image.open(io.BytesIO(compacted)) as image:
+        assert max(image.size) == 1600
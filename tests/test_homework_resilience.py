@@ -0,0 +1,94 @@
+"""Повторы, предохранитель и дублирующие запросы homework_llm против заглушки API со сбоями и задержками."""
+
+import asyncio
+import time
+
+import pytest
+
+import homework_llm
+import resilience
+from cache import LRUCache
+from tests.yandex_stub import YandexStub
+
+
+@pytest.fixture(autouse=True)
+def _fresh_state(monkeypatch):
+    monkeypatch.setattr(homework_llm, "HOMEWORK_CACHE_SIZE", 0)
+    monkeypatch.setattr(homework_llm, "EGE_MATCH_THRESHOLD", 0)
+    monkeypatch.setattr(homework_llm, "_ocr_cache", LRUCache())
+    monkeypatch.setattr(homework_llm, "YANDEX_RETRY_DELAY", 0)
+    monkeypatch.setattr(homework_llm, "_gpt_breaker", resilience.CircuitBreaker("gpt", 3, 60))
+    monkeypatch.setattr(homework_llm, "_vision_breaker", resilience.CircuitBreaker("vision", 3, 60))
+
+
+def _run(monkeypatch, scenario, **stub_kwargs):
+    async def main():
+        stub = await YandexStub(**stub_kwargs).start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            return stub, await scenario(stub)
+        finally:
+            await stub.stop()
+
+    return asyncio.run(main())
+
+
+def test_retryable_statuses_are_retried(monkeypatch):
+    async def scenario(stub):
+        stub.script("/completion", 503, 429)
+        return await homework_llm.ask_homework("Вопрос", "key", "folder")
+
+    stub, answer = _run(monkeypatch, scenario, answer="x = 4")
+    assert answer == "x = 4"
+    assert stub.requests == ["/completion"] * 3
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    async def scenario(stub):
+        stub.script("/completion", 400)
+        return await homework_llm.ask_homework("Вопрос", "key", "folder")
+
+    stub, answer = _run(monkeypatch, scenario)
+    assert answer is None
+    assert stub.requests == ["/completion"]
+    assert homework_llm._gpt_breaker.state == "closed"
+
+
+def test_breaker_fails_fast_during_outage(monkeypatch):
+    monkeypatch.setattr(homework_llm, "YANDEX_RETRIES", 0)
+
+    async def scenario(stub):
+        stub.script("/completion", *[503] * 10)
+        answers = [await homework_llm.ask_homework("Вопрос", "key", "folder") for _ in range(5)]
+        return answers
+
+    stub, answers = _run(monkeypatch, scenario)
+    assert answers == [None] * 5
+    assert len(stub.requests) == 3  # дальше предохранитель не пускает запросы
+    assert homework_llm._gpt_breaker.state == "open"
+
+
+def test_breaker_recovers_after_probe():
+    breaker = resilience.CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+    breaker.failure()
+    assert not breaker.allow()
+    time.sleep(0.02)
+    assert breaker.allow()  # пробный запрос
+    assert not breaker.allow()  # второй ждёт исхода пробного
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_slow_ocr_is_hedged(monkeypatch):
+    monkeypatch.setattr(homework_llm, "YANDEX_OCR_HEDGE_AFTER", 0.05)
+
+    async def scenario(stub):
+        stub.script("/vision", 0.5)
+        started = time.monotonic()
+        text = await homework_llm.recognize_image(b"png", "key")
+        return text, time.monotonic() - started
+
+    stub, (text, elapsed) = _run(monkeypatch, scenario, ocr_text="2 + 2 = ?")
+    assert text == "2 + 2 = ?"
+    assert elapsed < 0.4
+    assert stub.requests == ["/vision", "/vision"]
@@ -0,0 +1,91 @@
+"""Потоковый ответ GPT: текст приходит кусками, черновик в Telegram правится с ограничением частоты."""
+
+import asyncio
+import time
+
+import pytest
+
+import homework_llm
+from handlers.student import _StreamingReply
+from tests.yandex_stub import YandexStub
+
+
+@pytest.fixture(autouse=True)
+def _no_answer_cache(monkeypatch):
+    """Здесь важны сами запросы к API — кэш ответов и банк ЕГЭ не участвуют."""
+    monkeypatch.setattr(homework_llm, "HOMEWORK_CACHE_SIZE", 0)
+    monkeypatch.setattr(homework_llm, "EGE_MATCH_THRESHOLD", 0)
+
+
+def test_partials_arrive_before_the_answer_is_complete(monkeypatch):
+    partials = []
+
+    async def on_partial(text):
+        partials.append((text, time.monotonic()))
+
+    async def scenario():
+        stub = await YandexStub(answer="раз два три четыре пять", chunk_delay=0.05).start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            started = time.monotonic()
+            answer = await homework_llm.ask_homework("Вопрос", "key", "folder", on_partial=on_partial)
+            return answer, started, time.monotonic()
+        finally:
+            await stub.stop()
+
+    answer, started, finished = asyncio.run(scenario())
+    assert answer == "раз два три четыре пять"
+    assert [text for text, _ in partials] == ["раз", "раз два", "раз два три", "раз два три четыре", answer]
+    assert partials[0][1] - started < (finished - started) / 2
+
+
+def test_stream_disabled_falls_back_to_whole_answer(monkeypatch):
+    monkeypatch.setattr(homework_llm, "YANDEX_GPT_STREAM", False)
+    partials = []
+
+    async def on_partial(text):
+        partials.append(text)
+
+    async def scenario():
+        stub = await YandexStub(answer="целиком").start()
+        stub.patch(monkeypatch, homework_llm)
+        try:
+            return await homework_llm.ask_homework("Вопрос", "key", "folder", on_partial=on_partial)
+        finally:
+            await stub.stop()
+
+    assert asyncio.run(scenario()) == "целиком"
+    assert partials == []
+
+
+class FakeMessage:
+    def __init__(self, log):
+        self.log = log
+
+    async def reply_text(self, text, parse_mode=None, reply_markup=None):
+        self.log.append(("send", text, parse_mode))
+        return FakeMessage(self.log)
+
+    async def edit_text(self, text, parse_mode=None, reply_markup=None):
+        self.log.append(("edit", text, parse_mode))
+
+
+def test_draft_edits_are_throttled_and_final_is_formatted():
+    log = []
+
+    async def scenario():
+        draft = _StreamingReply(FakeMessage(log), interval=60)
+        for n in range(1, 30):
+            await draft.update("слово " * n)
+        await draft.finish("<b>итог</b>", parse_mode="HTML")
+
+    asyncio.run(scenario())
+    assert [action for action, _, _ in log] == ["send", "edit"]
+    assert log[0][1].endswith("▌")
+    assert log[-1] == ("edit", "<b>итог</b>", "HTML")
+
+
+def test_finish_without_draft_sends_new_message():
+    log = []
+    asyncio.run(_StreamingReply(FakeMessage(log)).finish("Не удалось распознать текст"))
+    assert log == [("send", "Не удалось распознать текст", None)]
@@ -0,0 +1,50 @@
+"""Реестр заданий по урокам: удаление урока и очистка снимают только задания этих уроков."""
+
+from types import SimpleNamespace
+
+from handlers.tutor import _schedule_reminders
+from job_registry import get_registry
+
+
+class FakeJob:
+    def __init__(self, name):
+        self.name = name
+        self.removed = False
+
+    def schedule_removal(self):
+        self.removed = True
+
+
+def _context():
+    jobs = []
+
+    def run_once(callback, when, data, name):
+        jobs.append(FakeJob(name))
+        return jobs[-1]
+
+    return SimpleNamespace(application=SimpleNamespace(job_queue=SimpleNamespace(run_once=run_once)), bot_data={}), jobs
+
+
+def test_cancel_touches_only_the_lesson_jobs():
+    context, jobs = _context()
+    _schedule_reminders(context, [
+        {"id": lesson_id, "lesson_date": "2099-01-10", "lesson_time": "14:00"} for lesson_id in (1, 2, 3)
+    ])
+    registry = get_registry(context.bot_data)
+    assert len(registry) == 6
+
+    assert registry.cancel(2) == 2
+    assert [job.name for job in jobs if job.removed] == ["remind_1d_2", "remind_1h_2"]
+    registry.discard(1, "1day")  # отработало само — не снимается, просто забывается
+    assert registry.cancel_all() == 3
+    assert [job.name for job in jobs if not job.removed] == ["remind_1d_1"]
+    assert len(registry) == 0
+
+
+def test_rescheduling_replaces_previous_job():
+    context, jobs = _context()
+    lesson = {"id": 5, "lesson_date": "2099-01-10", "lesson_time": "14:00"}
+    _schedule_reminders(context, [lesson])
+    _schedule_reminders(context, [lesson])
+    assert [job.removed for job in jobs] == [True, True, False, False]
+    assert len(get_registry(context.bot_data)) == 2
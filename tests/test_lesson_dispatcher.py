@@ -0,0 +1,90 @@
+"""Таймлайн ссылок к началу: событие один раз, догоняние после задержки, еженедельные слоты."""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import lesson_dispatcher
+from lesson_dispatcher import LessonDispatcher
+
+NOW = datetime(2099, 1, 5, 13, 0)  # понедельник
+
+
+def _lesson(lesson_id, date, time):
+    return {"id": lesson_id, "lesson_date": date, "lesson_time": time}
+
+
+def test_lesson_fires_once_at_lead_time():
+    d = LessonDispatcher(fire=None)
+    d.load([_lesson(1, "2099-01-05", "14:00"), _lesson(2, "2099-01-04", "10:00")], [], now=NOW)
+    assert len(d) == 1  # прошедший урок не попадает
+    assert d.next_at() == datetime(2099, 1, 5, 13, 59)
+    assert d.pop_due(datetime(2099, 1, 5, 13, 58)) == ([], [])
+    assert d.pop_due(datetime(2099, 1, 5, 13, 59)) == ([("lesson", 1)], [])
+    assert d.pop_due(datetime(2099, 1, 5, 14, 3)) == ([], [])
+
+
+def test_delayed_tick_catches_up_and_reports_missed():
+    d = LessonDispatcher(fire=None)
+    d.load([_lesson(1, "2099-01-05", "13:30"), _lesson(2, "2099-01-05", "13:40")], [], now=NOW)
+    # Таймер опоздал на 3 минуты (граница минуты пройдена) — ссылка к 13:40 всё равно уходит,
+    # а к 13:30 (опоздание 13 минут, больше catch_up) считается пропущенной
+    due, missed = d.pop_due(datetime(2099, 1, 5, 13, 42))
+    assert due == [("lesson", 2)]
+    assert missed == [("lesson", 1)]
+    assert d.next_at() is None
+
+
+def test_slot_repeats_weekly_and_time_is_normalized():
+    d = LessonDispatcher(fire=None)
+    d.load([], [{"day_of_week": 2, "lesson_time": "9:00"}, {"day_of_week": 2, "lesson_time": "09:00"}], now=NOW)
+    assert len(d) == 1
+    assert d.next_at() == datetime(2099, 1, 7, 8, 59)
+    assert d.pop_due(datetime(2099, 1, 7, 8, 59)) == ([("slot", 2, "09:00")], [])
+    assert d.next_at() == datetime(2099, 1, 14, 8, 59)
+
+
+def test_remove_and_clear():
+    d = LessonDispatcher(fire=None)
+    d.load([_lesson(1, "2099-01-05", "14:00")], [{"day_of_week": 0, "lesson_time": "15:00"}], now=NOW)
+    d.remove_lesson(1)
+    assert d.next_at() == datetime(2099, 1, 5, 14, 59)
+    d.clear()
+    assert d.next_at() is None
+
+
+def test_timer_fires_and_rearms(monkeypatch):
+    now = [NOW]
+    monkeypatch.setattr(lesson_dispatcher, "now_tz", lambda: now[0])
+    jobs = []
+
+    class FakeJob:
+        def __init__(self, delay):
+            self.delay = delay
+            self.removed = False
+
+        def schedule_removal(self):
+            self.removed = True
+
+    def run_once(callback, delay, name):
+        jobs.append(FakeJob(delay))
+        return jobs[-1]
+
+    fired = []
+
+    async def fire(context, key):
+        fired.append(key)
+        return key[0] == "lesson"  # у слота учеников не осталось
+
+    d = LessonDispatcher(fire)
+    d.load([_lesson(1, "2099-01-05", "13:10")], [{"day_of_week": 0, "lesson_time": "13:10"}], now=NOW)
+    d.start(SimpleNamespace(run_once=run_once))
+    assert [j.delay for j in jobs] == [540.0]
+    d.add_lessons([_lesson(2, "2099-01-05", "13:05")])  # раньше текущего — таймер перевзводится
+    assert jobs[0].removed and jobs[1].delay == 240.0
+
+    now[0] = NOW + timedelta(minutes=9)
+    asyncio.run(d._on_timer(None))
+    assert sorted(fired) == [("lesson", 1), ("lesson", 2), ("slot", 0, "13:10")]
+    assert d.next_at() is None  # слот без учеников снят с таймлайна
+    assert len(jobs) == 2
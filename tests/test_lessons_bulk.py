@@ -0,0 +1,55 @@
+"""Серия уроков одной транзакцией: add_lessons_bulk и напоминания без перечитывания уроков."""
+
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+
+def _series(weeks: int, times: list[str]) -> list[dict]:
+    return [
+        {"title": "Математика", "lesson_date": f"2099-{w // 4 + 1:02d}-{w % 4 * 7 + 1:02d}", "lesson_time": t}
+        for w in range(weeks)
+        for t in times
+    ]
+
+
+def test_bulk_insert_returns_ids_in_order(temp_db):
+    db = temp_db
+    lessons = _series(48, ["10:00", "16:00"])
+
+    async def scenario():
+        await db.add_lesson("До серии", "2099-01-01", "09:00")
+        ids = await db.add_lessons_bulk(lessons)
+        return ids, [await db.get_lesson(i) for i in ids]
+
+    ids, rows = asyncio.run(scenario())
+    assert len(ids) == 96
+    assert ids == list(range(ids[0], ids[0] + 96))
+    assert [(r["lesson_date"], r["lesson_time"]) for r in rows] == [
+        (lesson["lesson_date"], lesson["lesson_time"]) for lesson in lessons
+    ]
+
+
+def test_bulk_insert_is_all_or_nothing(temp_db):
+    db = temp_db
+    lessons = _series(3, ["10:00"])
+    lessons[2]["title"] = None  # NOT NULL — вся серия откатывается
+
+    with pytest.raises(sqlite3.IntegrityError):
+        asyncio.run(db.add_lessons_bulk(lessons))
+    assert asyncio.run(db.get_upcoming_lessons()) == []
+
+
+def test_reminders_scheduled_from_rows():
+    from handlers.tutor import _schedule_reminders
+
+    scheduled = []
+    job_queue = SimpleNamespace(run_once=lambda callback, when, data, name: scheduled.append(name))
+    context = SimpleNamespace(application=SimpleNamespace(job_queue=job_queue), bot_data={})
+    _schedule_reminders(context, [
+        {"id": 7, "lesson_date": "2099-01-10", "lesson_time": "14:00"},
+        {"id": 8, "lesson_date": "2000-01-10", "lesson_time": "14:00"},  # прошедший — без напоминаний
+    ])
+    assert scheduled == ["remind_1d_7", "remind_1h_7"]
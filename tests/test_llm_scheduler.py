@@ -0,0 +1,121 @@
+"""Очередь к GPT: общий лимит, один запрос на ученика, очередь по кругу, места в очереди, снятие вопросов."""
+
+import asyncio
+
+import pytest
+
+from llm_scheduler import FairScheduler, RequestCancelled
+
+
+def test_global_limit_and_one_request_per_user():
+    async def scenario():
+        scheduler = FairScheduler(limit=2)
+        active, peak, per_user = set(), [0], {}
+
+        async def job(user_id):
+            assert user_id not in active
+            active.add(user_id)
+            peak[0] = max(peak[0], len(active))
+            await asyncio.sleep(0.01)
+            active.discard(user_id)
+            per_user[user_id] = per_user.get(user_id, 0) + 1
+
+        await asyncio.gather(*(scheduler.run(u, lambda u=u: job(u)) for u in [1, 1, 1, 2, 2, 3]))
+        return peak[0], per_user, scheduler
+
+    peak, per_user, scheduler = asyncio.run(scenario())
+    assert peak == 2
+    assert per_user == {1: 3, 2: 2, 3: 1}
+    assert scheduler.running == 0 and scheduler.waiting == 0
+
+
+def test_round_robin_between_users():
+    async def scenario():
+        scheduler = FairScheduler(limit=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def job(label):
+            order.append(label)
+            if label == "busy":
+                await gate.wait()
+
+        busy = asyncio.create_task(scheduler.run(0, lambda: job("busy")))
+        await asyncio.sleep(0)
+        # Ученик 1 прислал три вопроса подряд, ученики 2 и 3 — по одному позже
+        tasks = [asyncio.create_task(scheduler.run(1, lambda n=n: job(f"a{n}"))) for n in range(3)]
+        tasks += [asyncio.create_task(scheduler.run(u, lambda u=u: job(f"u{u}"))) for u in (2, 3)]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(busy, *tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["busy", "a0", "u2", "u3", "a1", "a2"]
+
+
+def test_queue_positions_are_reported():
+    async def scenario():
+        scheduler = FairScheduler(limit=1)
+        gates = [asyncio.Event(), asyncio.Event()]
+        positions = []
+
+        async def report(position):
+            positions.append(position)
+
+        tasks = [asyncio.create_task(scheduler.run(u, gates[u].wait)) for u in (0, 1)]
+        await asyncio.sleep(0)
+        last = asyncio.create_task(scheduler.run(2, lambda: asyncio.sleep(0), on_position=report))
+        for gate in gates:
+            await asyncio.sleep(0.01)
+            gate.set()
+        await asyncio.gather(*tasks, last)
+        return positions
+
+    assert asyncio.run(scenario()) == [2, 1]
+
+
+def test_cancel_user_drops_waiting_requests():
+    async def scenario():
+        scheduler = FairScheduler(limit=1)
+        gate = asyncio.Event()
+        ran = []
+
+        async def job(label):
+            ran.append(label)
+
+        busy = asyncio.create_task(scheduler.run(0, gate.wait))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(scheduler.run(1, lambda n=n: job(n))) for n in range(2)]
+        other = asyncio.create_task(scheduler.run(2, lambda: job("other")))
+        await asyncio.sleep(0)
+        assert scheduler.cancel_user(1) == 2
+        gate.set()
+        await asyncio.gather(busy, other)
+        for task in waiting:
+            with pytest.raises(RequestCancelled):
+                await task
+        return ran, scheduler
+
+    ran, scheduler = asyncio.run(scenario())
+    assert ran == ["other"]
+    assert scheduler.running == 0 and scheduler.waiting == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = FairScheduler(limit=1)
+        gate = asyncio.Event()
+        busy = asyncio.create_task(scheduler.run(0, gate.wait))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(scheduler.run(1, gate.wait))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        waiting = scheduler.waiting
+        gate.set()
+        await busy
+        return waiting, scheduler
+
+    waiting, scheduler = asyncio.run(scenario())
+    assert waiting == 0
+    assert scheduler.running == 0
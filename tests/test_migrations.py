@@ -0,0 +1,102 @@
+"""Миграции по PRAGMA user_version: новая БД, старая БД прежнего init_db, быстрый путь и откат шага."""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+import db_migrations
+from db_pool import connect
+
+
+def _migrate(path):
+    async def run():
+        conn = await connect(path)
+        try:
+            return await db_migrations.migrate(conn)
+        finally:
+            await conn.close()
+
+    return asyncio.run(run())
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    path = tmp_path / "fresh.db"
+    assert _migrate(path) == len(db_migrations.MIGRATIONS)
+    conn = sqlite3.connect(path)
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert version == len(db_migrations.MIGRATIONS)
+    assert {"lessons", "bookings", "blocked_slots", "ege_tasks", "ege_math_bank"} <= tables
+
+
+def test_migrated_database_needs_single_pragma_read(tmp_path):
+    path = tmp_path / "ready.db"
+    _migrate(path)
+    statements = []
+
+    async def run():
+        conn = await connect(path)
+        await conn.set_trace_callback(statements.append)
+        try:
+            await db_migrations.migrate(conn)
+        finally:
+            await conn.close()
+
+    asyncio.run(run())
+    assert statements == ["PRAGMA user_version"]
+
+
+def test_legacy_database_keeps_data(tmp_path):
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE lessons (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, lesson_date TEXT NOT NULL,
+            lesson_time TEXT NOT NULL, duration_minutes INTEGER DEFAULT 60, max_students INTEGER DEFAULT 1,
+            created_at TEXT NOT NULL);
+        CREATE TABLE bookings (id INTEGER PRIMARY KEY AUTOINCREMENT, lesson_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL, username TEXT, first_name TEXT, created_at TEXT NOT NULL,
+            UNIQUE(lesson_id, user_id));
+        CREATE TABLE blocked_slots (id INTEGER PRIMARY KEY AUTOINCREMENT, student_name TEXT NOT NULL,
+            day_of_week INTEGER NOT NULL, lesson_time TEXT NOT NULL, student_username TEXT DEFAULT '',
+            created_at TEXT NOT NULL, UNIQUE(day_of_week, lesson_time));
+        CREATE TABLE ege_math_tasks (task_number INTEGER PRIMARY KEY, task_text TEXT DEFAULT '',
+            solution_text TEXT DEFAULT '');
+        INSERT INTO lessons (title, lesson_date, lesson_time, max_students, created_at)
+            VALUES ('Математика', '2099-01-10', '14:00', 3, 'x');
+        INSERT INTO bookings (lesson_id, user_id, created_at) VALUES (1, 7, 'x'), (1, 8, 'x');
+        INSERT INTO blocked_slots (student_name, day_of_week, lesson_time, created_at) VALUES ('Аня', 1, '10:00', 'x');
+        INSERT INTO ege_math_tasks VALUES (1, 'Найдите x', 'x = 2'), (2, '', '');
+    """)
+    conn.close()
+
+    _migrate(path)
+    conn = sqlite3.connect(path)
+    booked = conn.execute("SELECT booked_count, lesson_link FROM lessons WHERE id = 1").fetchone()
+    slots_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'blocked_slots'").fetchone()[0]
+    slot = conn.execute("SELECT student_name, lesson_link, student_user_id FROM blocked_slots").fetchone()
+    bank = conn.execute("SELECT task_number, task_text FROM ege_math_bank").fetchall()
+    conn.close()
+    assert booked == (2, "")
+    assert "UNIQUE" not in slots_sql.upper()
+    assert slot == ("Аня", "", None)
+    assert bank == [(1, "Найдите x")]
+
+
+def test_failed_step_rolls_back(tmp_path, monkeypatch):
+    path = tmp_path / "broken.db"
+
+    async def broken(conn):
+        await conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("сбой миграции")
+
+    monkeypatch.setattr(db_migrations, "MIGRATIONS", [db_migrations._base_schema, broken])
+    with pytest.raises(RuntimeError):
+        _migrate(path)
+    conn = sqlite3.connect(path)
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    half = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone()
+    conn.close()
+    assert version == 1
+    assert half is None
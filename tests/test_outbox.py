@@ -0,0 +1,80 @@
+"""Outbox: уведомление пишется вместе с записью на урок и отправляется фоновым обходом с повторами."""
+
+import asyncio
+
+from telegram.error import NetworkError
+
+import broadcast
+import outbox
+
+
+class FakeBot:
+    def __init__(self, down=()):
+        self.down = set(down)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.down:
+            raise NetworkError("connection reset")
+        self.sent.append((chat_id, text))
+
+
+async def _outbox_rows(db):
+    async with db._read() as conn:
+        cursor = await conn.execute("SELECT chat_id, text, attempts, last_error FROM outbox ORDER BY id")
+        return [tuple(r) for r in await cursor.fetchall()]
+
+
+def test_notification_is_written_with_the_booking(temp_db):
+    db = temp_db
+
+    async def scenario():
+        lesson_id = await db.add_lesson("Математика", "2099-01-10", "14:00", max_students=1)
+        async with db.transaction():
+            ok, _ = await db.book_lesson(lesson_id, 501)
+            await db.add_notifications([10, 11, 10], "записался 501")
+        # Мест нет — запись не прошла; уведомление пишется только при успехе, как в обработчике
+        async with db.transaction():
+            ok2, _ = await db.book_lesson(lesson_id, 502)
+            if ok2:
+                await db.add_notifications([10], "записался 502")
+        try:
+            async with db.transaction():
+                await db.cancel_booking(lesson_id, 501)
+                await db.add_notifications([10], "отменил 501")
+                raise RuntimeError("сбой до commit")
+        except RuntimeError:
+            pass
+        return ok, ok2, await _outbox_rows(db), await db.get_bookings_for_lesson(lesson_id)
+
+    ok, ok2, rows, bookings = asyncio.run(scenario())
+    assert (ok, ok2) == (True, False)
+    assert rows == [(10, "записался 501", 0, None), (11, "записался 501", 0, None)]
+    assert [b["user_id"] for b in bookings] == [501]  # откат: ни отмены, ни уведомления
+
+
+def test_drain_delivers_and_retries_failures(temp_db, monkeypatch):
+    db = temp_db
+    monkeypatch.setattr(outbox, "MAX_ATTEMPTS", 2)
+    # Повторы — забота outbox, а не рассылки; без пауз между сообщениями в один чат
+    monkeypatch.setattr(broadcast, "_default", broadcast.Broadcaster(per_chat_interval=0, max_retries=0))
+
+    async def scenario():
+        await db.add_notifications([10, 11], "привет")
+        await db.add_notifications([10], "ещё")
+        bot = FakeBot(down={11})
+        delivered = await outbox.drain(bot)
+        after_first = await _outbox_rows(db)
+        # Повтор ещё не созрел (backoff) — второй обход ничего не трогает
+        second = await outbox.drain(bot)
+        async with db._write() as conn:
+            await conn.execute("UPDATE outbox SET next_attempt_at = '2000-01-01T00:00:00'")
+        third = await outbox.drain(bot)
+        return bot.sent, delivered, after_first, second, third, await _outbox_rows(db)
+
+    sent, delivered, after_first, second, third, final = asyncio.run(scenario())
+    assert sent == [(10, "привет"), (10, "ещё")]
+    assert delivered == 2
+    assert after_first == [(11, "привет", 1, "connection reset")]
+    assert (second, third) == (0, 0)
+    assert final == []  # MAX_ATTEMPTS попыток — уведомление снято
@@ -0,0 +1,88 @@
+"""EXPLAIN QUERY PLAN для каждого SQL-запроса из database.py: полный скан таблицы без индекса — ошибка."""
+
+import ast
+import re
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+DATABASE_PY = Path(__file__).resolve().parent.parent / "database.py"
+
+# Запросы, которым по смыслу нужна вся таблица (маленькие таблицы или очистка/подсчёт всего).
+# Всё, что здесь есть, тест не проверяет — у каждой строки сказано, почему полный скан задуман.
+WHOLE_TABLE_READS = {
+    # get_tutor_user_ids_from_db: все репетиторы, добавленные админом (единицы строк)
+    "SELECT user_id FROM tutor_user_ids",
+    # список заданий ЕГЭ для меню: нужны все номера, таблица — по строке на номер задания
+    "SELECT task_number FROM ege_tasks ORDER BY task_number",
+    # загрузка индекса банка ЕГЭ Математика в память (ege_math_index): нужен весь банк
+    "SELECT id, task_number FROM ege_math_bank WHERE COALESCE(TRIM(task_text), '') != ''",
+    # поиск похожего задания (ege_similarity) строится по всем заданиям банка с решением
+    (
+        "SELECT id, task_text FROM ege_math_bank "
+        "WHERE COALESCE(TRIM(task_text), '') != '' AND COALESCE(TRIM(solution_text), '') != ''"
+    ),
+    # clear_all_schedule / clear_lessons_only: очистка всех записей
+    "DELETE FROM bookings",
+    # clear_all_schedule / clear_lessons_only: очистка всех уроков
+    "DELETE FROM lessons",
+    # статистика кэша ответов для админа (таблица ограничена HOMEWORK_CACHE_SIZE)
+    "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM homework_answers",
+}
+
+_SQL_START = re.compile(r"^\s*(SELECT|UPDATE|DELETE|INSERT|WITH)\b", re.IGNORECASE)
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def _normalize(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def _queries() -> list[str]:
+    """Все строковые литералы SQL, переданные в execute/executemany в database.py."""
+    tree = ast.parse(DATABASE_PY.read_text(encoding="utf-8"))
+    found = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+            continue
+        if node.func.attr not in ("execute", "executemany") or not node.args:
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and _SQL_START.match(arg.value):
+            sql = _normalize(arg.value)
+            if sql not in found:
+                found.append(sql)
+    return found
+
+
+@pytest.fixture(scope="module")
+def schema_conn(tmp_path_factory):
+    import asyncio
+
+    import database
+
+    path = tmp_path_factory.mktemp("plans") / "plans.db"
+    old_path = database.DB_PATH
+    database.DB_PATH = path
+    try:
+        asyncio.run(database.init_db())
+    finally:
+        database.DB_PATH = old_path
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def test_queries_found():
+    assert len(_queries()) > 30
+
+
+@pytest.mark.parametrize("sql", _queries())
+def test_no_full_table_scan(schema_conn, sql):
+    if sql in WHOLE_TABLE_READS:
+        pytest.skip("чтение всей таблицы по смыслу")
+    params = [None] * sql.count("?")
+    plan = [row[3] for row in schema_conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    scans = [detail for detail in plan if _FULL_SCAN.match(detail)]
+    assert not scans, f"Полный скан {scans} в запросе: {sql}\nПлан: {plan}"
@@ -0,0 +1,66 @@
+"""Индекс закреплённых слотов: развёртка по неделям, поиск занятий в окне и пересечений с уроком."""
+
+import asyncio
+from datetime import date, datetime, timedelta
+
+from recurrence import SlotOccurrenceIndex
+
+MONDAY = datetime(2099, 1, 5)
+
+
+def _slot(slot_id, day_of_week, lesson_time, name="Петя"):
+    return {"id": slot_id, "day_of_week": day_of_week, "lesson_time": lesson_time, "student_name": name}
+
+
+def test_times_are_normalized_once():
+    index = SlotOccurrenceIndex([_slot(1, 0, " 9:00"), _slot(2, 0, "09:00", "Вася"), _slot(3, 2, "после обеда")])
+    assert [s["lesson_time"] for s in index.slots] == ["09:00", "09:00", "после обеда"]
+    assert [s["id"] for s in index.slots_at(0, "9:00")] == [1, 2]
+    assert index.slots_at(2, "после обеда") == []  # без разобранного времени — только в списке слотов
+
+
+def test_occurrences_between_and_on_date():
+    index = SlotOccurrenceIndex([_slot(1, 0, "18:00"), _slot(2, 2, "10:00")], horizon=timedelta(weeks=2))
+    window = index.between(MONDAY, MONDAY + timedelta(weeks=2))
+    assert [(at, slot["id"]) for at, slot in window] == [
+        (datetime(2099, 1, 5, 18, 0), 1),
+        (datetime(2099, 1, 7, 10, 0), 2),
+        (datetime(2099, 1, 12, 18, 0), 1),
+        (datetime(2099, 1, 14, 10, 0), 2),
+    ]
+    assert [s["id"] for s in index.on_date(date(2099, 1, 14))] == [2]
+    # Запрос за горизонтом разворачивает недели дальше
+    assert [s["id"] for s in index.on_date(date(2099, 6, 1))] == [1]
+
+
+def test_conflicts_by_overlap():
+    index = SlotOccurrenceIndex([_slot(1, 0, "10:00")])
+    at = MONDAY.replace(hour=10)
+    assert [o[0] for o in index.conflicts(MONDAY.replace(hour=10, minute=30))] == [at]
+    assert [o[0] for o in index.conflicts(MONDAY.replace(hour=9, minute=30))] == [at]
+    assert index.conflicts(MONDAY.replace(hour=11)) == []
+    assert index.conflicts(MONDAY.replace(hour=9)) == []
+    assert [o[0] for o in index.conflicts(MONDAY.replace(hour=8), duration=timedelta(hours=3))] == [at]
+
+
+def test_slot_index_rebuilt_after_slot_writes(temp_db):
+    db = temp_db
+
+    async def scenario():
+        await db.add_blocked_slot("Петя", 0, "9:00", "petya")
+        first = await db.get_slot_index()
+        same = await db.get_slot_index()
+        await db.update_blocked_slots_user_id("petya", 77)
+        linked = await db.get_slot_index()
+        await db.update_blocked_slots_user_id("petya", 77)  # уже привязан — индекс не сбрасывается
+        still = await db.get_slot_index()
+        slot_id = linked.slots[0]["id"]
+        await db.delete_blocked_slot(slot_id)
+        empty = await db.get_slot_index()
+        return first, same, linked, still, empty
+
+    first, same, linked, still, empty = asyncio.run(scenario())
+    assert same is first
+    assert linked is not first and linked.slots[0]["student_user_id"] == 77
+    assert still is linked
+    assert len(empty) == 0
@@ -0,0 +1,81 @@
+"""Напоминания в таблице reminders: пишутся вместе с уроком, восстанавливаются при старте, уходят один раз."""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from handlers import tutor
+
+NOW = datetime(2099, 1, 5, 12, 0)
+
+
+def _row(remind_at, lesson_at, kind="1hour", lesson_id=1):
+    return {
+        "lesson_id": lesson_id,
+        "kind": kind,
+        "remind_at": remind_at.strftime("%Y-%m-%d %H:%M"),
+        "lesson_date": lesson_at.strftime("%Y-%m-%d"),
+        "lesson_time": lesson_at.strftime("%H:%M"),
+    }
+
+
+def test_reminders_written_with_lessons_and_removed_with_them(temp_db):
+    db = temp_db
+    soon = datetime.now() + timedelta(hours=5)
+
+    async def scenario():
+        far_id = await db.add_lesson("Математика", "2099-01-10", "14:00")
+        soon_ids = await db.add_lessons_bulk(
+            [{"title": "Физика", "lesson_date": soon.strftime("%Y-%m-%d"), "lesson_time": soon.strftime("%H:%M")}]
+        )
+        before = await db.get_pending_reminders()
+        await db.delete_lesson(far_id)
+        after = await db.get_pending_reminders()
+        return far_id, soon_ids[0], before, after
+
+    far_id, soon_id, before, after = asyncio.run(scenario())
+    assert sorted((r["lesson_id"], r["kind"]) for r in before) == sorted(
+        [(far_id, "1day"), (far_id, "1hour"), (soon_id, "1hour")]  # «за день» для урока через 5 часов уже прошло
+    )
+    assert [(r["lesson_id"], r["kind"]) for r in after] == [(soon_id, "1hour")]
+
+
+def test_claim_sends_once(temp_db):
+    db = temp_db
+
+    async def scenario():
+        lesson_id = await db.add_lesson("Математика", "2099-01-10", "14:00")
+        return [await db.claim_reminder(lesson_id, "1day") for _ in range(2)]
+
+    assert asyncio.run(scenario()) == [True, False]
+
+
+def test_downtime_policy():
+    lesson_at = NOW + timedelta(minutes=40)
+    future = _row(NOW + timedelta(hours=2), NOW + timedelta(hours=3), lesson_id=1)
+    late = _row(NOW - timedelta(minutes=20), lesson_at, lesson_id=2)
+    too_late = _row(NOW - timedelta(hours=5), NOW + timedelta(hours=19), kind="1day", lesson_id=3)
+    started = _row(NOW - timedelta(minutes=70), NOW - timedelta(minutes=10), lesson_id=4)
+
+    scheduled, late_rows, skipped = tutor._plan_reminders([future, late, too_late, started], NOW)
+    assert scheduled == [(future, NOW + timedelta(hours=2))]
+    assert late_rows == [late]
+    assert skipped == [too_late, started]
+
+
+def test_restore_schedules_and_skips(temp_db, monkeypatch):
+    db = temp_db
+    jobs = []
+    job_queue = SimpleNamespace(run_once=lambda callback, when, data, name: jobs.append((name, when)))
+    application = SimpleNamespace(job_queue=job_queue, bot_data={})
+
+    async def scenario():
+        lesson_id = await db.add_lesson("Математика", "2099-01-10", "14:00")
+        # Бот простоял: «за день» давно прошло, «за час» — ещё впереди
+        monkeypatch.setattr(tutor, "now_tz", lambda: datetime(2099, 1, 9, 18, 0))
+        await tutor.restore_reminders(application)
+        return lesson_id, await db.get_pending_reminders()
+
+    lesson_id, pending = asyncio.run(scenario())
+    assert jobs == [(f"remind_1h_{lesson_id}", datetime(2099, 1, 10, 13, 0))]
+    assert [(r["lesson_id"], r["kind"]) for r in pending] == [(lesson_id, "1hour")]
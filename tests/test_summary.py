@@ -0,0 +1,82 @@
+"""Сводка дня: текст берётся из кэша, пока не изменились уроки/записи этого дня или слоты его дня недели."""
+
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from cache import LRUCache
+from config_loader import now_tz
+from handlers import tutor
+
+
+@pytest.fixture
+def summary_db(temp_db, monkeypatch):
+    monkeypatch.setattr(tutor, "_summary_cache", LRUCache(maxsize=8, ttl=600))
+    loads = []
+    real = temp_db.get_lessons_on_date
+
+    async def counting(day):
+        loads.append(day)
+        return await real(day)
+
+    monkeypatch.setattr(temp_db, "get_lessons_on_date", counting)
+    return temp_db, loads
+
+
+def test_rebuilt_only_when_the_day_changes(summary_db):
+    db, loads = summary_db
+    now = now_tz()
+    today = now.strftime("%Y-%m-%d")
+    other_day = now + timedelta(days=3)
+
+    async def scenario():
+        lesson_id = await db.add_lesson("Математика", today, "10:00", max_students=3)
+        texts = [await tutor.today_summary(), await tutor.today_summary()]
+        # Другая дата и другой день недели — сводку на сегодня не трогают
+        await db.add_lesson("Физика", other_day.strftime("%Y-%m-%d"), "10:00")
+        await db.add_blocked_slot("Петя", other_day.weekday(), "12:00")
+        texts.append(await tutor.today_summary())
+        await db.book_lesson(lesson_id, 501)
+        texts.append(await tutor.today_summary())
+        await db.add_blocked_slot("Вася", now.weekday(), "18:00")
+        texts.append(await tutor.today_summary())
+        return texts
+
+    texts = asyncio.run(scenario())
+    assert len(loads) == 3
+    assert texts[0] == texts[1] == texts[2]
+    assert "Записано: 1" in texts[3]
+    assert "18:00 — Вася" in texts[4]
+
+
+def test_version_moves_after_commit(temp_db):
+    db = temp_db
+    today = now_tz().strftime("%Y-%m-%d")
+
+    async def scenario():
+        lesson_id = await db.add_lesson("Математика", today, "10:00")
+        before = db.schedule_version(today)
+        async with db.transaction():
+            await db.book_lesson(lesson_id, 501)
+            inside = db.schedule_version(today)
+        return before, inside, db.schedule_version(today)
+
+    before, inside, after = asyncio.run(scenario())
+    assert inside == before
+    assert after != before
+
+
+def test_daily_summary_goes_to_every_tutor(summary_db):
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append(chat_id)
+
+    context = SimpleNamespace(
+        bot=SimpleNamespace(send_message=send_message),
+        bot_data={"tutor_user_id": 1, "tutor_user_ids": {1, 2, 3}},
+    )
+    asyncio.run(tutor.daily_summary_callback(context))
+    assert sorted(sent) == [1, 2, 3]
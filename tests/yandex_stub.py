@@ -0,0 +1,95 @@
+"""
+Локальная заглушка API Yandex GPT и Vision OCR для тестов homework_llm (aiohttp.web на 127.0.0.1).
+Считает запросы и TCP-подключения (по порту клиента), чтобы проверять переиспользование соединений;
+script() задаёт сбои и задержки для очередных запросов (повторы, предохранитель, дублирующие запросы).
+"""
+
+import asyncio
+import json
+
+from aiohttp import web
+
+
+class YandexStub:
+    def __init__(self, answer: str = "Ответ", ocr_text: str = "2 + 2 = ?", chunk_delay: float = 0.0):
+        self.answer = answer
+        self.ocr_text = ocr_text
+        # Поток (completionOptions.stream): ответ по словам, пауза между кусками
+        self.chunk_delay = chunk_delay
+        self.requests: list[str] = []
+        self.connections: set = set()
+        self._script: dict[str, list] = {"/completion": [], "/vision": []}
+        self._runner = None
+        self.base_url = ""
+
+    async def start(self) -> "YandexStub":
+        app = web.Application()
+        app.router.add_post("/completion", self._completion)
+        app.router.add_post("/vision", self._vision)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+    def patch(self, monkeypatch, module) -> None:
+        """Направляет homework_llm на заглушку."""
+        monkeypatch.setattr(module, "YANDEX_COMPLETION_URL", f"{self.base_url}/completion")
+        monkeypatch.setattr(module, "YANDEX_VISION_URL", f"{self.base_url}/vision")
+
+    def script(self, path: str, *steps) -> None:
+        """
+        Поведение следующих запросов к path ("/completion" или "/vision"), по одному шагу на запрос:
+        int — ответить этим статусом (429 — с Retry-After: 0), float — ответить как обычно через столько секунд.
+        Когда шаги кончились — обычные ответы.
+        """
+        self._script[path].extend(steps)
+
+    async def _seen(self, request: web.Request) -> web.Response | None:
+        """Учитывает запрос; если по сценарию нужен сбой — возвращает ответ с ошибкой."""
+        self.requests.append(request.path)
+        self.connections.add(request.transport.get_extra_info("peername"))
+        steps = self._script[request.path]
+        step = steps.pop(0) if steps else None
+        if isinstance(step, float):
+            await asyncio.sleep(step)
+        elif isinstance(step, int):
+            headers = {"Retry-After": "0"} if step == 429 else None
+            return web.json_response({"error": {"httpCode": step}}, status=step, headers=headers)
+        return None
+
+    async def _completion(self, request: web.Request) -> web.StreamResponse:
+        failure = await self._seen(request)
+        if failure is not None:
+            return failure
+        payload = await request.json()
+        if not payload.get("completionOptions", {}).get("stream"):
+            return web.json_response(self._result(self.answer, "ALTERNATIVE_STATUS_FINAL"))
+        # Как у Yandex GPT: строка JSON на кусок, в каждом — весь текст на данный момент
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        words = self.answer.split(" ")
+        for n in range(1, len(words) + 1):
+            status = "ALTERNATIVE_STATUS_FINAL" if n == len(words) else "ALTERNATIVE_STATUS_PARTIAL"
+            await resp.write((json.dumps(self._result(" ".join(words[:n]), status)) + "\n").encode())
+            await asyncio.sleep(self.chunk_delay)
+        await resp.write_eof()
+        return resp
+
+    @staticmethod
+    def _result(text: str, status: str) -> dict:
+        return {"result": {"alternatives": [{"message": {"role": "assistant", "text": text}, "status": status}]}}
+
+    async def _vision(self, request: web.Request) -> web.Response:
+        failure = await self._seen(request)
+        if failure is not None:
+            return failure
+        await request.json()
+        words = [{"text": word} for word in self.ocr_text.split()]
+        page = {"blocks": [{"lines": [{"words": words}]}]}
+        return web.json_response({"results": [{"results": [{"textDetection": {"pages": [page]}}]}]})